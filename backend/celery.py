@@ -2,6 +2,9 @@ import os
 from celery import Celery
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Workers skip Django's system checks: the web process runs them, and they
+# import the URLconf and with it every view and its dependencies
+os.environ.setdefault('CELERY_SKIP_CHECKS', 'true')
 
 app = Celery('backend')
 app.config_from_object('django.conf:settings', namespace='CELERY')
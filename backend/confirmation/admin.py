@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Material, Buyer, BusinessConfirmation, ProcessingTask,
     DeliveryTerm, DeliveryPoint, Packaging, TransportMode,
-    PaymentMethod, Currency, TriggeringEvent, Surveyor
+    PaymentMethod, Currency, TriggeringEvent, Surveyor, AssayParseJob
 )
 
 # Register your models here.
@@ -19,3 +19,4 @@ admin.site.register(PaymentMethod)
 admin.site.register(Currency)
 admin.site.register(TriggeringEvent)
 admin.site.register(Surveyor)
+admin.site.register(AssayParseJob)
@@ -0,0 +1,157 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import BusinessConfirmation, ConfirmationSummary
+
+# Confirmation fields that are summed and averaged per bucket
+SUMMARY_METRICS = (
+    'quantity', 'treatment_charge', 'refining_charge', 'assay_pb', 'assay_zn', 'assay_cu', 'assay_ag',
+)
+# Confirmation columns a bucket contribution is computed from
+SOURCE_COLUMNS = ('material_id', 'buyer_id', 'shipment_period_from', *SUMMARY_METRICS)
+# ?group_by name -> ConfirmationSummary column
+GROUPINGS = {'material': 'material', 'buyer': 'buyer', 'month': 'shipment_month'}
+
+
+def bucket_key(material_id, buyer_id, shipment_month):
+    return ':'.join([
+        str(material_id) if material_id is not None else '-',
+        str(buyer_id) if buyer_id is not None else '-',
+        f'{shipment_month:%Y-%m}' if shipment_month is not None else '-',
+    ])
+
+
+def add_contribution(deltas, row, sign):
+    """Add (sign=1) or remove (sign=-1) one confirmation's row to deltas.
+
+    row maps SOURCE_COLUMNS to values; deltas is {key: (dimensions, changes)}
+    so several rows landing in one bucket become a single UPDATE.
+    """
+    shipment_from = row['shipment_period_from']
+    month = shipment_from.replace(day=1) if shipment_from is not None else None
+    key = bucket_key(row['material_id'], row['buyer_id'], month)
+    dimensions = {'material_id': row['material_id'], 'buyer_id': row['buyer_id'], 'shipment_month': month}
+    changes = deltas.setdefault(key, (dimensions, {'confirmation_count': 0}))[1]
+    changes['confirmation_count'] += sign
+    for metric in SUMMARY_METRICS:
+        value = row[metric]
+        if value is None:
+            continue
+        changes[f'{metric}_sum'] = changes.get(f'{metric}_sum', 0) + sign * value
+        changes[f'{metric}_count'] = changes.get(f'{metric}_count', 0) + sign
+
+
+def apply_deltas(deltas):
+    """Adjust the summary rows in place with F() so concurrent writers add up"""
+    with transaction.atomic():
+        for key, (dimensions, changes) in deltas.items():
+            changes = {field: change for field, change in changes.items() if change}
+            if not changes:
+                continue
+            if changes.get('confirmation_count', 0) > 0:
+                ConfirmationSummary.objects.get_or_create(key=key, defaults=dimensions)
+            ConfirmationSummary.objects.filter(key=key).update(
+                **{field: F(field) + change for field, change in changes.items()}
+            )
+            if changes.get('confirmation_count', 0) < 0:
+                ConfirmationSummary.objects.filter(key=key, confirmation_count__lte=0).delete()
+
+
+def source_row(confirmation):
+    """The instance's SOURCE_COLUMNS as stored (assigned strings become dates/decimals)"""
+    meta = confirmation._meta
+    return {column: meta.get_field(column).to_python(getattr(confirmation, column)) for column in SOURCE_COLUMNS}
+
+
+def previous_source_row(confirmation):
+    """The stored row a save is about to overwrite, or None for a new confirmation"""
+    if confirmation._state.adding or confirmation.pk is None:
+        return None
+    return BusinessConfirmation.objects.filter(pk=confirmation.pk).values(*SOURCE_COLUMNS).first()
+
+
+def record_change(previous=None, current=None):
+    """Move a confirmation's contribution from its previous row to its current one"""
+    deltas = {}
+    if previous is not None:
+        add_contribution(deltas, previous, -1)
+    if current is not None:
+        add_contribution(deltas, current, 1)
+    apply_deltas(deltas)
+
+
+def record_created(confirmations):
+    """Add confirmations that were inserted without signals (bulk_create)"""
+    deltas = {}
+    for confirmation in confirmations:
+        add_contribution(deltas, source_row(confirmation), 1)
+    apply_deltas(deltas)
+
+
+def rebuild_summary():
+    """Recompute every bucket with one GROUP BY over the confirmations; returns the bucket count"""
+    aggregates = {'confirmation_count': Count('id')}
+    for metric in SUMMARY_METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_count'] = Count(metric)
+    rows = (
+        BusinessConfirmation.objects
+        .annotate(month=TruncMonth('shipment_period_from'))
+        .values('material_id', 'buyer_id', 'month')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    summaries = [
+        ConfirmationSummary(
+            key=bucket_key(row['material_id'], row['buyer_id'], row['month']),
+            material_id=row['material_id'],
+            buyer_id=row['buyer_id'],
+            shipment_month=row['month'],
+            **{field: row[field] or 0 for field in aggregates},
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        ConfirmationSummary.objects.all().delete()
+        ConfirmationSummary.objects.bulk_create(summaries, batch_size=500)
+    return len(summaries)
+
+
+def summarize(group_by, filters=None):
+    """Aggregate the summary rows by the GROUPINGS names in group_by.
+
+    Each result has the group columns (plus material/buyer names), the
+    confirmation count, total tonnage and the average of every metric.
+    """
+    columns = [GROUPINGS[name] for name in group_by]
+    names = [f'{column}__name' for column in columns if column in ('material', 'buyer')]
+    aggregates = {'confirmation_count': Sum('confirmation_count')}
+    for metric in SUMMARY_METRICS:
+        aggregates[f'{metric}_sum'] = Sum(f'{metric}_sum')
+        aggregates[f'{metric}_count'] = Sum(f'{metric}_count')
+
+    summaries = ConfirmationSummary.objects.filter(**(filters or {}))
+    if columns:
+        rows = summaries.values(*columns, *names).annotate(**aggregates).order_by(*columns)
+    else:
+        # No grouping: a single book total over every bucket
+        rows = [summaries.aggregate(**aggregates)]
+    results = []
+    for row in rows:
+        result = {column: row[column] for column in columns}
+        for column in columns:
+            if column in ('material', 'buyer'):
+                result[f'{column}_name'] = row[f'{column}__name']
+        if 'shipment_month' in result:
+            month = result.pop('shipment_month')
+            result['month'] = f'{month:%Y-%m}' if month is not None else None
+        result['confirmation_count'] = row['confirmation_count'] or 0
+        result['tonnage'] = row['quantity_sum'] or Decimal(0)
+        for metric in SUMMARY_METRICS[1:]:
+            count = row[f'{metric}_count']
+            result[f'avg_{metric}'] = round(row[f'{metric}_sum'] / count, 4) if count else None
+        results.append(result)
+    return results
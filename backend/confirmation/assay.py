@@ -0,0 +1,228 @@
+import codecs
+import csv
+import math
+import posixpath
+import re
+
+ASSAY_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Column aliases per assay field, in order of preference when a file has several
+ELEMENT_ALIASES = {
+    'assay_pb': ('Pb', 'Lead'),
+    'assay_zn': ('Zn', 'Zinc'),
+    'assay_cu': ('Cu', 'Copper'),
+    'assay_ag': ('Ag', 'Silver'),
+}
+WEIGHT_ALIASES = ('Weight', 'DMT', 'WMT', 'Dry Weight', 'Wet Weight', 'Tonnes', 'Tonnage', 'Quantity', 'Qty')
+WEIGHT_FIELD = 'weight'
+
+
+# Bump when the output of parse_assay changes so cached results are not reused
+ASSAY_PARSER_VERSION = 2
+
+
+def parse_cache_key(stored_name, max_rows):
+    """Cache key of the parse result of a content-addressed upload (name or path)"""
+    return f'assay-parse:{ASSAY_PARSER_VERSION}:{posixpath.basename(stored_name)}:{max_rows}'
+
+
+def _build_alias_index():
+    """Lower-cased header -> (field, preference rank)"""
+    index = {}
+    for field, aliases in [*ELEMENT_ALIASES.items(), (WEIGHT_FIELD, WEIGHT_ALIASES)]:
+        for rank, alias in enumerate(aliases):
+            index[alias.lower()] = (field, rank)
+    return index
+
+
+ALIAS_INDEX = _build_alias_index()
+
+
+def resolve_columns(header):
+    """Map each known field to the column index of its best-ranked alias in header"""
+    best = {}
+    for position, name in enumerate(header):
+        match = ALIAS_INDEX.get(str(name).strip().lower()) if name is not None else None
+        if match is None:
+            continue
+        field, rank = match
+        if field not in best or rank < best[field][1]:
+            best[field] = (position, rank)
+    return {field: position for field, (position, _) in best.items()}
+
+
+# '1,234.5' or '12,500': commas grouping thousands
+THOUSANDS_SEPARATED = re.compile(r'[+-]?\d{1,3}(,\d{3})+(\.\d*)?')
+
+
+def to_number(value):
+    """A cell as a finite float, or None.
+
+    Text may carry a trailing '%', thousands separators ('1,234.5') or a
+    decimal comma ('52,3').
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = str(value).strip().rstrip('%').strip()
+        if not text:
+            return None
+        if THOUSANDS_SEPARATED.fullmatch(text):
+            text = text.replace(',', '')
+        elif text.count(',') == 1 and '.' not in text:
+            text = text.replace(',', '.')
+        try:
+            number = float(text)
+        except ValueError:
+            return None
+    return number if math.isfinite(number) else None
+
+
+def iter_csv_rows(file):
+    # Django's File iterates line by line over fixed-size chunks, so only the
+    # current line is ever decoded and held in memory.
+    yield from csv.reader(codecs.iterdecode(iter(file), 'utf-8-sig'))
+
+
+def iter_xlsx_rows(file):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_xls_rows(file):
+    # Legacy .xls has no streaming reader; pandas (with xlrd) loads it whole.
+    import pandas as pd
+
+    df = pd.read_excel(file, header=None, dtype=object)
+    for row in df.itertuples(index=False, name=None):
+        yield [None if isinstance(value, float) and math.isnan(value) else value for value in row]
+
+
+def iter_raw_rows(file, name):
+    name = name.lower()
+    if name.endswith('.csv'):
+        return iter_csv_rows(file)
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(file)
+    return iter_xls_rows(file)
+
+
+def is_blank(row):
+    return all(cell in (None, '') for cell in row)
+
+
+def read_header(numbered_rows):
+    """Consume rows up to the first non-empty one and resolve its columns"""
+    for _, row in numbered_rows:
+        if not is_blank(row):
+            return resolve_columns(row)
+    return {}
+
+
+def iter_assay_rows(numbered_rows, columns):
+    """Yield one {'row': n, 'assay_pb': ..., 'weight': ...} dict per data row.
+
+    Fields without a column, and cells that are not numeric, are None.
+    """
+    for number, row in numbered_rows:
+        if is_blank(row):
+            continue
+        parsed = {'row': number}
+        for field in (*ELEMENT_ALIASES, WEIGHT_FIELD):
+            position = columns.get(field)
+            parsed[field] = to_number(row[position]) if position is not None and position < len(row) else None
+        yield parsed
+
+
+class AssayAggregate:
+    """Running weight-averaged assays over a lot, in constant memory.
+
+    Rows are weighted by the weight column when the file has one (rows
+    without a usable weight are left out of the averages) and equally otherwise.
+    """
+
+    def __init__(self, weighted):
+        self.weighted = weighted
+        self.row_count = 0
+        self.total_weight = 0.0
+        self._sums = {field: 0.0 for field in ELEMENT_ALIASES}
+        self._weights = {field: 0.0 for field in ELEMENT_ALIASES}
+
+    def add(self, row):
+        self.row_count += 1
+        weight = row[WEIGHT_FIELD] if self.weighted else 1.0
+        if weight is None or weight <= 0:
+            return
+        self.total_weight += weight
+        for field in ELEMENT_ALIASES:
+            if row[field] is not None:
+                self._sums[field] += row[field] * weight
+                self._weights[field] += weight
+
+    def averages(self):
+        # Assay fields are stored with two decimal places
+        return {
+            field: round(self._sums[field] / self._weights[field], 2) if self._weights[field] else 0
+            for field in ELEMENT_ALIASES
+        }
+
+
+def estimate_row_count(file, name):
+    """Cheap upper bound on data rows (excluding the header), or None if unknown"""
+    name = name.lower()
+    if name.endswith('.csv'):
+        lines, last = 0, b''
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block
+        file.seek(0)
+        if last and not last.endswith(b'\n'):
+            lines += 1
+        return max(lines - 1, 0)
+    if name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+            file.seek(0)
+        return max(max_row - 1, 0) if max_row else None
+    return None
+
+
+def parse_assay(file, name, max_rows=1000, progress=None, progress_every=1000):
+    """Stream an assay file and return lot averages plus up to max_rows per-row assays.
+
+    The first non-empty row is the header; only the running totals and the
+    returned sample are kept, so memory does not grow with the file.
+    `progress(rows_processed)` is called every `progress_every` data rows.
+    """
+    numbered_rows = enumerate(iter_raw_rows(file, name), start=1)
+    columns = read_header(numbered_rows)
+    aggregate = AssayAggregate(weighted=WEIGHT_FIELD in columns)
+
+    sample = []
+    for row in iter_assay_rows(numbered_rows, columns):
+        aggregate.add(row)
+        if len(sample) < max_rows:
+            sample.append(row)
+        if progress is not None and aggregate.row_count % progress_every == 0:
+            progress(aggregate.row_count)
+
+    return {
+        **aggregate.averages(),
+        'row_count': aggregate.row_count,
+        'weighted': aggregate.weighted,
+        'total_weight': round(aggregate.total_weight, 4) if aggregate.weighted else None,
+        'rows': sample,
+        'rows_truncated': aggregate.row_count > len(sample),
+    }
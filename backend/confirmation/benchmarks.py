@@ -0,0 +1,530 @@
+"""Benchmark suite behind the run_benchmarks command.
+
+Every route in confirmation/urls.py has at least one scenario, replayed
+through the Django test client against a seeded database; the Celery tasks
+are run in-process with apply(). The model provider is a StubProvider and
+caches are local, so a run needs neither Redis nor network access.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+import numpy as np
+from asgiref.sync import async_to_sync
+from celery import Celery
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from backend import celery_app
+
+from . import urls
+from .analytics import rebuild_summary
+from .assay import parse_cache_key
+from .models import (
+    AssayParseJob, BusinessConfirmation, Buyer, Currency, DeliveryPoint, DeliveryTerm, Material, Packaging,
+    PaymentMethod, PricePoint, ProcessingTask, Surveyor, TransportMode, TriggeringEvent,
+)
+from .prices import price_store
+from .providers import StubProvider, reset_provider, set_provider
+
+RESULTS_FORMAT_VERSION = 1
+# Synthetic daily prices: symbol -> (low, high)
+PRICE_RANGES = {'PB': (1900, 2200), 'ZN': (2500, 2900), 'CU': (8500, 10000), 'AG': (22, 32), 'EUR': (1.02, 1.15)}
+PRICE_HISTORY_DAYS = 730
+# Seeded processing tasks, all completed, for the status routes
+SEEDED_TASKS = 100
+
+
+class Scenario:
+    """One benchmarked operation.
+
+    HTTP scenarios name their route and send `data` (a dict, or a callable
+    taking the iteration number so uploads and cache keys can differ per
+    request). Task scenarios pass `run`, a callable taking the iteration
+    number. `before(i)` runs untimed ahead of each iteration and `limit`
+    caps the iterations of slow scenarios.
+    """
+
+    def __init__(self, name, route, method='get', path=None, data=None, content_type=None,
+                 expect=(200,), before=None, run=None, limit=None, kind='http'):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.path = path
+        self.data = data
+        self.content_type = content_type
+        self.expect = expect
+        self.before = before
+        self.run = run
+        self.limit = limit
+        self.kind = kind
+
+    def execute(self, client, iteration):
+        """Run once; True when it succeeded"""
+        if self.run is not None:
+            self.run(iteration)
+            return True
+        data = self.data(iteration) if callable(self.data) else self.data
+        kwargs = {}
+        if self.content_type == 'application/json':
+            data, kwargs = json.dumps(data), {'content_type': self.content_type}
+        response = getattr(client, self.method)(self.path, data, **kwargs)
+        # Downloads and server-sent events count until the last byte; the
+        # client closes the response once its content is consumed
+        if getattr(response, 'is_async', False):
+            async_to_sync(drain)(response.streaming_content)
+        elif response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code in self.expect
+
+
+async def drain(iterator):
+    async for _ in iterator:
+        pass
+
+
+def measure(scenario, client, iterations, warmup=1):
+    """Run a scenario and summarise it; latencies in milliseconds.
+
+    Requests are sent one after another, so throughput is iterations over
+    the time spent in them (untimed `before` hooks excluded).
+    """
+    if scenario.limit is not None:
+        iterations = min(iterations, scenario.limit)
+    for iteration in range(-warmup, 0):
+        if scenario.before:
+            scenario.before(iteration)
+        scenario.execute(client, iteration)
+
+    latencies, errors = [], 0
+    for iteration in range(iterations):
+        if scenario.before:
+            scenario.before(iteration)
+        started = time.perf_counter()
+        try:
+            ok = scenario.execute(client, iteration)
+        except Exception as e:
+            print(f"Benchmark {scenario.name} failed: {e}")
+            ok = False
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += not ok
+
+    latencies = np.array(latencies)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        'name': scenario.name,
+        'kind': scenario.kind,
+        'route': scenario.route,
+        'requests': iterations,
+        'errors': errors,
+        'throughput_per_s': round(iterations / (latencies.sum() / 1000), 2),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(latencies.max()), 3),
+    }
+
+
+def route_names():
+    return [pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)]
+
+
+def uncovered_routes(scenarios):
+    covered = {scenario.route for scenario in scenarios if scenario.kind == 'http'}
+    return [name for name in route_names() if name not in covered]
+
+
+def synthetic_assay_rows(rows, rng):
+    header = ['Lot', 'Weight', 'Pb', 'Zn', 'Cu', 'Ag']
+    columns = np.column_stack([
+        np.round(rng.uniform(5, 50, rows), 3),
+        np.round(rng.uniform(40, 70, rows), 2),
+        np.round(rng.uniform(3, 12, rows), 2),
+        np.round(rng.uniform(0, 3, rows), 2),
+        np.round(rng.uniform(50, 900, rows), 1),
+    ]).tolist()
+    return header, [[lot, *values] for lot, values in enumerate(columns, start=1)]
+
+
+def synthetic_assay_csv(rows, rng):
+    header, body = synthetic_assay_rows(rows, rng)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(body)
+    return buffer.getvalue().encode()
+
+
+def synthetic_assay_xlsx(rows, rng):
+    from openpyxl import Workbook
+
+    header, body = synthetic_assay_rows(rows, rng)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Assays')
+    sheet.append(header)
+    for row in body:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def synthetic_assay_files(row_counts, rng):
+    """{file name: bytes}, a CSV and an XLSX per row count"""
+    files = {}
+    for rows in row_counts:
+        files[f'assays-{rows}.csv'] = synthetic_assay_csv(rows, rng)
+        files[f'assays-{rows}.xlsx'] = synthetic_assay_xlsx(rows, rng)
+    return files
+
+
+def seed_database(confirmations, rng):
+    """Lookups, confirmations (with their analytics summary), price history,
+    completed processing tasks and an assay job; returns what the scenarios use"""
+    lookups = max(confirmations // 50, 5)
+    buyers = Buyer.objects.bulk_create([Buyer(name=f'Buyer {i}') for i in range(lookups)])
+    materials = Material.objects.bulk_create([
+        Material(name=name) for name in ('Lead concentrate', 'Zinc concentrate', 'Copper concentrate')
+    ])
+    delivery_points = DeliveryPoint.objects.bulk_create([
+        DeliveryPoint(name=f'Port {i}', country='Belgium') for i in range(lookups)
+    ])
+    delivery_terms = DeliveryTerm.objects.bulk_create([DeliveryTerm(name=name) for name in ('CIF', 'FOB', 'DAP')])
+    packaging = Packaging.objects.bulk_create([Packaging(name='Bulk'), Packaging(name='Big bags')])
+    transport_modes = TransportMode.objects.bulk_create([TransportMode(name='Vessel'), TransportMode(name='Rail')])
+    payment_methods = PaymentMethod.objects.bulk_create([
+        PaymentMethod(name='Letter of credit'), PaymentMethod(name='Telegraphic transfer'),
+    ])
+    currency, _ = Currency.objects.get_or_create(code='USD', defaults={'name': 'US Dollar', 'symbol': '$'})
+    event = TriggeringEvent.objects.create(name='Bill of lading')
+    surveyors = Surveyor.objects.bulk_create([
+        Surveyor(name=f'Surveyor {i}', company=f'Company {i % 10}') for i in range(lookups)
+    ])
+
+    def decimals(low, high):
+        return [Decimal(f'{value:.2f}') for value in rng.uniform(low, high, confirmations)]
+
+    quantity, pb, zn, ag = decimals(500, 20000), decimals(40, 70), decimals(3, 12), decimals(0, 900)
+    tc, rc = decimals(100, 350), decimals(0, 5)
+    start = date(2025, 1, 1)
+    created = BusinessConfirmation.objects.bulk_create([
+        BusinessConfirmation(
+            buyer=buyers[i % lookups], material=materials[i % len(materials)],
+            delivery_term=delivery_terms[i % len(delivery_terms)], delivery_point=delivery_points[i % lookups],
+            packaging=packaging[i % 2], transport_mode=transport_modes[i % 2],
+            payment_method=payment_methods[i % 2], currency=currency, triggering_event=event,
+            nominated_surveyor=surveyors[i % lookups],
+            quantity=quantity[i], assay_pb=pb[i], assay_zn=zn[i], assay_ag=ag[i],
+            treatment_charge=tc[i], refining_charge=rc[i], prepayment_percentage=i % 4 * 10,
+            shipment_period_from=start + timedelta(days=i % 365),
+            shipment_period_to=start + timedelta(days=i % 365 + 30),
+        )
+        for i in range(confirmations)
+    ], batch_size=1000)
+    rebuild_summary()
+
+    first_day = date.today() - timedelta(days=PRICE_HISTORY_DAYS)
+    PricePoint.objects.bulk_create([
+        PricePoint(symbol=symbol, date=first_day + timedelta(days=day), value=Decimal(f'{value:.4f}'))
+        for symbol, (low, high) in PRICE_RANGES.items()
+        for day, value in enumerate(rng.uniform(low, high, PRICE_HISTORY_DAYS))
+    ], batch_size=1000)
+    price_store.invalidate()
+
+    tasks = ProcessingTask.objects.bulk_create([
+        ProcessingTask(business_confirmation=confirmation, celery_task_id=f'benchmark-{confirmation.id}',
+                       status='completed')
+        for confirmation in created[:SEEDED_TASKS]
+    ])
+    job = AssayParseJob.objects.create(
+        celery_task_id='benchmark-assay-job', file_name='seed.csv', file_path='seed.csv', status='completed',
+    )
+    return {'confirmations': created, 'buyer': buyers[0], 'material': materials[0], 'tasks': tasks, 'assay_job': job}
+
+
+def confirmation_payload(seeded, iteration):
+    return {
+        'buyer': seeded['buyer'].id, 'material': seeded['material'].id, 'quantity': f'{1000 + iteration % 1000}.00',
+        'assay_pb': '55.20', 'treatment_charge': '310.00', 'refining_charge': '4.35',
+        'shipment_period_from': '2025-06-01', 'shipment_period_to': '2025-06-30',
+    }
+
+
+def suggestion_payload(iteration):
+    # A different TC per request, so every request misses the suggestion cache and reaches the model
+    return {
+        'material': 'Lead concentrate', 'treatment_charge': str(300 + iteration),
+        'refining_charge': '4.35', 'delivery_point': 'Antwerp',
+    }
+
+
+def http_scenarios(seeded, assay_files, requests):
+    """Scenarios for every route; `requests` keeps generated inputs from repeating"""
+    confirmations = seeded['confirmations']
+    confirmation = confirmations[0]
+    task_id = seeded['tasks'][0].celery_task_id
+    month = date.today().replace(day=1)
+    json_type = 'application/json'
+
+    def price_file(iteration):
+        lines = ''.join(f'{month + timedelta(days=day)},{2000 + iteration},{2700 + day}\n' for day in range(20))
+        return {'file': SimpleUploadedFile('prices.csv', f'date,PB,ZN\n{lines}'.encode())}
+
+    scenarios = [
+        Scenario(f'GET {name}', name, path=reverse(name)) for name in (
+            'material-list', 'buyer-list', 'delivery-term-list', 'delivery-point-list', 'packaging-list',
+            'transport-mode-list', 'payment-method-list', 'currency-list', 'triggering-event-list',
+            'surveyor-list', 'reference-data', 'confirmation-analytics',
+        )
+    ]
+    scenarios += [
+        Scenario('GET business-confirmation-list', 'business-confirmation-list',
+                 path=reverse('business-confirmation-list'), data={'expand': 'buyer,material'}),
+        Scenario('POST business-confirmation-list', 'business-confirmation-list', method='post',
+                 path=reverse('business-confirmation-list'), content_type=json_type, expect=(201,),
+                 data=lambda i: confirmation_payload(seeded, i)),
+        Scenario('GET business-confirmation-detail', 'business-confirmation-detail',
+                 path=reverse('business-confirmation-detail', kwargs={'pk': confirmation.id}),
+                 data={'expand': 'buyer,material'}),
+        Scenario('GET business-confirmation-document (pdf)', 'business-confirmation-document',
+                 path=reverse('business-confirmation-document', kwargs={'pk': confirmation.id, 'document_format': 'pdf'})),
+        Scenario('GET business-confirmation-valuation', 'business-confirmation-valuation',
+                 path=reverse('business-confirmation-valuation', kwargs={'pk': confirmation.id})),
+        Scenario('POST business-confirmation-bulk-create (100 items)', 'business-confirmation-bulk-create',
+                 method='post', path=reverse('business-confirmation-bulk-create'), content_type=json_type,
+                 expect=(201,), data=lambda i: {'items': [confirmation_payload(seeded, i)] * 100}),
+        Scenario('POST book-valuation', 'book-valuation', method='post', path=reverse('book-valuation'),
+                 content_type=json_type, data={'price_date': month.isoformat()}),
+        Scenario('POST price-upload (40 prices)', 'price-upload', method='post', path=reverse('price-upload'),
+                 expect=(201,), data=price_file),
+        Scenario('GET price-as-of', 'price-as-of', path=reverse('price-as-of', kwargs={'symbol': 'PB'})),
+        Scenario('GET price-average (90 days)', 'price-average',
+                 path=reverse('price-average', kwargs={'symbol': 'ZN'}),
+                 data={'from': (month - timedelta(days=90)).isoformat(), 'to': month.isoformat()}),
+        # Each trigger leaves a queued task, so it is sent for a different confirmation every time
+        Scenario('POST trigger-processing', 'trigger-processing', method='post', path=reverse('trigger-processing'),
+                 content_type=json_type, expect=(201,), limit=len(confirmations) - SEEDED_TASKS - 1,
+                 data=lambda i: {'business_confirmation_id': confirmations[-2 - i].id}),
+        Scenario('GET task-status', 'task-status', path=reverse('task-status', kwargs={'task_id': task_id})),
+        Scenario(f'POST task-status-batch ({len(seeded["tasks"])} ids)', 'task-status-batch', method='post',
+                 path=reverse('task-status-batch'), content_type=json_type,
+                 data={'task_ids': [task.celery_task_id for task in seeded['tasks']]}),
+        Scenario('GET task-events', 'task-events', path=reverse('task-events', kwargs={'task_id': task_id})),
+        Scenario('GET assay-job-status', 'assay-job-status',
+                 path=reverse('assay-job-status', kwargs={'job_id': seeded['assay_job'].celery_task_id})),
+        Scenario('POST ai-suggestions', 'ai-suggestions', method='post', path=reverse('ai-suggestions'),
+                 content_type=json_type, data=suggestion_payload),
+        Scenario('POST ai-suggestions-async', 'ai-suggestions-async', method='post',
+                 path=reverse('ai-suggestions-async'), content_type=json_type,
+                 data=lambda i: suggestion_payload(requests + i)),
+        Scenario('POST ai-suggestions-batch (10 deals)', 'ai-suggestions-batch', method='post',
+                 path=reverse('ai-suggestions-batch'), content_type=json_type,
+                 data=lambda i: {'items': [suggestion_payload(2 * requests + i * 10 + n) for n in range(10)]}),
+        Scenario('POST ai-suggestions-stream', 'ai-suggestions-stream', method='post',
+                 path=reverse('ai-suggestions-stream'), content_type=json_type,
+                 data=lambda i: suggestion_payload(12 * requests + i)),
+    ]
+
+    for file_name, content in assay_files.items():
+        extension = os.path.splitext(file_name)[1]
+        stored_name = f'{settings.ASSAY_UPLOAD_DIR}/{hashlib.sha256(content).hexdigest()}{extension}'
+
+        def upload(iteration, file_name=file_name, content=content):
+            return {'file': SimpleUploadedFile(file_name, content)}
+
+        def forget_result(iteration, stored_name=stored_name):
+            cache.delete(parse_cache_key(stored_name, settings.ASSAY_MAX_RETURNED_ROWS))
+
+        scenarios += [
+            Scenario(f'POST parse-assay-file {file_name}', 'parse-assay-file', method='post',
+                     path=reverse('parse-assay-file'), expect=(200, 202), data=upload, before=forget_result),
+            Scenario(f'POST parse-assay-file {file_name} (cached)', 'parse-assay-file', method='post',
+                     path=reverse('parse-assay-file'), expect=(200, 202), data=upload),
+        ]
+    return scenarios
+
+
+def task_scenarios(seeded, assay_paths):
+    from .tasks import parse_assay_file_task, process_confirmation_task, render_confirmation_document_task
+
+    confirmations = seeded['confirmations']
+
+    def process(iteration):
+        confirmation = confirmations[iteration % SEEDED_TASKS]
+        task = ProcessingTask.objects.create(
+            business_confirmation=confirmation, celery_task_id=f'benchmark-process-{iteration}',
+        )
+        process_confirmation_task.apply(args=[task.id], task_id=task.celery_task_id).get()
+
+    def render(iteration):
+        # A confirmation not rendered before, so the document is built every time
+        confirmation = confirmations[SEEDED_TASKS + iteration % (len(confirmations) - SEEDED_TASKS)]
+        render_confirmation_document_task.apply(args=[confirmation.id, 'docx']).get()
+
+    scenarios = [
+        Scenario('task process_confirmation_task', 'process_confirmation_task', run=process,
+                 limit=SEEDED_TASKS, kind='task'),
+        Scenario('task render_confirmation_document_task (docx)', 'render_confirmation_document_task',
+                 run=render, kind='task'),
+    ]
+    for file_name, path in assay_paths.items():
+        def parse(iteration, file_name=file_name, path=path):
+            job = AssayParseJob.objects.create(
+                celery_task_id=f'benchmark-parse-{file_name}-{iteration}', file_name=file_name, file_path=path,
+            )
+            parse_assay_file_task.apply(args=[job.id]).get()
+
+        scenarios.append(Scenario(f'task parse_assay_file_task {file_name}', 'parse_assay_file_task',
+                                  run=parse, kind='task'))
+    return scenarios
+
+
+@contextmanager
+def isolated_services(media_root, stub_latency):
+    """Local caches, no Redis events, a stub model provider and files under media_root.
+
+    Celery is pointed at the in-memory transport and result backend: routes
+    that queue work publish to memory and the pipeline's chord waits on an
+    in-memory result.
+    """
+    local_caches = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'},
+        settings.AI_SUGGESTIONS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-suggestions',
+        },
+        settings.AI_SUGGESTIONS_META_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-suggestions-meta',
+        },
+    }
+    with override_settings(
+        CACHES=local_caches,
+        MEDIA_ROOT=media_root,
+        CONFIRMATION_DOCUMENT_DIR=os.path.join(media_root, 'confirmations'),
+        TASK_EVENTS_REDIS_URL='memory://',
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        CONFIRMATION_NOTIFICATION_RECIPIENTS=['benchmark@example.com'],
+        ALLOWED_HOSTS=['testserver'],
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+    ):
+        set_provider(StubProvider(latency=stub_latency, seed=0))
+        # The project app keeps the result backend it built first (Redis, if a
+        # task ran earlier in this process). A dedicated app reads the settings
+        # above instead; shared tasks resolve against whichever app is current.
+        isolated_app = Celery('backend', set_as_current=False)
+        isolated_app.config_from_object('django.conf:settings', namespace='CELERY')
+        isolated_app.set_default()
+        isolated_app.set_current()
+        try:
+            yield
+        finally:
+            celery_app.set_default()
+            celery_app.set_current()
+            isolated_app.close()
+            reset_provider()
+
+
+def run_suite(confirmations=2000, requests=50, task_runs=10, assay_rows=(100, 5000), assay_requests=10,
+              stub_latency=0.0, seed=42, progress=None):
+    """Seed the current database, run every scenario and return the results.
+
+    The caller provides an empty database it can throw away (run_benchmarks
+    creates a test database).
+    `progress` is called with each result as it is measured.
+    """
+    started_at = timezone.now()
+    rng = np.random.default_rng(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as media_root, isolated_services(media_root, stub_latency):
+        from .tasks import render_confirmation_document_task
+
+        seeded = seed_database(confirmations, rng)
+        assay_files = synthetic_assay_files(assay_rows, rng)
+        assay_paths = {}
+        for file_name, content in assay_files.items():
+            assay_paths[file_name] = os.path.join(media_root, file_name)
+            with open(assay_paths[file_name], 'wb') as file:
+                file.write(content)
+        # Rendered up front so the download route serves the stored document
+        render_confirmation_document_task.apply(args=[seeded['confirmations'][0].id, 'pdf']).get()
+
+        scenarios = http_scenarios(seeded, assay_files, requests)
+        missing = uncovered_routes(scenarios)
+        if missing:
+            raise ValueError(f"Routes without a benchmark scenario: {', '.join(missing)}")
+
+        client = Client()
+        for scenario in scenarios:
+            iterations = assay_requests if scenario.route == 'parse-assay-file' else requests
+            results.append(measure(scenario, client, iterations))
+            if progress:
+                progress(results[-1])
+        for scenario in task_scenarios(seeded, assay_paths):
+            results.append(measure(scenario, client, task_runs))
+            if progress:
+                progress(results[-1])
+
+    return {
+        'version': RESULTS_FORMAT_VERSION,
+        'started_at': started_at.isoformat(),
+        'environment': environment(),
+        'parameters': {
+            'confirmations': confirmations, 'requests': requests, 'task_runs': task_runs,
+            'assay_rows': list(assay_rows), 'assay_requests': assay_requests,
+            'stub_latency': stub_latency, 'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """(name, metric, baseline, current, change %) for every p50/p99 or
+    throughput that got worse than the baseline by more than threshold %"""
+    before = {row['name']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results['results']:
+        old = before.get(row['name'])
+        if old is None:
+            continue
+        for metric, higher_is_worse in (('p50_ms', True), ('p99_ms', True), ('throughput_per_s', False)):
+            if not old.get(metric) or row.get(metric) is None:
+                continue
+            change = (row[metric] - old[metric]) / old[metric] * 100
+            if (change if higher_is_worse else -change) > threshold:
+                regressions.append((row['name'], metric, old[metric], row[metric], round(change, 1)))
+    return regressions
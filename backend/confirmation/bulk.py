@@ -0,0 +1,82 @@
+import uuid
+
+from celery import group
+from django.db import transaction
+from rest_framework import serializers
+
+from .analytics import record_created
+from .models import BusinessConfirmation, ProcessingTask
+from .serializers import BusinessConfirmationBulkItemSerializer
+from .tasks import process_confirmation_task
+
+CONFIRMATION_FOREIGN_KEYS = [
+    field for field in BusinessConfirmation._meta.concrete_fields if field.is_relation
+]
+
+
+def validate_confirmation_rows(items):
+    """Validate a batch in one pass.
+
+    Returns (rows, errors), both with one entry per item: the validated data
+    (None for an invalid item) and that item's field errors ({} if valid).
+    """
+    rows, errors = [], []
+    for item in items:
+        serializer = BusinessConfirmationBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            rows.append(serializer.validated_data)
+            errors.append({})
+        else:
+            rows.append(None)
+            errors.append(dict(serializer.errors))
+    for row_errors, reference_errors in zip(errors, find_missing_references(rows)):
+        row_errors.update(reference_errors)
+    return rows, errors
+
+
+def find_missing_references(rows):
+    """Per-row errors for foreign key ids that do not exist.
+
+    Runs one `pk IN (...)` query per related model over the whole batch;
+    rows that are None (already invalid) are skipped.
+    """
+    rows = [row or {} for row in rows]
+    errors = [{} for _ in rows]
+    message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+    for field in CONFIRMATION_FOREIGN_KEYS:
+        ids = {row[field.attname] for row in rows if row.get(field.attname) is not None}
+        if not ids:
+            continue
+        existing = set(field.related_model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        for row, row_errors in zip(rows, errors):
+            pk_value = row.get(field.attname)
+            if pk_value is not None and pk_value not in existing:
+                row_errors[field.name] = [message.format(pk_value=pk_value)]
+    return errors
+
+
+def bulk_create_confirmations(rows, process=False):
+    """Insert validated rows in one transaction and optionally queue their processing.
+
+    Returns (confirmations, processing_tasks). Processing is dispatched as a
+    single Celery group once the transaction commits, so workers never look
+    up rows that are not visible yet.
+    """
+    with transaction.atomic():
+        confirmations = BusinessConfirmation.objects.bulk_create(
+            [BusinessConfirmation(**row) for row in rows]
+        )
+        # bulk_create sends no post_save, so the summary is updated here
+        record_created(confirmations)
+        processing_tasks = []
+        if process:
+            processing_tasks = ProcessingTask.objects.bulk_create([
+                ProcessingTask(business_confirmation=confirmation, celery_task_id=str(uuid.uuid4()))
+                for confirmation in confirmations
+            ])
+            dispatch = group(
+                process_confirmation_task.signature((task.id,), task_id=task.celery_task_id)
+                for task in processing_tasks
+            )
+            transaction.on_commit(dispatch.apply_async)
+    return confirmations, processing_tasks
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+# Bump when the layout changes so every stored document is rendered again
+DOCUMENT_LAYOUT_VERSION = 2
+
+DOCUMENT_FORMATS = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain; charset=utf-8',
+}
+
+
+def content_hash(confirmation, document_format):
+    """Hash of everything that appears in the document, so an unchanged
+    confirmation maps to the same stored file. updated_at is left out: saving
+    without changes must not invalidate the document."""
+    fields = {
+        field.name: str(getattr(confirmation, field.name)) if field.is_relation else getattr(confirmation, field.attname)
+        for field in confirmation._meta.concrete_fields
+        if field.name not in ('updated_at', 'assay_file')
+    }
+    payload = json.dumps(
+        {'fields': fields, 'format': document_format, 'layout': DOCUMENT_LAYOUT_VERSION},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def document_path(digest, document_format):
+    return os.path.join(settings.CONFIRMATION_DOCUMENT_DIR, f'{digest}.{document_format}')
+
+
+def render_lock_key(digest):
+    """Cache key held while a render of this content is queued or running"""
+    return f'confirmation-document:{digest}'
+
+
+def _value(value, suffix=''):
+    return f'{value}{suffix}' if value not in (None, '') else '-'
+
+
+def document_sections(confirmation):
+    """[(heading, [(label, value), ...], clause text or None), ...] shared by every format"""
+    c = confirmation
+    return [
+        ('Deal', [
+            ('Seller', _value(c.seller)),
+            ('Buyer', _value(c.buyer)),
+            ('Material', _value(c.material)),
+            ('Quantity', f'{_value(c.quantity, " dmt")} +/- {c.quantity_tolerance}%'),
+        ], None),
+        ('Delivery', [
+            ('Term', _value(c.delivery_term)),
+            ('Point', _value(c.delivery_point)),
+            ('Packaging', _value(c.packaging)),
+            ('Transport', _value(c.transport_mode)),
+            ('Shipment period', f'{_value(c.shipment_period_from)} to {_value(c.shipment_period_to)}'),
+            ('Inland freight for buyer', 'Yes' if c.inland_freight_buyer else 'No'),
+            ('Shipments evenly distributed', 'Yes' if c.shipments_evenly_distributed else 'No'),
+        ], None),
+        ('Quality', [
+            ('Pb', _value(c.assay_pb, '%')),
+            ('Zn', _value(c.assay_zn, '%')),
+            ('Cu', _value(c.assay_cu, '%')),
+            ('Ag', _value(c.assay_ag, ' g/t')),
+            ('China import compliant', 'Yes' if c.china_import_compliant else 'No'),
+            ('Free of harmful impurities', 'Yes' if c.free_of_harmful_impurities else 'No'),
+        ], None),
+        ('Pricing', [
+            ('Treatment charge', _value(c.treatment_charge, ' /dmt')),
+            ('Refining charge', _value(c.refining_charge, ' /toz')),
+        ], None),
+        ('Payment', [
+            ('Method', _value(c.payment_method)),
+            ('Currency', _value(c.currency)),
+            ('Triggering event', _value(c.triggering_event)),
+            ('Prepayment', f'{c.prepayment_percentage}%'),
+            ('Provisional payment', _value(c.provisional_payment)),
+            ('Final payment', _value(c.final_payment)),
+        ], c.payment_clause),
+        ('Surveyor', [
+            ('Nominated surveyor', _value(c.nominated_surveyor)),
+            ('Cost sharing', f'buyer {c.cost_sharing_buyer}% / seller {c.cost_sharing_seller}%'),
+        ], c.surveyor_clause),
+        ('Weighing, sampling & moisture determination', [
+            ('Final location', _value(c.final_location)),
+        ], c.wsmd_clause),
+    ]
+
+
+def document_title(confirmation):
+    return f'Business Confirmation No. {confirmation.id}'
+
+
+def render_pdf(confirmation):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    from xml.sax.saxutils import escape
+
+    styles = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=A4, title=document_title(confirmation), invariant=1)
+    story = [
+        Paragraph(escape(document_title(confirmation)), styles['Title']),
+        Paragraph(f'Date: {confirmation.created_at:%Y-%m-%d}', styles['Normal']),
+    ]
+    for heading, rows, clause in document_sections(confirmation):
+        story += [Spacer(1, 4 * mm), Paragraph(escape(heading), styles['Heading2'])]
+        table = Table(
+            [[Paragraph(escape(label), styles['Normal']), Paragraph(escape(value), styles['Normal'])] for label, value in rows],
+            colWidths=[60 * mm, 110 * mm],
+        )
+        table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]))
+        story.append(table)
+        if clause:
+            story += [Spacer(1, 2 * mm), Paragraph(escape(clause), styles['Italic'])]
+    document.build(story)
+    return buffer.getvalue()
+
+
+def render_docx(confirmation):
+    from docx import Document
+
+    document = Document()
+    document.core_properties.title = document_title(confirmation)
+    document.add_heading(document_title(confirmation), level=0)
+    document.add_paragraph(f'Date: {confirmation.created_at:%Y-%m-%d}')
+    for heading, rows, clause in document_sections(confirmation):
+        document.add_heading(heading, level=1)
+        table = document.add_table(rows=0, cols=2)
+        table.style = 'Table Grid'
+        for label, value in rows:
+            cells = table.add_row().cells
+            cells[0].text = label
+            cells[1].text = value
+        if clause:
+            document.add_paragraph().add_run(clause).italic = True
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def render_txt(confirmation):
+    # Same sections as the pdf and docx; plain text, so nothing is HTML-escaped
+    return render_to_string('confirmation/business_confirmation.txt', {
+        'confirmation': confirmation,
+        'title': document_title(confirmation),
+        'sections': document_sections(confirmation),
+    }).encode('utf-8')
+
+
+RENDERERS = {'pdf': render_pdf, 'docx': render_docx, 'txt': render_txt}
+
+
+def render_document(confirmation, document_format):
+    """Render the confirmation unless a document with the same content hash is
+    stored already; returns {'document', 'content_hash', 'rendered'}"""
+    digest = content_hash(confirmation, document_format)
+    path = document_path(digest, document_format)
+    rendered = not os.path.exists(path)
+    if rendered:
+        content = RENDERERS[document_format](confirmation)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as document:
+            document.write(content)
+        os.replace(temporary_path, path)
+    return {
+        'document': os.path.relpath(path, settings.MEDIA_ROOT),
+        'content_hash': digest,
+        'rendered': rendered,
+    }
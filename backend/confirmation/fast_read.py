@@ -0,0 +1,167 @@
+import decimal
+import json
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+# Serializer fields whose representation of a values() cell is the cell itself
+PASS_THROUGH_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.FloatField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.JSONField, serializers.PrimaryKeyRelatedField,
+)
+# Fields whose to_representation accepts the raw value (Decimal, datetime, date)
+CONVERTED_FIELDS = (serializers.DecimalField, serializers.DateTimeField, serializers.DateField)
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Compact JSON bytes, via orjson when it is installed"""
+    if orjson is not None:
+        # Non-str keys (ints in error dicts, say) are stringified as json.dumps does
+        return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer through orjson.
+
+    ValuesListMixin views also render create responses and errors with it,
+    so anything orjson refuses (integers beyond 64 bits) is handed to the
+    DRF renderer instead.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        try:
+            return dumps(data)
+        except TypeError:  # orjson.JSONEncodeError
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ValuesReader:
+    """Builds a ModelSerializer's output from queryset.values() rows.
+
+    Skips instantiating a model and running every serializer field per row;
+    cells are renamed (buyer_id -> buyer) and only decimals, dates and file
+    names are converted. Use `for_serializer`, which returns None when the
+    serializer has a field this cannot reproduce (nested, method fields).
+    """
+
+    def __init__(self, spec):
+        # (output key, values() column, converter or None)
+        self.spec = spec
+        self.columns = [column for _, column, _ in spec]
+        self.identity = all(key == column and convert is None for key, column, convert in spec)
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        model = serializer.Meta.model
+        request = serializer.context.get('request')
+        spec = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                return None
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.FileField):
+                spec.append((name, model_field.attname, file_url_converter(model_field, request)))
+            elif isinstance(field, CONVERTED_FIELDS):
+                spec.append((name, model_field.attname, representation_converter(field)))
+            elif isinstance(field, PASS_THROUGH_FIELDS):
+                spec.append((name, model_field.attname, None))
+            else:
+                return None
+        return cls(spec)
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def convert(self, rows):
+        if self.identity:
+            return list(rows)
+        spec = self.spec
+        return [
+            {
+                key: convert(row[column]) if convert is not None and row[column] is not None else row[column]
+                for key, column, convert in spec
+            }
+            for row in rows
+        ]
+
+
+def representation_converter(field):
+    """field.to_representation for non-null cells, with the default formats inlined.
+
+    DRF re-reads its settings and rebuilds a decimal context on every call,
+    which dominates a values() read; the result here is the same string.
+    """
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+            return field.to_representation
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+        return lambda value: f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        tz = getattr(field, 'timezone', field.default_timezone())
+        if output_format is None or output_format.lower() != ISO_8601 or tz is None:
+            return field.to_representation
+
+        def convert(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            text = value.astimezone(tz).isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert
+
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    return lambda value: value.isoformat()
+
+
+def file_url_converter(model_field, request):
+    def convert(name):
+        if not name:
+            return None
+        url = model_field.storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+class ValuesListMixin:
+    """Fast `list()` for generic list views, same output as the serializer.
+
+    Reads rows with values() and renders them with FastJSONRenderer; falls
+    back to the serializer when ValuesReader cannot reproduce its output.
+    """
+
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        reader = ValuesReader.for_serializer(self.get_serializer())
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.convert(page))
+        return Response(reader.convert(queryset))
+
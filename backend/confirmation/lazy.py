@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module that is imported on first attribute access.
+
+    `np = LazyModule('numpy')` keeps call sites like `np.array(...)` as they
+    are while moving the import from process start to the first use, so
+    workers that never value a book or load a price series never pay for it.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            # import_module holds the import lock, so concurrent first uses load it once
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
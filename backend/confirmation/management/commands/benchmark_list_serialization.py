@@ -0,0 +1,103 @@
+import json
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from ...fast_read import ValuesReader, dumps
+from ...models import BusinessConfirmation, Buyer, Currency, Material, Surveyor
+from ...serializers import BusinessConfirmationSerializer, BuyerSerializer, SurveyorSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of the serializer list path with the values() + fast JSON path. "
+        "Seeds synthetic rows in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Confirmations to seed (lookups get rows/10)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best one is reported')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        if rows < 10 or repeat < 1:
+            raise CommandError('--rows must be at least 10 and --repeat at least 1')
+
+        request = Request(RequestFactory().get('/api/'))
+        try:
+            with transaction.atomic():
+                self.seed(rows)
+                cases = [
+                    ('buyers', Buyer.objects.all(), BuyerSerializer),
+                    ('surveyors', Surveyor.objects.all(), SurveyorSerializer),
+                    ('business-confirmations', BusinessConfirmation.objects.order_by('-created_at', '-id'),
+                     BusinessConfirmationSerializer),
+                ]
+                for name, queryset, serializer_class in cases:
+                    self.compare(name, queryset, serializer_class, request, repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        lookups = max(rows // 10, 1)
+        buyers = Buyer.objects.bulk_create([Buyer(name=f'Buyer {i}') for i in range(lookups)])
+        Surveyor.objects.bulk_create([
+            Surveyor(name=f'Surveyor {i}', company=f'Company {i % 20}', contact_info=f'surveyor{i}@example.com')
+            for i in range(lookups)
+        ])
+        material = Material.objects.create(name='Lead concentrate')
+        currency, _ = Currency.objects.get_or_create(code='USD', defaults={'name': 'US Dollar', 'symbol': '$'})
+        start = date(2025, 1, 1)
+        BusinessConfirmation.objects.bulk_create([
+            BusinessConfirmation(
+                buyer=buyers[i % lookups], material=material, currency=currency,
+                quantity=Decimal(1000 + i % 500), treatment_charge=Decimal('320.50'),
+                refining_charge=Decimal('4.35'), assay_pb=Decimal('55.20'),
+                shipment_period_from=start + timedelta(days=i % 300),
+                shipment_period_to=start + timedelta(days=i % 300 + 30),
+            )
+            for i in range(rows)
+        ], batch_size=500)
+
+    def compare(self, name, queryset, serializer_class, request, repeat):
+        count = queryset.count()
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            return renderer.render(serializer_class(queryset.all(), many=True, context={'request': request}).data)
+
+        reader = ValuesReader.for_serializer(serializer_class(context={'request': request}))
+
+        def values_path():
+            return dumps(reader.convert(reader.values(queryset.all())))
+
+        before, before_body = self.best_of(serializer_path, repeat)
+        after, after_body = self.best_of(values_path, repeat)
+        if json.loads(before_body) != json.loads(after_body):
+            raise CommandError(f'{name}: fast path output differs from the serializer output')
+
+        self.stdout.write(
+            f"{name:<24} {count:>7} rows  serializer {count / before:>10,.0f} rows/s  "
+            f"values+fast json {count / after:>10,.0f} rows/s  ({before / after:.1f}x)"
+        )
+
+    @staticmethod
+    def best_of(func, repeat):
+        best, body = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
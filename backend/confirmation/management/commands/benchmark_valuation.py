@@ -0,0 +1,85 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...models import BusinessConfirmation
+from ...valuation import load_book, value_arrays, value_confirmation
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure valuation throughput on synthetic lots: the vectorized book pass "
+        "(with and without the one-query load) against valuing lots one at a time. "
+        "Seeds the lots in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=100000, help='Synthetic confirmations to seed')
+        parser.add_argument('--sample', type=int, default=2000, help='Lots valued one at a time for the baseline')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        lots, sample = options['lots'], options['sample']
+        if lots < 1 or not 1 <= sample <= lots:
+            raise CommandError('--lots must be positive and --sample between 1 and --lots')
+
+        prices = dict(settings.VALUATION_DEFAULT_PRICES)
+        try:
+            with transaction.atomic():
+                self.seed(lots, np.random.default_rng(options['seed']))
+                queryset = BusinessConfirmation.objects.all()
+
+                started = time.perf_counter()
+                ids, arrays = load_book(queryset)
+                loaded = time.perf_counter()
+                result = value_arrays(arrays, prices)
+                valued = time.perf_counter()
+
+                confirmations = list(queryset.order_by('id')[:sample])
+                single_started = time.perf_counter()
+                rows = [value_confirmation(confirmation, prices) for confirmation in confirmations]
+                single = time.perf_counter() - single_started
+
+                expected = np.round(result['provisional_value'][:sample], 2)
+                if not np.allclose([row['provisional_value'] for row in rows], expected):
+                    raise CommandError('Vectorized and single-lot valuations differ')
+                raise Rollback
+        except Rollback:
+            pass
+
+        load_time, value_time = loaded - started, valued - loaded
+        self.stdout.write(f"{'one query load':<28} {len(ids) / load_time:>14,.0f} lots/s  ({load_time:.3f}s)")
+        self.stdout.write(f"{'vectorized valuation':<28} {len(ids) / value_time:>14,.0f} lots/s  ({value_time:.4f}s)")
+        self.stdout.write(
+            f"{'load + valuation':<28} {len(ids) / (load_time + value_time):>14,.0f} lots/s  "
+            f"({load_time + value_time:.3f}s)"
+        )
+        self.stdout.write(
+            f"{'one lot at a time':<28} {sample / single:>14,.0f} lots/s  "
+            f"(vectorized is {(single / sample) / (value_time / len(ids)):,.0f}x faster)"
+        )
+
+    def seed(self, lots, rng):
+        def decimals(low, high, size=lots):
+            return [Decimal(f'{value:.2f}') for value in rng.uniform(low, high, size)]
+
+        quantity, pb, zn, cu, ag = decimals(500, 20000), decimals(40, 70), decimals(3, 55), decimals(0, 25), decimals(0, 900)
+        tc, rc = decimals(100, 350), decimals(0, 5)
+        prepayment = rng.integers(0, 100, lots).tolist()
+        BusinessConfirmation.objects.bulk_create([
+            BusinessConfirmation(
+                quantity=quantity[i], assay_pb=pb[i], assay_zn=zn[i], assay_cu=cu[i], assay_ag=ag[i],
+                treatment_charge=tc[i], refining_charge=rc[i], prepayment_percentage=prepayment[i],
+                shipment_period_from=date(2025, 1 + i % 12, 1),
+            )
+            for i in range(lots)
+        ], batch_size=1000)
@@ -0,0 +1,133 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Each script brings a fresh interpreter to the point where the process can
+# serve, and prints the seconds that took
+STARTUP_SCRIPTS = {
+    # A WSGI worker: the application, then the URLconf its first request loads
+    'wsgi': (
+        "import time; started = time.perf_counter()\n"
+        "from django.core.wsgi import get_wsgi_application\n"
+        "get_wsgi_application()\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+        "print(time.perf_counter() - started)\n"
+    ),
+    # manage.py runserver with Daphne (ASGI_RUNSERVER), then the system checks it runs first
+    'runserver': (
+        "import os, time; started = time.perf_counter()\n"
+        "os.environ['ASGI_RUNSERVER'] = 'true'\n"
+        "import django; django.setup()\n"
+        "from django.core.management import get_commands, load_command_class\n"
+        "load_command_class(get_commands()['runserver'], 'runserver')\n"
+        "from django.core.checks import run_checks; run_checks()\n"
+        "print(time.perf_counter() - started)\n"
+    ),
+    # celery -A backend worker: the app, the worker class, then Django setup and task discovery
+    'worker': (
+        "import time; started = time.perf_counter()\n"
+        "from backend.celery import app\n"
+        "from celery.apps.worker import Worker\n"
+        "app.loader.import_default_modules()\n"
+        "print(time.perf_counter() - started)\n"
+    ),
+}
+
+
+def run_script(script, importtime=False):
+    """(seconds, -X importtime lines) of one cold start"""
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', script]
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+    result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise CommandError(f"Startup script failed:\n{result.stderr[-2000:]}")
+    lines = [line for line in result.stderr.splitlines() if line.startswith('import time:')]
+    return float(result.stdout.strip().splitlines()[-1]), lines
+
+
+def parse_importtime(lines):
+    """[(module, self µs, cumulative µs)] from -X importtime output"""
+    modules = []
+    for line in lines:
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue  # the header line
+    return modules
+
+
+def summarize_imports(modules, top):
+    """Import time per top-level package, and the slowest project modules"""
+    packages = {}
+    for name, self_us, _ in modules:
+        package = name.split('.')[0]
+        count, total = packages.get(package, (0, 0))
+        packages[package] = (count + 1, total + self_us)
+    project = {}
+    for name, _, cumulative in modules:
+        if name.startswith('backend.'):
+            # A module whose import was started by a parent package appears twice; keep the full one
+            project[name] = max(project.get(name, 0), cumulative)
+    return {
+        'modules_imported': len(modules),
+        'import_seconds': round(sum(self_us for _, self_us, _ in modules) / 1e6, 4),
+        'packages': [
+            {'package': package, 'modules': count, 'seconds': round(total / 1e6, 4)}
+            for package, (count, total) in sorted(packages.items(), key=lambda item: -item[1][1])[:top]
+        ],
+        'project_modules': [
+            {'module': name, 'cumulative_seconds': round(cumulative / 1e6, 4)}
+            for name, cumulative in sorted(project.items(), key=lambda item: -item[1])[:top]
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start of a WSGI worker, manage.py runserver and a Celery worker in fresh "
+        "interpreters, and report which packages and project modules the import time goes to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(STARTUP_SCRIPTS), action='append',
+                            help='Process to measure; repeat for several (default: all)')
+        parser.add_argument('--repeat', type=int, default=5, help='Cold starts timed per target; the median is reported')
+        parser.add_argument('--top', type=int, default=15, help='Packages and project modules listed')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['top'] < 1:
+            raise CommandError('--repeat and --top must be positive')
+
+        report = {}
+        for target in options['target'] or sorted(STARTUP_SCRIPTS):
+            script = STARTUP_SCRIPTS[target]
+            timings = [run_script(script)[0] for _ in range(options['repeat'])]
+            # Timed separately: -X importtime itself slows the imports down
+            _, lines = run_script(script, importtime=True)
+            report[target] = {
+                'startup_seconds': round(statistics.median(timings), 4),
+                'startup_seconds_min': round(min(timings), 4),
+                **summarize_imports(parse_importtime(lines), options['top']),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for target, result in report.items():
+            self.stdout.write(
+                f"{target}: {result['startup_seconds']:.3f}s to ready (median of {options['repeat']}, "
+                f"min {result['startup_seconds_min']:.3f}s), {result['modules_imported']} modules imported"
+            )
+            for row in result['packages']:
+                self.stdout.write(f"  {row['package']:<32} {row['seconds'] * 1000:>9.1f}ms  {row['modules']:>4} modules")
+            self.stdout.write('  slowest project modules (including what they import):')
+            for row in result['project_modules']:
+                self.stdout.write(f"    {row['module']:<38} {row['cumulative_seconds'] * 1000:>9.1f}ms")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...prices import ingest_price_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest daily metal price / FX CSV files: long (date,symbol,value) or wide "
+        "(date,PB,ZN,CU,AG,EUR,...). Existing prices for the same symbol and date are replaced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV files to ingest')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            started = time.perf_counter()
+            try:
+                with open(path, 'rb') as file:
+                    counts = ingest_price_file(file)
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                raise CommandError(f'{path}: {e}')
+            summary = ', '.join(f'{symbol} {count}' for symbol, count in sorted(counts.items())) or 'no prices'
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: {sum(counts.values())} prices ({summary}) in {time.perf_counter() - started:.2f}s"
+            ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...analytics import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the ConfirmationSummary table from every business confirmation. "
+        "Run once after migrating, and after any bulk change that bypassed model signals."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        buckets = rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {buckets} analytics buckets in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import BusinessConfirmation
+from ...valuation import ELEMENTS, VALUE_FIELDS, open_confirmations, parse_prices, value_book
+
+
+class Command(BaseCommand):
+    help = "Revalue every business confirmation at the given metal prices and print the book totals."
+
+    def add_arguments(self, parser):
+        for element in ELEMENTS:
+            unit = 'USD/toz' if element == 'ag' else 'USD/t'
+            parser.add_argument(f'--price-{element}', help=f'{element.capitalize()} price in {unit}')
+        parser.add_argument('--price-date', help='Use stored prices as of this day (YYYY-MM-DD) where no price is given')
+        parser.add_argument('--open', action='store_true', help='Only confirmations whose shipment period has not ended')
+
+    def handle(self, *args, **options):
+        try:
+            prices = parse_prices({
+                'price_date': options['price_date'],
+                **{f'price_{element}': options[f'price_{element}'] for element in ELEMENTS},
+            })
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        queryset = open_confirmations() if options['open'] else BusinessConfirmation.objects.all()
+        started = time.perf_counter()
+        valuation = value_book(queryset, prices)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write('Prices: ' + ', '.join(f'{element} {price:,.2f}' for element, price in prices.items()))
+        for name in VALUE_FIELDS:
+            self.stdout.write(f"{name:<24} {valuation['totals'][name]:>20,.2f}")
+        self.stdout.write(self.style.SUCCESS(f"Revalued {valuation['lot_count']} lots in {elapsed:.3f}s"))
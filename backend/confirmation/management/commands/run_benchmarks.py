@@ -0,0 +1,82 @@
+import contextlib
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...benchmarks import SEEDED_TASKS, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API route and the Celery tasks against a freshly seeded test database, "
+        "with a stub model provider, local caches and an in-memory Celery broker. "
+        "Reports throughput and p50/p90/p99 latency; --output writes them as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--confirmations', type=int, default=2000, help='Confirmations to seed')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route scenario')
+        parser.add_argument('--tasks', type=int, default=10, help='Timed runs per Celery task scenario')
+        parser.add_argument('--assay-rows', default='100,5000',
+                            help='Comma-separated row counts; a CSV and an XLSX file are generated for each')
+        parser.add_argument('--assay-requests', type=int, default=10, help='Timed uploads per assay file scenario')
+        parser.add_argument('--stub-latency', type=float, default=0.0, help='Seconds the stub model takes per call')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results as JSON to this file ('-' for stdout)")
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Percent a p50/p99 or throughput may worsen against --baseline before failing')
+
+    def handle(self, *args, **options):
+        try:
+            assay_rows = [int(rows) for rows in options['assay_rows'].split(',') if rows.strip()]
+        except ValueError:
+            raise CommandError('--assay-rows must be comma-separated integers')
+        if options['confirmations'] <= SEEDED_TASKS * 2:
+            raise CommandError(f'--confirmations must be more than {SEEDED_TASKS * 2}')
+        if min(options['requests'], options['tasks'], options['assay_requests'], *assay_rows) < 1:
+            raise CommandError('--requests, --tasks, --assay-requests and --assay-rows must be positive')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        to_stdout = options['output'] == '-'
+
+        def progress(row):
+            if not to_stdout:
+                self.stdout.write(
+                    f"{row['name']:<58} {row['throughput_per_s']:>10,.1f}/s  p50 {row['p50_ms']:>9.2f}ms  "
+                    f"p99 {row['p99_ms']:>9.2f}ms" + (f"  {row['errors']} errors" if row['errors'] else '')
+                )
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # The pipeline and views print as they go; keep that out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = run_suite(
+                    confirmations=options['confirmations'], requests=options['requests'],
+                    task_runs=options['tasks'], assay_rows=assay_rows, assay_requests=options['assay_requests'],
+                    stub_latency=options['stub_latency'], seed=options['seed'], progress=progress,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if to_stdout:
+            self.stdout.write(json.dumps(results, indent=2))
+        elif options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        errors = sum(row['errors'] for row in results['results'])
+        if errors:
+            raise CommandError(f'{errors} benchmarked requests failed')
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            for name, metric, before, after, change in regressions:
+                self.stderr.write(f"{name}: {metric} {before} -> {after} ({change:+}%)")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions over {options['threshold']}% against the baseline")
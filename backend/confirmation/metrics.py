@@ -0,0 +1,316 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TASK_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram as Prometheus expects it"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[position] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            yield from histogram_samples(self.name, self.labelnames, key, self.buckets, counts, total)
+
+
+def histogram_samples(name, labelnames, key, buckets, counts, total):
+    """Exposition lines for per-bucket (non-cumulative) counts, the last being +Inf"""
+    cumulative = 0
+    for bound, count in zip([*buckets, '+Inf'], counts):
+        cumulative += count
+        le = bound if isinstance(bound, str) else _number(float(bound))
+        yield f'{name}_bucket{_labels(labelnames, key, [("le", le)])} {cumulative}'
+    yield f'{name}_sum{_labels(labelnames, key)} {_number(float(total))}'
+    yield f'{name}_count{_labels(labelnames, key)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """func() yields (name, type, help, sample lines) computed at scrape time"""
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        families = [(m.name, m.type, m.documentation, list(m.samples())) for m in self.metrics]
+        for collect in self.collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {e}")
+        for name, metric_type, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time until the response is returned, by route',
+    ('method', 'route', 'status'),
+))
+db_queries = registry.register(Counter(
+    'db_queries_total', 'Database queries run while serving requests, by route', ('route',),
+))
+db_query_duration = registry.register(Counter(
+    'db_query_duration_seconds_total', 'Time spent in database queries while serving requests, by route', ('route',),
+))
+provider_call_duration = registry.register(Histogram(
+    'ai_provider_call_duration_seconds', 'External model calls by provider, call type and outcome',
+    ('provider', 'call', 'outcome'),
+))
+assay_parse_duration = registry.register(Histogram(
+    'assay_parse_duration_seconds', 'Assay file parsing in the web process, by file type', ('format',),
+))
+
+
+class RequestStats:
+    """Timings gathered while one request (or task) runs, for Server-Timing"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+# Context variables are copied into sync_to_async threads, so queries run
+# there for an async view are still counted against its request
+_current = contextvars.ContextVar('confirmation_request_stats', default=None)
+
+
+def record_timing(name, seconds):
+    """Attribute time to the current request's Server-Timing entry `name`"""
+    stats = _current.get()
+    if stats is not None:
+        stats.add(name, seconds)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries and their time per request"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver; wrappers live on the connection object, so add once"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    # The route pattern, not the path, keeps ids out of the label values
+    return match.route if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Records latency and query counts per route, and adds a Server-Timing
+    header (db, ai, ... and total) when METRICS_SERVER_TIMING is on.
+
+    For streaming responses the latency is the time to the first byte.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        route = route_of(request)
+        http_request_duration.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        if stats.queries:
+            db_queries.inc(stats.queries, route=route)
+            db_query_duration.inc(stats.db_time, route=route)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(stats, elapsed)
+        return response
+
+
+def server_timing(stats, elapsed):
+    entries = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stats.timings.items()]
+    entries.append(f'total;dur={elapsed * 1000:.1f}')
+    return ', '.join(entries)
+
+
+# Celery prefork children cannot be scraped, so task durations are counted in
+# the shared cache: one key per bucket plus the sum, read back at scrape time.
+TASK_METRIC_PREFIX = 'metrics:celery-task'
+TASK_OUTCOMES = ('success', 'failure', 'retry', 'replaced')
+_task_started = {}
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None or task is None:
+        return
+    # A task that hands over to a chain with self.replace() ends IGNORED
+    outcome = {'SUCCESS': 'success', 'RETRY': 'retry', 'IGNORED': 'replaced'}.get(state, 'failure')
+    record_task_duration(task.name, outcome, time.perf_counter() - started)
+
+
+def record_task_duration(task_name, outcome, seconds):
+    prefix = f'{TASK_METRIC_PREFIX}:{task_name}:{outcome}'
+    try:
+        _incr(f'{prefix}:bucket:{bisect_left(TASK_BUCKETS, seconds)}', 1)
+        # Sums are kept in microseconds: cache.incr only adds integers
+        _incr(f'{prefix}:sum', int(seconds * 1_000_000))
+    except Exception as e:
+        print(f"Could not record duration of task {task_name}: {e}")
+
+
+@registry.collector
+def collect_task_durations():
+    from celery import current_app
+
+    names = sorted(name for name in current_app.tasks if not name.startswith('celery.'))
+    keys = {
+        (name, outcome): [f'{TASK_METRIC_PREFIX}:{name}:{outcome}:bucket:{i}' for i in range(len(TASK_BUCKETS) + 1)]
+        + [f'{TASK_METRIC_PREFIX}:{name}:{outcome}:sum']
+        for name in names for outcome in TASK_OUTCOMES
+    }
+    stored = cache.get_many([key for group in keys.values() for key in group])
+    samples = []
+    for (name, outcome), group in keys.items():
+        counts = [stored.get(key, 0) for key in group[:-1]]
+        if not any(counts):
+            continue
+        total = stored.get(group[-1], 0) / 1_000_000
+        samples += histogram_samples(
+            'celery_task_duration_seconds', ('task', 'outcome'), (name, outcome), TASK_BUCKETS, counts, total
+        )
+    yield 'celery_task_duration_seconds', 'histogram', 'Celery task run time by task and outcome', samples
+
+
+@registry.collector
+def collect_suggestion_cache():
+    from .suggestion_cache import STAT_NAMES, suggestion_cache
+
+    stats = suggestion_cache.stats()
+    for name in STAT_NAMES:
+        yield (
+            f'ai_suggestion_cache_{name}_total', 'counter', f'AI suggestion cache {name} (all processes)',
+            [f'ai_suggestion_cache_{name}_total {stats[name]}'],
+        )
+    yield (
+        'ai_suggestion_cache_hit_ratio', 'gauge', 'Hits / (hits + misses) of the AI suggestion cache',
+        [f'ai_suggestion_cache_hit_ratio {_number(float(stats["hit_rate"]))}'],
+    )
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0004_currency_paymentmethod_surveyor_triggeringevent_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssayParseJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celery_task_id', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('file_path', models.CharField(help_text='Spooled upload, removed once parsed', max_length=500)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_total', models.IntegerField(blank=True, help_text='Estimated before parsing starts', null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
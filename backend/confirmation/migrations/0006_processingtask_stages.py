@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0005_assayparsejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='result',
+            field=models.JSONField(blank=True, help_text='Outputs of the processing stages', null=True),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, help_text='Per-stage status, attempts and duration'),
+        ),
+        migrations.AlterField(
+            model_name='processingtask',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0006_processingtask_stages'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['created_at', 'id'], name='bc_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['buyer', 'created_at', 'id'], name='bc_buyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['material', 'created_at', 'id'], name='bc_material_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['delivery_point', 'created_at', 'id'], name='bc_delivery_point_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['currency', 'created_at', 'id'], name='bc_currency_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessconfirmation',
+            index=models.Index(fields=['shipment_period_from', 'shipment_period_to'], name='bc_shipment_period_idx'),
+        ),
+    ]
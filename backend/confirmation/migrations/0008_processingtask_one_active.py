@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:20
+
+from django.db import migrations, models
+
+
+def fail_duplicate_active_tasks(apps, schema_editor):
+    """Keep the newest active task per confirmation so the constraint can be added"""
+    ProcessingTask = apps.get_model('confirmation', 'ProcessingTask')
+    active = ProcessingTask.objects.filter(status__in=['pending', 'processing']).order_by(
+        'business_confirmation_id', '-created_at', '-id'
+    )
+    seen = set()
+    superseded = []
+    for task_id, confirmation_id in active.values_list('id', 'business_confirmation_id'):
+        if confirmation_id in seen:
+            superseded.append(task_id)
+        seen.add(confirmation_id)
+    ProcessingTask.objects.filter(id__in=superseded).update(status='failed', error='Superseded by a newer task')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0007_businessconfirmation_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_tasks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='processingtask',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'processing'])), fields=('business_confirmation',), name='one_active_task_per_confirmation'),
+        ),
+    ]
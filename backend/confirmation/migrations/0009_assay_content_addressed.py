@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:24
+
+import backend.confirmation.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0008_processingtask_one_active'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assayparsejob',
+            name='file_path',
+            field=models.CharField(help_text='Content-addressed upload, kept for re-uploads of the same file', max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='businessconfirmation',
+            name='assay_file',
+            field=models.FileField(blank=True, null=True, storage=backend.confirmation.storage.get_assay_storage, upload_to='assay_files/'),
+        ),
+    ]
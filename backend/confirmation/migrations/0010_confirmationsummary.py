@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0009_assay_content_addressed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfirmationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text="material:buyer:YYYY-MM, '-' for none", max_length=100, unique=True)),
+                ('shipment_month', models.DateField(blank=True, help_text='First day of the shipment_period_from month', null=True)),
+                ('confirmation_count', models.IntegerField(default=0)),
+                ('quantity_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('quantity_count', models.IntegerField(default=0)),
+                ('treatment_charge_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('treatment_charge_count', models.IntegerField(default=0)),
+                ('refining_charge_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('refining_charge_count', models.IntegerField(default=0)),
+                ('assay_pb_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('assay_pb_count', models.IntegerField(default=0)),
+                ('assay_zn_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('assay_zn_count', models.IntegerField(default=0)),
+                ('assay_cu_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('assay_cu_count', models.IntegerField(default=0)),
+                ('assay_ag_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('assay_ag_count', models.IntegerField(default=0)),
+                ('buyer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='confirmation.buyer')),
+                ('material', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='confirmation.material')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shipment_month'], name='summary_month_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0010_confirmationsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('value', models.DecimalField(decimal_places=6, max_digits=20)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('symbol', 'date'), name='one_price_per_symbol_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0012_assayparsejob_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Bumped by every status change and stage report'),
+        ),
+    ]
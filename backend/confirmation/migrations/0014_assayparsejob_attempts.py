@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confirmation', '0013_processingtask_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assayparsejob',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Deliveries of the parse task, including redeliveries'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .storage import get_assay_storage
+
 # Create your models here.
 
 class Material(models.Model):
@@ -89,7 +91,7 @@ class BusinessConfirmation(models.Model):
     shipments_evenly_distributed = models.BooleanField(default=False)
     
     # Assay fields
-    assay_file = models.FileField(upload_to='assay_files/', blank=True, null=True)
+    assay_file = models.FileField(upload_to='assay_files/', storage=get_assay_storage, blank=True, null=True)
     assay_pb = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     assay_zn = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     assay_cu = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
@@ -124,6 +126,18 @@ class BusinessConfirmation(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Keyset pagination walks (created_at, id); each filterable foreign key
+        # gets its own composite so a filtered page is still one range scan.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='bc_created_id_idx'),
+            models.Index(fields=['buyer', 'created_at', 'id'], name='bc_buyer_created_idx'),
+            models.Index(fields=['material', 'created_at', 'id'], name='bc_material_created_idx'),
+            models.Index(fields=['delivery_point', 'created_at', 'id'], name='bc_delivery_point_created_idx'),
+            models.Index(fields=['currency', 'created_at', 'id'], name='bc_currency_created_idx'),
+            models.Index(fields=['shipment_period_from', 'shipment_period_to'], name='bc_shipment_period_idx'),
+        ]
     
     def __str__(self):
         return f"Business Confirmation {self.id} - {self.buyer} - {self.material}"
@@ -131,14 +145,104 @@ class BusinessConfirmation(models.Model):
 class ProcessingTask(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
     ]
+    # A confirmation has at most one task in these states at a time
+    ACTIVE_STATUSES = ('pending', 'processing')
     business_confirmation = models.ForeignKey(BusinessConfirmation, on_delete=models.CASCADE, related_name='processing_tasks')
     celery_task_id = models.CharField(max_length=255, unique=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stage_timings = models.JSONField(default=dict, blank=True, help_text="Per-stage status, attempts and duration")
+    result = models.JSONField(blank=True, null=True, help_text="Outputs of the processing stages")
+    error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Bumped by every status change and stage report")
     completed_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business_confirmation'],
+                condition=models.Q(status__in=['pending', 'processing']),
+                name='one_active_task_per_confirmation',
+            ),
+        ]
+
     def __str__(self):
         return f"Task {self.celery_task_id} for Confirmation {self.business_confirmation_id} - {self.status}"
+
+class AssayParseJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    celery_task_id = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField(default=0)
+    file_path = models.CharField(max_length=500, help_text="Content-addressed upload, kept for re-uploads of the same file")
+    rows_processed = models.IntegerField(default=0)
+    rows_total = models.IntegerField(blank=True, null=True, help_text="Estimated before parsing starts")
+    attempts = models.IntegerField(default=0, help_text="Deliveries of the parse task, including redeliveries")
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Bumped by every progress report")
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Assay job {self.celery_task_id} for {self.file_name} - {self.status}"
+
+class ConfirmationSummary(models.Model):
+    """Running totals of confirmations per material, buyer and shipment month.
+
+    Maintained incrementally by the confirmation signals (see analytics.py);
+    averages are sum / count so each bucket can be adjusted by one row's
+    contribution. `rebuild_confirmation_analytics` recomputes it from scratch.
+    """
+    key = models.CharField(max_length=100, unique=True, help_text="material:buyer:YYYY-MM, '-' for none")
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, blank=True, null=True)
+    buyer = models.ForeignKey(Buyer, on_delete=models.CASCADE, blank=True, null=True)
+    shipment_month = models.DateField(blank=True, null=True, help_text="First day of the shipment_period_from month")
+    confirmation_count = models.IntegerField(default=0)
+    quantity_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    quantity_count = models.IntegerField(default=0)
+    treatment_charge_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    treatment_charge_count = models.IntegerField(default=0)
+    refining_charge_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    refining_charge_count = models.IntegerField(default=0)
+    assay_pb_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    assay_pb_count = models.IntegerField(default=0)
+    assay_zn_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    assay_zn_count = models.IntegerField(default=0)
+    assay_cu_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    assay_cu_count = models.IntegerField(default=0)
+    assay_ag_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    assay_ag_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['shipment_month'], name='summary_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary {self.key}: {self.confirmation_count} confirmations"
+
+class PricePoint(models.Model):
+    """Daily reference price: metals by element (PB, ZN, CU, AG) in USD per
+    tonne / troy ounce, FX by Currency code as USD per unit of that currency"""
+    symbol = models.CharField(max_length=20)
+    date = models.DateField()
+    value = models.DecimalField(max_digits=20, decimal_places=6)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'date'], name='one_price_per_symbol_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.date}: {self.value}"
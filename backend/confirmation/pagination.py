@@ -0,0 +1,104 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first keyset pagination on (created_at, id).
+
+    The cursor is the (created_at, id) of the row a page starts after, so
+    every page is an index range scan of page_size + 1 rows, however deep.
+    Unlike DRF's CursorPagination, ties on created_at are broken by id in
+    the WHERE clause rather than with an OFFSET.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if position is None:
+            queryset = queryset.order_by(*self.ordering)
+        elif reverse:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+                created_at__gte=created_at,
+            ).order_by('created_at', 'id')
+        else:
+            created_at, pk = position
+            # The plain created_at bound lets the database range-scan the index
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                created_at__lte=created_at,
+            ).order_by(*self.ordering)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(self.page[0], reverse=True)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def build_link(self, row, reverse):
+        # Rows are model instances or values() dicts
+        created_at, pk = (row['created_at'], row['id']) if isinstance(row, dict) else (row.created_at, row.id)
+        cursor = json.dumps({'c': created_at.isoformat(), 'i': pk, 'r': int(reverse)})
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def decode_cursor(self, request):
+        """(position, reverse) from the cursor parameter; (None, False) on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            created_at = parse_datetime(cursor['c'])
+            position = (created_at, int(cursor['i']))
+            reverse = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Invalid cursor')
+        if created_at is None:
+            raise NotFound('Invalid cursor')
+        return position, reverse
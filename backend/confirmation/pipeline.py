@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .documents import render_document
+from .suggestions import generate_rc_suggestion, generate_tc_suggestion
+
+CONFIRMATION_RELATED = (
+    'buyer', 'material', 'delivery_term', 'delivery_point', 'packaging', 'transport_mode',
+    'payment_method', 'currency', 'triggering_event', 'nominated_surveyor',
+)
+
+
+class ConfirmationInvalid(Exception):
+    """The confirmation cannot be processed; retrying will not help"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def validate_confirmation(confirmation):
+    errors = []
+    # Same required fields as Step 1 of the wizard
+    if confirmation.buyer_id is None:
+        errors.append('Buyer is required')
+    if confirmation.material_id is None:
+        errors.append('Material is required')
+    if confirmation.quantity is None or confirmation.quantity <= 0:
+        errors.append('Quantity must be positive')
+
+    period_from, period_to = confirmation.shipment_period_from, confirmation.shipment_period_to
+    if period_from and period_to and period_from > period_to:
+        errors.append('Shipment period ends before it starts')
+    if not 0 <= confirmation.prepayment_percentage <= 100:
+        errors.append('Prepayment percentage must be between 0 and 100')
+    if confirmation.cost_sharing_buyer + confirmation.cost_sharing_seller != 100:
+        errors.append('Cost sharing must add up to 100%')
+    for field in ('assay_pb', 'assay_zn', 'assay_cu'):
+        value = getattr(confirmation, field)
+        if value is not None and not 0 <= value <= 100:
+            errors.append(f'{field} must be a percentage')
+
+    if errors:
+        raise ConfirmationInvalid(errors)
+    return {'valid': True}
+
+
+def compute_pricing(confirmation):
+    quantity = confirmation.quantity or Decimal(0)
+    tolerance = confirmation.quantity_tolerance / 100
+    treatment_charge = confirmation.treatment_charge
+    material = confirmation.material.name if confirmation.material else ''
+
+    return {
+        'quantity_min': str(round(quantity * (1 - tolerance), 2)),
+        'quantity_max': str(round(quantity * (1 + tolerance), 2)),
+        'treatment_charge_total': str(quantity * treatment_charge) if treatment_charge is not None else None,
+        'prepayment_share': confirmation.prepayment_percentage / 100,
+        'tc_assessment': generate_tc_suggestion(treatment_charge, material),
+        'rc_assessment': generate_rc_suggestion(confirmation.refining_charge, material),
+    }
+
+
+def render_confirmation_document(confirmation):
+    """Render the PDF confirmation, reusing the stored one if nothing changed"""
+    return render_document(confirmation, 'pdf')
+
+
+def notify_confirmation_processed(confirmation):
+    recipients = settings.CONFIRMATION_NOTIFICATION_RECIPIENTS
+    if not recipients:
+        print(f"No notification recipients configured for confirmation {confirmation.id}")
+        return {'notified': []}
+    send_mail(
+        subject=f"Business confirmation {confirmation.id} processed",
+        message=f"{confirmation} has been validated, priced and rendered.",
+        from_email=None,
+        recipient_list=recipients,
+    )
+    return {'notified': recipients}
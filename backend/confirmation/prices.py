@@ -0,0 +1,198 @@
+import codecs
+import csv
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .lazy import LazyModule
+from .models import PricePoint
+
+np = LazyModule('numpy')
+
+# Shared counter bumped by every ingest; processes compare it with the one
+# their series were loaded at and drop them when it moved
+PRICE_SERIES_VERSION_KEY = 'confirmation:price-series-version'
+INGEST_BATCH_SIZE = 1000
+SYMBOL_MAX_LENGTH = PricePoint._meta.get_field('symbol').max_length
+
+
+class PriceSeries:
+    """One symbol's prices as two parallel arrays sorted by date.
+
+    Dates are day ordinals (int32) and values float64, so a long series is a
+    few bytes per day and lookups are a binary search.
+    """
+
+    def __init__(self, symbol, ordinals, values):
+        self.symbol = symbol
+        self.ordinals = ordinals
+        self.values = values
+
+    @classmethod
+    def load(cls, symbol):
+        rows = PricePoint.objects.filter(symbol=symbol).order_by('date').values_list('date', 'value')
+        ordinals, values = [], []
+        for day, value in rows:
+            ordinals.append(day.toordinal())
+            values.append(float(value))
+        return cls(symbol, np.array(ordinals, dtype=np.int32), np.array(values, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def as_of(self, day):
+        """(date, value) of the last price on or before day, or None"""
+        position = int(np.searchsorted(self.ordinals, day.toordinal(), side='right')) - 1
+        if position < 0:
+            return None
+        return date.fromordinal(int(self.ordinals[position])), float(self.values[position])
+
+    def average(self, start, end):
+        """(mean, observations) of the prices dated start..end inclusive; mean is None when there are none"""
+        low = int(np.searchsorted(self.ordinals, start.toordinal(), side='left'))
+        high = int(np.searchsorted(self.ordinals, end.toordinal(), side='right'))
+        if high <= low:
+            return None, 0
+        return float(self.values[low:high].mean()), high - low
+
+
+class PriceStore:
+    """In-process cache of PriceSeries, loaded per symbol on first use.
+
+    At most every PRICE_SERIES_REFRESH_INTERVAL seconds the shared version
+    key is read; an ingest anywhere bumps it and the next lookup here
+    reloads. An ingest in this process clears the cache at once.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < settings.PRICE_SERIES_REFRESH_INTERVAL:
+            return
+        version = cache.get(PRICE_SERIES_VERSION_KEY, 0)
+        with self._lock:
+            if version != self._version:
+                self._series = {}
+                self._version = version
+            self._checked_at = now
+
+    def series(self, symbol):
+        symbol = symbol.upper()
+        self._check_version()
+        series = self._series.get(symbol)
+        if series is None:
+            series = PriceSeries.load(symbol)
+            with self._lock:
+                self._series[symbol] = series
+        return series
+
+    def as_of(self, symbol, day):
+        return self.series(symbol).as_of(day)
+
+    def average(self, symbol, start, end):
+        return self.series(symbol).average(start, end)
+
+    def invalidate(self):
+        """Drop every process's series (after an ingest)"""
+        try:
+            cache.incr(PRICE_SERIES_VERSION_KEY)
+        except ValueError:
+            cache.add(PRICE_SERIES_VERSION_KEY, 1, timeout=None)
+        with self._lock:
+            self._series = {}
+            self._checked_at = 0.0
+
+
+price_store = PriceStore()
+
+
+def read_price_rows(lines):
+    """Yield (symbol, date, Decimal) from a price CSV, given as lines of text.
+
+    Long files have `date,symbol,value` columns; any other header is wide:
+    a date column followed by one column per symbol. Empty cells are
+    skipped. Raises ValueError naming the line of a bad date or value.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip() for name in next(reader, [])]
+    if not header:
+        return
+    lowered = [name.lower() for name in header]
+    long_format = {'date', 'symbol', 'value'} <= set(lowered)
+    if long_format:
+        date_column, symbol_column, value_column = (lowered.index(name) for name in ('date', 'symbol', 'value'))
+        columns_needed = max(date_column, symbol_column, value_column) + 1
+
+    for line_number, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        if long_format:
+            if len(row) < columns_needed:
+                raise ValueError(f'Line {line_number}: expected date, symbol and value')
+            cells = [(row[symbol_column], row[value_column])]
+            day = parse_date(row[date_column].strip())
+        else:
+            cells = list(zip(header[1:], row[1:]))
+            day = parse_date(row[0].strip())
+        if day is None:
+            raise ValueError(f'Line {line_number}: date must be YYYY-MM-DD')
+        for symbol, cell in cells:
+            cell = cell.strip()
+            if not cell:
+                continue
+            try:
+                value = Decimal(cell)
+            except InvalidOperation:
+                raise ValueError(f'Line {line_number}: {cell!r} is not a number')
+            if not value.is_finite() or value < 0:
+                raise ValueError(f'Line {line_number}: {cell!r} is not a valid price')
+            symbol = symbol.strip().upper()
+            if not symbol or len(symbol) > SYMBOL_MAX_LENGTH:
+                raise ValueError(f'Line {line_number}: symbol must be 1 to {SYMBOL_MAX_LENGTH} characters')
+            yield symbol, day, value
+
+
+def ingest_prices(lines):
+    """Upsert every price in a CSV and invalidate the cached series.
+
+    A later row or file for the same symbol and date replaces the value.
+    Returns {symbol: prices read}.
+    """
+    counts = {}
+    with transaction.atomic():
+        batch = {}
+        for symbol, day, value in read_price_rows(lines):
+            batch[symbol, day] = value
+            counts[symbol] = counts.get(symbol, 0) + 1
+            if len(batch) >= INGEST_BATCH_SIZE:
+                _upsert(batch)
+                batch = {}
+        _upsert(batch)
+    if counts:
+        transaction.on_commit(price_store.invalidate)
+    return counts
+
+
+def ingest_price_file(file):
+    """ingest_prices for an uploaded or opened binary file, decoded line by line"""
+    return ingest_prices(codecs.iterdecode(iter(file), 'utf-8-sig'))
+
+
+def _upsert(batch):
+    # Keyed by (symbol, date): one statement may not update the same row twice
+    if batch:
+        PricePoint.objects.bulk_create(
+            [PricePoint(symbol=symbol, date=day, value=value) for (symbol, day), value in batch.items()],
+            update_conflicts=True, unique_fields=['symbol', 'date'], update_fields=['value'],
+        )
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+
+
+class ProviderError(Exception):
+    """The suggestion provider failed or did not answer in time"""
+
+
+class CircuitOpenError(ProviderError):
+    """The provider is being skipped after repeated failures"""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures.
+
+    While open every call is rejected without touching the provider. Once
+    `reset_timeout` seconds have passed a single half-open probe is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def release(self):
+        """End a call without judging the provider, e.g. when its caller went away"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+            self._probe_in_flight = False
+
+
+class SuggestionProvider:
+    """Base class for text-generation backends used by the pricing suggestions.
+
+    Subclasses implement `_generate`, `_agenerate` and optionally `_astream`;
+    callers use `complete`, `acomplete` and `astream`, which run every call
+    through the provider's circuit breaker so an unhealthy backend is skipped
+    instead of waited on.
+    """
+
+    name = 'base'
+
+    def __init__(self, breaker=None):
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.AI_PROVIDER_FAILURE_THRESHOLD,
+            reset_timeout=settings.AI_PROVIDER_RESET_TIMEOUT,
+        )
+
+    def complete(self, prompt, timeout=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.perf_counter()
+        try:
+            text = self._generate(prompt, timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            self._observe('complete', 'error', started)
+            raise ProviderError(str(e)) from e
+        self.breaker.record_success()
+        self._observe('complete', 'ok', started)
+        return text
+
+    async def acomplete(self, prompt, timeout=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(self._agenerate(prompt), timeout=timeout)
+        except asyncio.CancelledError:
+            # The caller went away; that says nothing about the provider
+            self.breaker.release()
+            self._observe('acomplete', 'cancelled', started)
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            self._observe('acomplete', 'error', started)
+            raise ProviderError(str(e) or type(e).__name__) from e
+        self.breaker.record_success()
+        self._observe('acomplete', 'ok', started)
+        return text
+
+    async def astream(self, prompt):
+        """Yield response text chunks as the provider produces them"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        outcome = 'cancelled'
+        started = time.perf_counter()
+        try:
+            async for chunk in self._astream(prompt):
+                yield chunk
+        except Exception as e:
+            outcome = 'error'
+            self.breaker.record_failure()
+            raise ProviderError(str(e) or type(e).__name__) from e
+        else:
+            outcome = 'ok'
+            self.breaker.record_success()
+        finally:
+            # The consumer abandoned the stream (client disconnect, deadline).
+            # That says nothing about the provider, so only free a half-open
+            # probe; callers that give up on a deadline record the failure.
+            if outcome == 'cancelled':
+                self.breaker.release()
+            self._observe('astream', outcome, started)
+
+    def _observe(self, call, outcome, started):
+        elapsed = time.perf_counter() - started
+        metrics.provider_call_duration.observe(elapsed, provider=self.name, call=call, outcome=outcome)
+        metrics.record_timing('ai', elapsed)
+
+    def _generate(self, prompt, timeout):
+        raise NotImplementedError
+
+    async def _agenerate(self, prompt):
+        raise NotImplementedError
+
+    async def _astream(self, prompt):
+        # Providers without a streaming API answer in a single chunk
+        yield await self._agenerate(prompt)
+
+
+class GeminiProvider(SuggestionProvider):
+    """Google Gemini, configured once and reused for the life of the process"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL_NAME, breaker=None):
+        super().__init__(breaker)
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def _generate(self, prompt, timeout):
+        request_options = {'timeout': timeout} if timeout else None
+        response = self.model.generate_content(prompt, request_options=request_options)
+        return response.text
+
+    async def _agenerate(self, prompt):
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def _astream(self, prompt):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider(SuggestionProvider):
+    """In-process stand-in for tests and benchmarks.
+
+    Answers with `response` (a string, or a callable taking the prompt; by
+    default a canned answer in the format the prompt asks for) after
+    `latency` seconds and fails with probability
+    `failure_rate`; a call whose latency exceeds its timeout fails as a timeout.
+    Streaming emits the first `chunk_size` characters after `latency` and the
+    rest `chunk_interval` seconds apart.
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency=0.0, failure_rate=0.0, response=None, breaker=None, seed=None,
+                 chunk_size=16, chunk_interval=0.0):
+        super().__init__(breaker)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        self.response = response
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def _generate(self, prompt, timeout):
+        self.calls += 1
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"stub latency {self.latency}s exceeds {timeout}s")
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def _agenerate(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def _astream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        text = self._answer(prompt)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                await asyncio.sleep(self.chunk_interval)
+            yield text[start:start + self.chunk_size]
+
+    def _answer(self, prompt):
+        if self._random.random() < self.failure_rate:
+            raise ProviderError("stub provider failure")
+        if self.response is None:
+            return self._default_response(prompt)
+        return self.response(prompt) if callable(self.response) else self.response
+
+    @staticmethod
+    def _default_response(prompt):
+        deals = re.findall(r'^(\d+)\. Material:', prompt, flags=re.MULTILINE)
+        if deals:
+            return json.dumps([
+                {'deal': int(number), 'tc': f'Stub TC for deal {number}', 'rc': f'Stub RC for deal {number}'}
+                for number in deals
+            ])
+        return (
+            "TC: Stub suggestion, keep TC within $310-$325/dmt\n"
+            "RC: Stub suggestion, keep RC within $4.20-$4.50/toz"
+        )
+
+
+_provider = None
+_provider_pid = None
+_provider_lock = threading.Lock()
+
+
+def build_provider():
+    """Create the provider selected by AI_SUGGESTIONS_PROVIDER, or None without credentials"""
+    provider_name = settings.AI_SUGGESTIONS_PROVIDER
+    if provider_name == 'stub':
+        return StubProvider(
+            latency=settings.AI_STUB_LATENCY,
+            failure_rate=settings.AI_STUB_FAILURE_RATE,
+        )
+    if provider_name == 'gemini':
+        api_key = os.getenv('GEMINI_API_KEY')
+        return GeminiProvider(api_key) if api_key else None
+    raise ValueError(f"Unknown AI_SUGGESTIONS_PROVIDER: {provider_name}")
+
+
+def get_provider():
+    """Return this process's provider, creating it on first use.
+
+    Keyed by pid so forked workers (gunicorn, Celery prefork) build their own
+    client instead of inheriting the parent's connection.
+    """
+    global _provider, _provider_pid
+    pid = os.getpid()
+    if _provider_pid != pid:
+        with _provider_lock:
+            if _provider_pid != pid:
+                _provider = build_provider()
+                _provider_pid = pid
+    return _provider
+
+
+def set_provider(provider):
+    """Install a provider for this process (tests, benchmarks)"""
+    global _provider, _provider_pid
+    with _provider_lock:
+        _provider = provider
+        _provider_pid = os.getpid()
+
+
+def reset_provider():
+    global _provider, _provider_pid
+    with _provider_lock:
+        _provider = None
+        _provider_pid = None
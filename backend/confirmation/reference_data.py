@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .models import (
+    Material, Buyer, DeliveryTerm, DeliveryPoint, Packaging, TransportMode,
+    PaymentMethod, Currency, TriggeringEvent, Surveyor
+)
+
+REFERENCE_DATA_CACHE_KEY = 'confirmation:reference-data'
+
+# Snapshot key -> model. Keys follow the list endpoint names.
+REFERENCE_TABLES = {
+    'materials': Material,
+    'buyers': Buyer,
+    'delivery_terms': DeliveryTerm,
+    'delivery_points': DeliveryPoint,
+    'packaging': Packaging,
+    'transport_modes': TransportMode,
+    'payment_methods': PaymentMethod,
+    'currencies': Currency,
+    'triggering_events': TriggeringEvent,
+    'surveyors': Surveyor,
+}
+
+REFERENCE_MODELS = tuple(REFERENCE_TABLES.values())
+
+
+def reference_serializers():
+    """Model -> serializer of every reference table"""
+    # Imported here: signals load this module in Celery workers too, which
+    # never build the snapshot and need not import DRF
+    from .serializers import (
+        BuyerSerializer, CurrencySerializer, DeliveryPointSerializer, DeliveryTermSerializer, MaterialSerializer,
+        PackagingSerializer, PaymentMethodSerializer, SurveyorSerializer, TransportModeSerializer,
+        TriggeringEventSerializer,
+    )
+
+    return {
+        Material: MaterialSerializer,
+        Buyer: BuyerSerializer,
+        DeliveryTerm: DeliveryTermSerializer,
+        DeliveryPoint: DeliveryPointSerializer,
+        Packaging: PackagingSerializer,
+        TransportMode: TransportModeSerializer,
+        PaymentMethod: PaymentMethodSerializer,
+        Currency: CurrencySerializer,
+        TriggeringEvent: TriggeringEventSerializer,
+        Surveyor: SurveyorSerializer,
+    }
+
+
+def build_reference_data():
+    """Serialize every lookup table and return (version, json bytes)"""
+    from rest_framework.utils.encoders import JSONEncoder
+
+    serializers = reference_serializers()
+    snapshot = {
+        key: serializers[model](model.objects.order_by('pk'), many=True).data
+        for key, model in REFERENCE_TABLES.items()
+    }
+    content = json.dumps(snapshot, cls=JSONEncoder, separators=(',', ':')).encode('utf-8')
+    version = hashlib.sha256(content).hexdigest()[:32]
+    return version, content
+
+
+def get_reference_data():
+    """Return the cached (version, json bytes) snapshot, rebuilding it on a miss"""
+    snapshot = cache.get(REFERENCE_DATA_CACHE_KEY)
+    if snapshot is None:
+        snapshot = build_reference_data()
+        cache.set(REFERENCE_DATA_CACHE_KEY, snapshot, timeout=None)
+    return snapshot
+
+
+def invalidate_reference_data():
+    cache.delete(REFERENCE_DATA_CACHE_KEY)
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     Material, Buyer, BusinessConfirmation, ProcessingTask,
     DeliveryTerm, DeliveryPoint, Packaging, TransportMode,
-    PaymentMethod, Currency, TriggeringEvent, Surveyor
+    PaymentMethod, Currency, TriggeringEvent, Surveyor, AssayParseJob
 )
 
 class MaterialSerializer(serializers.ModelSerializer):
@@ -15,11 +15,6 @@ class BuyerSerializer(serializers.ModelSerializer):
         model = Buyer
         fields = '__all__'
 
-class BusinessConfirmationSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = BusinessConfirmation
-        fields = '__all__'
-
 class ProcessingTaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProcessingTask
@@ -63,4 +58,68 @@ class TriggeringEventSerializer(serializers.ModelSerializer):
 class SurveyorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Surveyor
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+EXPANDABLE_RELATIONS = {
+    'buyer': BuyerSerializer,
+    'material': MaterialSerializer,
+    'delivery_term': DeliveryTermSerializer,
+    'delivery_point': DeliveryPointSerializer,
+    'packaging': PackagingSerializer,
+    'transport_mode': TransportModeSerializer,
+    'payment_method': PaymentMethodSerializer,
+    'currency': CurrencySerializer,
+    'triggering_event': TriggeringEventSerializer,
+    'nominated_surveyor': SurveyorSerializer,
+}
+
+def parse_expand(request):
+    """Relation names requested with ?expand=a,b on a read; () for writes"""
+    if request is None or request.method != 'GET':
+        return ()
+    names = [name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in EXPANDABLE_RELATIONS]
+    if unknown:
+        raise serializers.ValidationError({
+            'expand': [f"Cannot expand {', '.join(unknown)}; choose from {', '.join(EXPANDABLE_RELATIONS)}"]
+        })
+    return tuple(dict.fromkeys(names))
+
+class BusinessConfirmationSerializer(serializers.ModelSerializer):
+    """Foreign keys are ids; on GET, relations listed in ?expand= are inlined
+    as objects. Views must select_related them to keep the query count flat."""
+
+    class Meta:
+        model = BusinessConfirmation
+        fields = '__all__'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in parse_expand(self.context.get('request')):
+            fields[name] = EXPANDABLE_RELATIONS[name](read_only=True)
+        return fields
+
+class AssayParseJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AssayParseJob
+        exclude = ['file_path']
+
+class BusinessConfirmationBulkItemSerializer(serializers.ModelSerializer):
+    """One row of a bulk create. Foreign keys are taken as plain ids so that
+    validating a row costs no queries; the bulk view checks they exist with
+    one query per related model for the whole batch."""
+    buyer = serializers.IntegerField(source='buyer_id', required=False, allow_null=True)
+    material = serializers.IntegerField(source='material_id', required=False, allow_null=True)
+    delivery_term = serializers.IntegerField(source='delivery_term_id', required=False, allow_null=True)
+    delivery_point = serializers.IntegerField(source='delivery_point_id', required=False, allow_null=True)
+    packaging = serializers.IntegerField(source='packaging_id', required=False, allow_null=True)
+    transport_mode = serializers.IntegerField(source='transport_mode_id', required=False, allow_null=True)
+    payment_method = serializers.IntegerField(source='payment_method_id', required=False, allow_null=True)
+    currency = serializers.IntegerField(source='currency_id', required=False, allow_null=True)
+    triggering_event = serializers.IntegerField(source='triggering_event_id', required=False, allow_null=True)
+    nominated_surveyor = serializers.IntegerField(source='nominated_surveyor_id', required=False, allow_null=True)
+
+    class Meta:
+        model = BusinessConfirmation
+        # Files cannot be sent in a JSON batch
+        exclude = ['assay_file']
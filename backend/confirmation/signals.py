@@ -0,0 +1,49 @@
+from celery.signals import task_postrun, task_prerun
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_save
+
+from . import analytics, metrics
+from .models import BusinessConfirmation
+from .reference_data import REFERENCE_MODELS, invalidate_reference_data
+
+
+def reference_data_changed(sender, **kwargs):
+    # Drop the snapshot only once the change is visible to other connections,
+    # otherwise a concurrent request could re-cache the old rows.
+    transaction.on_commit(invalidate_reference_data)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(reference_data_changed, sender=model, dispatch_uid=f'reference-data-save-{model.__name__}')
+    post_delete.connect(reference_data_changed, sender=model, dispatch_uid=f'reference-data-delete-{model.__name__}')
+
+
+def confirmation_saving(sender, instance, **kwargs):
+    # Remember the stored row so post_save can move its analytics contribution
+    instance._summary_previous = analytics.previous_source_row(instance)
+
+
+def confirmation_saved(sender, instance, **kwargs):
+    analytics.record_change(
+        previous=getattr(instance, '_summary_previous', None), current=analytics.source_row(instance)
+    )
+    instance._summary_previous = None
+
+
+def confirmation_deleted(sender, instance, **kwargs):
+    analytics.record_change(previous=analytics.source_row(instance))
+
+
+# Keep ConfirmationSummary in step with every save/delete; bulk_create and
+# queryset.update() skip these, see analytics.record_created and the
+# rebuild_confirmation_analytics command.
+pre_save.connect(confirmation_saving, sender=BusinessConfirmation, dispatch_uid='confirmation-summary-pre-save')
+post_save.connect(confirmation_saved, sender=BusinessConfirmation, dispatch_uid='confirmation-summary-save')
+post_delete.connect(confirmation_deleted, sender=BusinessConfirmation, dispatch_uid='confirmation-summary-delete')
+
+
+# Query counts/time per request, and Celery task durations for /metrics
+connection_created.connect(metrics.install_query_timer, dispatch_uid='metrics-query-timer')
+task_prerun.connect(metrics.task_started, dispatch_uid='metrics-task-started', weak=False)
+task_postrun.connect(metrics.task_finished, dispatch_uid='metrics-task-finished', weak=False)
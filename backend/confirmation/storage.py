@@ -0,0 +1,58 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that keeps each distinct content once, named by its SHA-256.
+
+    The upload is streamed to a temporary file chunk by chunk while it is
+    hashed, then renamed to `<directory>/<sha256><extension>`; if that file
+    exists already the copy is dropped and the existing name returned. Only
+    the extension of the uploaded name is kept, since parsers dispatch on it.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save, so collisions are the same file
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        temporary_path = self.path(posixpath.join(directory, f'{uuid.uuid4().hex}.part'))
+        digest = hashlib.sha256()
+        try:
+            with open(temporary_path, 'xb') as destination:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    destination.write(chunk)
+            name = posixpath.join(directory, f'{digest.hexdigest()}{extension}')
+            if self.exists(name):
+                os.remove(temporary_path)
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary_path, self.file_permissions_mode)
+                os.replace(temporary_path, self.path(name))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return name
+
+
+def content_hash(name):
+    """The SHA-256 a ContentAddressedStorage name was derived from"""
+    return os.path.splitext(posixpath.basename(name))[0]
+
+
+assay_storage = ContentAddressedStorage()
+
+
+def get_assay_storage():
+    """Storage of BusinessConfirmation.assay_file; a callable keeps migrations stable"""
+    return assay_storage
@@ -0,0 +1,199 @@
+import hashlib
+import threading
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import caches
+
+# refills: misses for a key that was cached before and has since expired or
+# been evicted (the backend cannot tell those two apart)
+STAT_NAMES = ('hits', 'misses', 'coalesced', 'refills')
+
+
+def _normalize_text(value):
+    return str(value if value is not None else '').strip().lower()
+
+
+def _normalize_amount(value, places):
+    """Round a user-entered charge so '312', '312.0' and '312.04' share a key"""
+    if value in (None, ''):
+        return ''
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        # generate_*_suggestion treats unparseable input like an empty field
+        return ''
+    if not amount.is_finite():
+        return ''
+    return str(amount.quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP))
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class SuggestionCache:
+    """Shared cache for AI pricing suggestions.
+
+    Entries live in a Django cache alias (Redis in production, locmem in tests),
+    so they are shared by every web worker and bounded by the backend's LRU
+    eviction; each entry also carries a TTL. Concurrent misses for the same key
+    are collapsed into a single fill, both within a process and across
+    processes, so N identical requests cost one model call.
+
+    Fill locks, seen markers and counters are kept in a second alias
+    (`meta_alias`) so the bounded entry cache never evicts them.
+    """
+
+    def __init__(self, alias=None, meta_alias=None, timeout=None, lock_timeout=None, poll_interval=0.05):
+        self.alias = alias or getattr(settings, 'AI_SUGGESTIONS_CACHE_ALIAS', 'suggestions')
+        self.meta_alias = meta_alias or getattr(settings, 'AI_SUGGESTIONS_META_CACHE_ALIAS', 'suggestions-meta')
+        self.timeout = timeout or getattr(settings, 'AI_SUGGESTIONS_CACHE_TIMEOUT', 300)
+        self.lock_timeout = lock_timeout or getattr(settings, 'AI_SUGGESTIONS_LOCK_TIMEOUT', 30)
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def meta_cache(self):
+        return caches[self.meta_alias]
+
+    @staticmethod
+    def make_key(material, treatment_charge, refining_charge, delivery_point):
+        parts = (
+            _normalize_text(material),
+            _normalize_amount(treatment_charge, getattr(settings, 'AI_SUGGESTIONS_TC_PLACES', 0)),
+            _normalize_amount(refining_charge, getattr(settings, 'AI_SUGGESTIONS_RC_PLACES', 2)),
+            _normalize_text(delivery_point),
+        )
+        digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+        return f'ai-suggestion:{digest}'
+
+    def get(self, key):
+        value = self.cache.get(key)
+        self._incr('hits' if value is not None else 'misses')
+        return value
+
+    def get_many(self, keys):
+        """Return {key: value} for the cached keys, counting a hit or miss per key"""
+        found = self.cache.get_many(keys)
+        hits = sum(1 for key in keys if key in found)
+        self._incr('hits', hits)
+        self._incr('misses', len(keys) - hits)
+        return found
+
+    def set_many(self, values):
+        self.cache.set_many(values, self.timeout)
+        self.meta_cache.set_many({self._seen_key(key): 1 for key in values}, self.timeout * 10)
+
+    def set(self, key, value):
+        # The marker outlives the entry so a later miss can be told apart
+        # from a key that was never cached (see the 'refills' counter).
+        self.cache.set(key, value, self.timeout)
+        self.meta_cache.set(self._seen_key(key), 1, self.timeout * 10)
+
+    def clear(self):
+        """Drop every entry, marker, lock and counter"""
+        self.cache.clear()
+        self.meta_cache.clear()
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return the cached value for key, calling compute() at most once per fill.
+
+        Results rejected by `cacheable(value)` are handed to the waiting callers
+        but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.event.wait(self.lock_timeout)
+            if flight.result is not None:
+                self._incr('coalesced')
+                return flight.result
+            # The leader failed; fall through and compute on our own
+            return compute()
+
+        try:
+            flight.result = self._fill(key, compute, cacheable)
+            return flight.result
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        counters = self.meta_cache.get_many([self._stat_key(name) for name in STAT_NAMES])
+        stats = {name: counters.get(self._stat_key(name), 0) for name in STAT_NAMES}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        self.meta_cache.delete_many([self._stat_key(name) for name in STAT_NAMES])
+
+    def _fill(self, key, compute, cacheable):
+        lock_key = f'{key}:lock'
+        acquired = self.meta_cache.add(lock_key, 1, self.lock_timeout)
+        if not acquired:
+            # Another process is already asking the model for this key
+            value = self._wait_for_fill(key, lock_key)
+            if value is not None:
+                self._incr('coalesced')
+                return value
+
+        try:
+            if self.meta_cache.get(self._seen_key(key)) is not None:
+                self._incr('refills')
+            value = compute()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            return value
+        finally:
+            if acquired:
+                self.meta_cache.delete(lock_key)
+
+    def _wait_for_fill(self, key, lock_key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key)
+            if value is not None or self.meta_cache.get(lock_key) is None:
+                return value
+        return None
+
+    def _incr(self, name, delta=1):
+        if not delta:
+            return
+        stat_key = self._stat_key(name)
+        try:
+            self.meta_cache.incr(stat_key, delta)
+        except ValueError:
+            # First event of this kind; add() keeps a concurrent creator's count
+            if not self.meta_cache.add(stat_key, delta, None):
+                self.meta_cache.incr(stat_key, delta)
+
+    @staticmethod
+    def _seen_key(key):
+        return f'{key}:seen'
+
+    @staticmethod
+    def _stat_key(name):
+        return f'ai-suggestion-stats:{name}'
+
+
+suggestion_cache = SuggestionCache()
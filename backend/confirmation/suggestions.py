@@ -0,0 +1,425 @@
+import asyncio
+import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .providers import CircuitOpenError, ProviderError, get_provider
+from .suggestion_cache import suggestion_cache
+
+# One limiter per event loop: asyncio primitives cannot be shared across loops.
+# Under ASGI that is one per worker process, so AI_SUGGESTIONS_MAX_CONCURRENCY
+# caps each worker. Under WSGI async views run on a fresh loop per request and
+# the limit does not apply across requests.
+_limiters = weakref.WeakKeyDictionary()
+
+
+def build_prompt(material, treatment_charge, refining_charge, delivery_point):
+    return f"""Analyze this business confirmation data and provide specific pricing suggestions:
+            - Material: {material}
+            - Treatment Charge: {treatment_charge or 'Not set'}
+            - Refining Charge: {refining_charge or 'Not set'}
+            - Delivery Point: {delivery_point}
+
+            Provide specific market insights and pricing recommendations.
+            Format your response exactly as:
+            TC: [specific suggestion with reasoning]
+            RC: [specific suggestion with reasoning]
+
+            Keep each suggestion under 50 words."""
+
+
+def parse_ai_response(ai_response, refining_charge, material):
+    """Split a 'TC: ... RC: ...' model answer into (tc_suggestion, rc_suggestion)"""
+    ai_response = ai_response.strip()
+    if 'TC:' in ai_response and 'RC:' in ai_response:
+        tc_part = ai_response.split('TC:')[1].split('RC:')[0].strip()
+        rc_part = ai_response.split('RC:')[1].strip()
+        return f"AI: {tc_part}", f"AI: {rc_part}"
+    # If AI response doesn't have proper format, use AI response for TC and fallback for RC
+    return f"AI: {ai_response}", generate_rc_suggestion(refining_charge, material)
+
+
+def fallback_suggestions(material, treatment_charge, refining_charge):
+    return {
+        'tc_suggestion': generate_tc_suggestion(treatment_charge, material),
+        'rc_suggestion': generate_rc_suggestion(refining_charge, material),
+        'source': 'fallback'
+    }
+
+
+def is_cacheable_suggestion(result):
+    """Only cache real model answers; fallbacks are cheap and should retry the model.
+
+    A fallback also quotes the exact charge the user typed, while the cache
+    key rounds it, so a cached one could answer a different value wrongly.
+    """
+    return result.get('source') == 'ai'
+
+
+def build_ai_suggestions(material, treatment_charge, refining_charge, delivery_point):
+    """Ask the AI provider for TC/RC suggestions, falling back to the local heuristics"""
+    # Smart analysis without AI (fallback)
+    result = fallback_suggestions(material, treatment_charge, refining_charge)
+
+    provider = get_provider()
+    if provider is None:
+        print("No Gemini API key found, using fallback")  # Debug log
+        return result
+
+    prompt = build_prompt(material, treatment_charge, refining_charge, delivery_point)
+    print(f"Sending prompt to {provider.name}: {prompt}")  # Debug log
+    try:
+        ai_response = provider.complete(prompt, timeout=settings.AI_SUGGESTIONS_TIMEOUT)
+    except CircuitOpenError as e:
+        print(f"Skipping AI call: {e}")
+        return result
+    except ProviderError as e:
+        print(f"AI API call failed: {e}")
+        return result
+
+    print(f"AI API response: {ai_response}")  # Debug log
+    return _ai_result(ai_response, result, refining_charge, material)
+
+
+def _get_limiter():
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = asyncio.Semaphore(settings.AI_SUGGESTIONS_MAX_CONCURRENCY)
+    return limiter
+
+
+async def _acomplete_limited(provider, prompt, timeout):
+    """Wait for a model slot, then complete within what is left of timeout.
+
+    The provider applies the remaining time itself, so a missed deadline is
+    recorded as a provider failure rather than a cancellation.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    limiter = _get_limiter()
+    await asyncio.wait_for(limiter.acquire(), timeout=timeout)
+    try:
+        return await provider.acomplete(prompt, timeout=max(deadline - loop.time(), 0))
+    finally:
+        limiter.release()
+
+
+async def abuild_ai_suggestions(material, treatment_charge, refining_charge, delivery_point):
+    """Async counterpart of build_ai_suggestions with a hard deadline.
+
+    Waiting for a free model slot counts against the deadline; when it passes
+    the heuristic fallback is returned right away.
+    """
+    result = fallback_suggestions(material, treatment_charge, refining_charge)
+
+    provider = get_provider()
+    if provider is None:
+        print("No Gemini API key found, using fallback")  # Debug log
+        return result
+
+    prompt = build_prompt(material, treatment_charge, refining_charge, delivery_point)
+    try:
+        ai_response = await _acomplete_limited(provider, prompt, settings.AI_SUGGESTIONS_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("No free AI slot before the deadline, using fallback")
+        return result
+    except ProviderError as e:
+        print(f"AI API call failed: {e}")
+        return result
+
+    return _ai_result(ai_response, result, refining_charge, material)
+
+
+class SuggestionStreamParser:
+    """Incrementally split a streamed 'TC: ... RC: ...' answer into sections.
+
+    `feed` returns ('tc' | 'rc', text) deltas as soon as they are known to
+    belong to a section. Text that could be the start of a marker split across
+    chunks is held back until the next chunk decides it.
+    """
+
+    NEXT_MARKER = {'preamble': 'TC:', 'tc': 'RC:'}
+    NEXT_SECTION = {'preamble': 'tc', 'tc': 'rc'}
+
+    def __init__(self):
+        self.section = 'preamble'
+        self.chunks = []
+        self._pending = ''
+        self._section_start = False
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+        self._pending += chunk
+        events = []
+
+        marker = self.NEXT_MARKER.get(self.section)
+        while marker and marker in self._pending:
+            before, self._pending = self._pending.split(marker, 1)
+            self._emit(before, events)
+            self.section = self.NEXT_SECTION[self.section]
+            self._section_start = True
+            marker = self.NEXT_MARKER.get(self.section)
+
+        held = self._partial_marker_length(marker) if marker else 0
+        self._emit(self._pending[:len(self._pending) - held], events)
+        self._pending = self._pending[len(self._pending) - held:]
+        return events
+
+    def close(self):
+        events = []
+        self._emit(self._pending, events)
+        self._pending = ''
+        return events
+
+    def _partial_marker_length(self, marker):
+        for length in range(min(len(marker) - 1, len(self._pending)), 0, -1):
+            if self._pending.endswith(marker[:length]):
+                return length
+        return 0
+
+    def _emit(self, text, events):
+        # Text before 'TC:' is only used if the model ignored the format,
+        # which the final parse_ai_response call handles.
+        if self.section == 'preamble':
+            return
+        if self._section_start:
+            text = text.lstrip()
+            if not text:
+                return
+            self._section_start = False
+        if text:
+            events.append((self.section, text))
+
+
+async def astream_ai_suggestions(material, treatment_charge, refining_charge, delivery_point):
+    """Yield ('tc' | 'rc', delta) events while the model answers, then ('done', result).
+
+    The 'done' result is the same dict build_ai_suggestions returns; if the
+    model fails or the deadline passes mid-stream it is the heuristic fallback
+    and replaces whatever partial text was sent.
+    """
+    fallback = fallback_suggestions(material, treatment_charge, refining_charge)
+
+    provider = get_provider()
+    if provider is None:
+        print("No Gemini API key found, using fallback")  # Debug log
+        yield 'done', fallback
+        return
+
+    prompt = build_prompt(material, treatment_charge, refining_charge, delivery_point)
+    parser = SuggestionStreamParser()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.AI_SUGGESTIONS_TIMEOUT
+    limiter = _get_limiter()
+
+    try:
+        await asyncio.wait_for(limiter.acquire(), timeout=settings.AI_SUGGESTIONS_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("No free AI slot before the deadline, using fallback")
+        yield 'done', fallback
+        return
+
+    try:
+        chunks = provider.astream(prompt)
+        try:
+            while True:
+                remaining = max(deadline - loop.time(), 0)
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                for event in parser.feed(chunk):
+                    yield event
+        finally:
+            await chunks.aclose()
+    except asyncio.TimeoutError:
+        print(f"AI stream exceeded {settings.AI_SUGGESTIONS_TIMEOUT}s, using fallback")
+        # Abandoning the stream is not counted by the provider; a missed deadline is
+        provider.breaker.record_failure()
+        yield 'done', fallback
+        return
+    except ProviderError as e:
+        print(f"AI API call failed: {e}")
+        yield 'done', fallback
+        return
+    finally:
+        limiter.release()
+
+    for event in parser.close():
+        yield event
+    yield 'done', _ai_result(parser.text, fallback, refining_charge, material)
+
+
+BATCH_FIELDS = ('material', 'treatment_charge', 'refining_charge', 'delivery_point')
+
+
+def build_batch_prompt(items):
+    """Prompt for several deals at once; items are dicts with BATCH_FIELDS"""
+    deals = '\n'.join(
+        f"{number}. Material: {item['material']}; "
+        f"Treatment Charge: {item['treatment_charge'] or 'Not set'}; "
+        f"Refining Charge: {item['refining_charge'] or 'Not set'}; "
+        f"Delivery Point: {item['delivery_point']}"
+        for number, item in enumerate(items, start=1)
+    )
+    return f"""Analyze these business confirmation deals and provide specific pricing suggestions for each:
+{deals}
+
+Provide specific market insights and pricing recommendations.
+Respond with only a JSON array containing one object per deal, in the same order:
+[{{"deal": 1, "tc": "[specific TC suggestion with reasoning]", "rc": "[specific RC suggestion with reasoning]"}}]
+
+Keep each suggestion under 50 words."""
+
+
+def parse_batch_response(ai_response, count):
+    """Map deal number (1-based) -> (tc, rc) for every well-formed answer in the response"""
+    start, end = ai_response.find('['), ai_response.rfind(']')
+    if start == -1 or end < start:
+        return {}
+    try:
+        answers = json.loads(ai_response[start:end + 1])
+    except ValueError:
+        return {}
+
+    parsed = {}
+    for answer in answers if isinstance(answers, list) else []:
+        if not isinstance(answer, dict):
+            continue
+        number, tc, rc = answer.get('deal'), answer.get('tc'), answer.get('rc')
+        if isinstance(number, int) and 1 <= number <= count and isinstance(tc, str) and isinstance(rc, str):
+            if tc.strip() and rc.strip():
+                parsed[number] = (tc.strip(), rc.strip())
+    return parsed
+
+
+def pack_batches(items):
+    """Group items into as few prompts as AI_SUGGESTIONS_BATCH_MAX_PROMPT_CHARS allows"""
+    budget = settings.AI_SUGGESTIONS_BATCH_MAX_PROMPT_CHARS
+    max_items = settings.AI_SUGGESTIONS_BATCH_MAX_PER_PROMPT
+    overhead = len(build_batch_prompt([]))
+
+    batches, current, size = [], [], overhead
+    for item in items:
+        item_size = len(build_batch_prompt([item])) - overhead
+        if current and (size + item_size > budget or len(current) >= max_items):
+            batches.append(current)
+            current, size = [], overhead
+        current.append(item)
+        size += item_size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _complete_batch(provider, batch):
+    """Return the per-item results for one packed prompt, falling back item by item"""
+    fallbacks = [
+        fallback_suggestions(item['material'], item['treatment_charge'], item['refining_charge'])
+        for item in batch
+    ]
+    try:
+        ai_response = provider.complete(build_batch_prompt(batch), timeout=settings.AI_SUGGESTIONS_TIMEOUT)
+    except ProviderError as e:
+        print(f"AI batch call failed: {e}")
+        return fallbacks
+
+    answers = parse_batch_response(ai_response or '', len(batch))
+    results = []
+    for number, fallback in enumerate(fallbacks, start=1):
+        if number in answers:
+            tc_part, rc_part = answers[number]
+            results.append({'tc_suggestion': f"AI: {tc_part}", 'rc_suggestion': f"AI: {rc_part}", 'source': 'ai'})
+        else:
+            results.append(fallback)
+    return results
+
+
+def build_batch_ai_suggestions(items):
+    """Suggestions for many deals; returns (results in input order, stats).
+
+    Identical inputs (by suggestion cache key) are answered once, cached ones
+    are served from the cache, and the rest are packed into as few model
+    prompts as possible, run concurrently. Deals the model did not answer get
+    the heuristic fallback.
+    """
+    keys = [suggestion_cache.make_key(*(item[field] for field in BATCH_FIELDS)) for item in items]
+    unique = dict(zip(keys, items))
+    results = suggestion_cache.get_many(list(unique))
+    pending = [key for key in unique if key not in results]
+
+    provider = get_provider()
+    batches = pack_batches([unique[key] for key in pending]) if provider is not None else []
+    if provider is None:
+        for key in pending:
+            item = unique[key]
+            results[key] = fallback_suggestions(item['material'], item['treatment_charge'], item['refining_charge'])
+    elif batches:
+        workers = min(len(batches), settings.AI_SUGGESTIONS_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batch_results = executor.map(lambda batch: _complete_batch(provider, batch), batches)
+            computed = [result for batch in batch_results for result in batch]
+        results.update(zip(pending, computed))
+        suggestion_cache.set_many({
+            key: results[key] for key in pending if is_cacheable_suggestion(results[key])
+        })
+
+    stats = {
+        'requested': len(items),
+        'unique': len(unique),
+        'cached': len(unique) - len(pending),
+        'model_calls': len(batches),
+    }
+    return [results[key] for key in keys], stats
+
+
+def _ai_result(ai_response, fallback, refining_charge, material):
+    if not ai_response or not ai_response.strip():
+        print("AI API returned empty response")  # Debug log
+        return fallback
+    tc_suggestion, rc_suggestion = parse_ai_response(ai_response, refining_charge, material)
+    return {'tc_suggestion': tc_suggestion, 'rc_suggestion': rc_suggestion, 'source': 'ai'}
+
+
+def generate_tc_suggestion(tc_value, material):
+    """Generate smart TC suggestions based on input value"""
+    try:
+        tc = float(tc_value) if tc_value else 0
+    except:
+        tc = 0
+
+    if tc == 0:
+        return "Industry average TC for Lead: $310-$325/dmt"
+    elif tc > 350:
+        return f"⚠️ Your TC (${tc}) is above market average. Consider $320-$330 for better competitiveness."
+    elif tc < 280:
+        return f"💡 Your TC (${tc}) is below market. Consider $310-$320 for fair pricing."
+    elif 300 <= tc <= 330:
+        return f"✅ Your TC (${tc}) is within market range. Good pricing!"
+    else:
+        return f"📊 Your TC (${tc}) is competitive. Market range: $310-$325/dmt"
+
+def generate_rc_suggestion(rc_value, material):
+    """Generate smart RC suggestions based on input value"""
+    try:
+        rc = float(rc_value) if rc_value else 0
+    except:
+        rc = 0
+
+    if rc == 0:
+        return "Market average RC for Ag: $4.20-$4.50/toz"
+    elif rc > 5.00:
+        return f"⚠️ Your RC (${rc}) is high. Suggest $4.50 for market competitiveness."
+    elif rc < 3.50:
+        return f"💡 Your RC (${rc}) is low. Consider $4.20 for fair pricing."
+    elif 4.00 <= rc <= 4.60:
+        return f"✅ Your RC (${rc}) is within market range. Good pricing!"
+    else:
+        return f"📊 Your RC (${rc}) is competitive. Market range: $4.20-$4.50/toz"
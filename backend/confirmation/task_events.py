@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+
+import redis
+from django.conf import settings
+
+CHANNEL_PREFIX = 'task-status:'
+TERMINAL_STATUSES = ('completed', 'failed')
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def channel_name(celery_task_id):
+    return f'{CHANNEL_PREFIX}{celery_task_id}'
+
+
+def is_enabled():
+    """Status events need Redis; other brokers (memory:// in tests) publish nothing"""
+    return str(settings.TASK_EVENTS_REDIS_URL).startswith(('redis://', 'rediss://', 'unix://'))
+
+
+def get_client():
+    """This process's publishing connection, rebuilt after a fork like get_provider()"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client_pid != pid:
+        with _client_lock:
+            if _client_pid != pid:
+                _client = redis.Redis.from_url(
+                    settings.TASK_EVENTS_REDIS_URL, socket_connect_timeout=2, socket_timeout=2
+                )
+                _client_pid = pid
+    return _client
+
+
+def publish_task_status(processing_task):
+    """Push the task's current status to subscribers of its celery_task_id.
+
+    Best effort: the row is the source of truth and clients fall back to
+    polling, so a Redis outage must never fail the task itself.
+    """
+    if not is_enabled():
+        return
+    # Imported on first publish so worker startup does not load DRF
+    from .serializers import ProcessingTaskSerializer
+
+    payload = json.dumps(ProcessingTaskSerializer(processing_task).data)
+    try:
+        get_client().publish(channel_name(processing_task.celery_task_id), payload)
+    except redis.RedisError as e:
+        print(f"Could not publish status for task {processing_task.celery_task_id}: {e}")
+
+
+@asynccontextmanager
+async def subscribe(celery_task_id):
+    """Subscribe to a task's status channel for the duration of the block"""
+    # Imported here: only web processes serving task-events/ subscribe;
+    # publishers (Celery workers) never use the asyncio client
+    import redis.asyncio as aioredis
+
+    client = aioredis.Redis.from_url(settings.TASK_EVENTS_REDIS_URL, socket_connect_timeout=2)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(channel_name(celery_task_id))
+        yield pubsub
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+async def next_status(pubsub, timeout):
+    """Wait up to timeout seconds for the next published status; None if none arrived"""
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+    if message is None or message['type'] != 'message':
+        return None
+    return json.loads(message['data'])
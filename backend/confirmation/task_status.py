@@ -0,0 +1,82 @@
+from celery import current_app, states
+from celery.backends.base import BaseKeyValueStoreBackend, DisabledBackend
+
+from .fast_read import ValuesReader
+from .models import ProcessingTask
+from .serializers import ProcessingTaskSerializer
+
+# Celery state -> ProcessingTask status; PENDING means the backend knows nothing
+CELERY_STATUS = {
+    states.RECEIVED: 'pending',
+    states.STARTED: 'processing',
+    states.RETRY: 'processing',
+    states.SUCCESS: 'completed',
+    states.FAILURE: 'failed',
+    states.REVOKED: 'failed',
+}
+
+
+def celery_states(task_ids):
+    """{task_id: celery state} from the result backend, leaving out unknown ids.
+
+    Key-value backends (Redis) are read with a single MGET; others one id at a time.
+    """
+    backend = current_app.backend
+    if not task_ids or isinstance(backend, DisabledBackend):
+        return {}
+    try:
+        if isinstance(backend, BaseKeyValueStoreBackend):
+            keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+            values = backend.mget(keys)
+            if hasattr(values, 'items'):
+                # Some clients answer with a key -> value mapping
+                values = [values.get(key) for key in keys]
+            metas = zip(task_ids, (backend.decode_result(value) if value else None for value in values))
+        else:
+            metas = ((task_id, backend.get_task_meta(task_id)) for task_id in task_ids)
+        return {
+            task_id: meta['status'] for task_id, meta in metas
+            if meta and meta.get('status') not in (None, states.PENDING)
+        }
+    except Exception as e:
+        print(f"Celery result backend unavailable for status lookup: {e}")
+        return {}
+
+
+def batch_task_statuses(task_ids=None, confirmation_id=None):
+    """Statuses for the given task ids or every task of a confirmation.
+
+    One indexed query reads the rows. Rows still pending/processing, and ids
+    without a row, are then checked against the Celery result backend, which
+    can be ahead of the row (`source` is "celery" when its answer was used).
+    Returns (tasks, missing ids).
+    """
+    queryset = ProcessingTask.objects.all()
+    if task_ids is not None:
+        queryset = queryset.filter(celery_task_id__in=task_ids)
+    if confirmation_id is not None:
+        queryset = queryset.filter(business_confirmation_id=confirmation_id)
+    reader = ValuesReader.for_serializer(ProcessingTaskSerializer())
+    rows = reader.convert(reader.values(queryset.order_by('-created_at', '-id')))
+
+    found = {row['celery_task_id'] for row in rows}
+    unknown = [task_id for task_id in task_ids or () if task_id not in found]
+    active = [row['celery_task_id'] for row in rows if row['status'] in ProcessingTask.ACTIVE_STATUSES]
+    lagging = celery_states(active + unknown)
+
+    for row in rows:
+        row['source'] = 'database'
+        state = lagging.get(row['celery_task_id'])
+        if row['status'] in ProcessingTask.ACTIVE_STATUSES and state in CELERY_STATUS:
+            if CELERY_STATUS[state] != row['status']:
+                row['status'] = CELERY_STATUS[state]
+                row['source'] = 'celery'
+
+    missing = []
+    for task_id in unknown:
+        state = lagging.get(task_id)
+        if state in CELERY_STATUS:
+            rows.append({'celery_task_id': task_id, 'status': CELERY_STATUS[state], 'source': 'celery'})
+        else:
+            missing.append(task_id)
+    return rows, missing
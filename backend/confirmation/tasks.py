@@ -0,0 +1,213 @@
+import time
+
+from celery import chain, group, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .assay import estimate_row_count, parse_assay, parse_cache_key
+from .documents import render_document, render_lock_key
+from .models import AssayParseJob, BusinessConfirmation, ProcessingTask
+from .pipeline import (
+    CONFIRMATION_RELATED, compute_pricing, notify_confirmation_processed,
+    render_confirmation_document, validate_confirmation
+)
+from .storage import content_hash
+from .task_events import publish_task_status
+
+# Transient failures (database locked/unavailable, file system, SMTP) are
+# retried with backoff; anything else fails the processing task at once.
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, OSError)
+STAGE_OPTIONS = {
+    'bind': True,
+    'autoretry_for': RETRYABLE_ERRORS,
+    'retry_backoff': True,
+    'retry_backoff_max': 60,
+    'max_retries': 3,
+    'acks_late': True,
+}
+
+
+# Redelivered if the worker dies mid-parse, up to ASSAY_PARSE_MAX_ATTEMPTS
+# deliveries; the soft limit fails a runaway parse
+@shared_task(
+    bind=True, acks_late=True, reject_on_worker_lost=True,
+    soft_time_limit=settings.ASSAY_PARSE_TIME_LIMIT, time_limit=settings.ASSAY_PARSE_TIME_LIMIT + 30,
+)
+def parse_assay_file_task(self, job_id):
+    jobs = AssayParseJob.objects.filter(id=job_id)
+    jobs.update(attempts=F('attempts') + 1, updated_at=timezone.now())
+    job = jobs.get()
+    if job.status in ('completed', 'failed'):
+        # The worker died after finishing but before acknowledging
+        return job.status
+    if job.attempts > settings.ASSAY_PARSE_MAX_ATTEMPTS:
+        # Every earlier delivery killed its worker; don't let the file take down another
+        print(f"Assay job {job.celery_task_id} gave up after {job.attempts - 1} attempts")
+        jobs.update(
+            status='failed',
+            error=f'Parsing stopped the worker {job.attempts - 1} times; the file may be too large or malformed',
+            completed_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        return 'failed'
+    print(f"Parsing assay file {job.file_name} for job {job.celery_task_id}")
+
+    def report(rows_processed):
+        # update() skips auto_now; updated_at is what tells a live job from a dead one
+        jobs.update(rows_processed=rows_processed, updated_at=timezone.now())
+
+    try:
+        with open(job.file_path, 'rb') as file:
+            jobs.update(
+                status='processing', rows_total=estimate_row_count(file, job.file_name), updated_at=timezone.now()
+            )
+            result = parse_assay(
+                file, job.file_name,
+                max_rows=settings.ASSAY_MAX_RETURNED_ROWS,
+                progress=report,
+                progress_every=settings.ASSAY_PROGRESS_EVERY,
+            )
+    except Exception as e:
+        print(f"Assay job {job.celery_task_id} failed: {e}")
+        jobs.update(status='failed', error=str(e), completed_at=timezone.now(), updated_at=timezone.now())
+        return 'failed'
+
+    # The stored file is kept: a later upload of the same content is answered from this
+    cache.set(
+        parse_cache_key(job.file_path, settings.ASSAY_MAX_RETURNED_ROWS),
+        result, timeout=settings.ASSAY_PARSE_CACHE_TIMEOUT,
+    )
+    result = {
+        **result,
+        'file_name': job.file_name,
+        'file_size': job.file_size,
+        'content_hash': content_hash(job.file_path),
+    }
+    jobs.update(
+        status='completed',
+        result=result,
+        rows_processed=result['row_count'],
+        completed_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    return 'completed'
+
+
+@shared_task(bind=True, autoretry_for=RETRYABLE_ERRORS, retry_backoff=True, max_retries=3)
+def render_confirmation_document_task(self, confirmation_id, document_format):
+    """Render a confirmation document into the content-addressed store"""
+    confirmation = BusinessConfirmation.objects.select_related(*CONFIRMATION_RELATED).get(id=confirmation_id)
+    result = render_document(confirmation, document_format)
+    # On failure the lock is left to expire, so a broken render is not retried on every poll
+    cache.delete(render_lock_key(result['content_hash']))
+    print(f"Document {result['document']} for confirmation {confirmation_id} ready")
+    return result
+
+
+@shared_task(bind=True)
+def process_confirmation_task(self, processing_task_id):
+    """Run the confirmation pipeline: validate, then price and render in parallel, then notify"""
+    print(f"Starting processing task for ID: {processing_task_id}")
+    update_processing_task(processing_task_id, status='processing')
+    workflow = chain(
+        validate_confirmation_stage.si(processing_task_id),
+        group(
+            compute_pricing_stage.si(processing_task_id),
+            render_document_stage.si(processing_task_id),
+        ),
+        notify_stage.si(processing_task_id),
+    )
+    # The pipeline takes over this task's id, so its result is the pipeline's
+    return self.replace(workflow)
+
+
+@shared_task(**STAGE_OPTIONS)
+def validate_confirmation_stage(self, processing_task_id):
+    return run_stage(self, processing_task_id, 'validation', validate_confirmation)
+
+
+@shared_task(**STAGE_OPTIONS)
+def compute_pricing_stage(self, processing_task_id):
+    return run_stage(self, processing_task_id, 'pricing', compute_pricing)
+
+
+@shared_task(**STAGE_OPTIONS)
+def render_document_stage(self, processing_task_id):
+    return run_stage(self, processing_task_id, 'document', render_confirmation_document)
+
+
+@shared_task(**STAGE_OPTIONS)
+def notify_stage(self, processing_task_id):
+    task = ProcessingTask.objects.get(id=processing_task_id)
+    # A retry after the mail went out must not send it twice
+    if task.stage_timings.get('notification', {}).get('status') != 'completed':
+        run_stage(self, processing_task_id, 'notification', notify_confirmation_processed)
+
+    update_processing_task(processing_task_id, status='completed', completed_at=timezone.now())
+    print(f"Task {processing_task_id} completed successfully")
+    return 'completed'
+
+
+def run_stage(celery_task, processing_task_id, stage, func):
+    """Run func(confirmation) as one pipeline stage, recording timing, attempts and output"""
+    attempt = celery_task.request.retries + 1
+    started = time.monotonic()
+    record_stage(processing_task_id, stage, {
+        'status': 'running', 'attempts': attempt, 'started_at': timezone.now().isoformat(),
+    })
+    try:
+        confirmation = BusinessConfirmation.objects.select_related(*CONFIRMATION_RELATED).get(
+            processing_tasks__id=processing_task_id
+        )
+        output = func(confirmation)
+    except Exception as e:
+        retrying = isinstance(e, RETRYABLE_ERRORS) and celery_task.request.retries < celery_task.max_retries
+        record_stage(processing_task_id, stage, {
+            'status': 'retrying' if retrying else 'failed',
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'error': str(e),
+        })
+        if not retrying:
+            update_processing_task(
+                processing_task_id, status='failed', error=f'{stage}: {e}', completed_at=timezone.now()
+            )
+            print(f"Task {processing_task_id} failed at {stage}: {e}")
+        raise
+
+    record_stage(processing_task_id, stage, {
+        'status': 'completed',
+        'duration_ms': round((time.monotonic() - started) * 1000, 1),
+    }, result=output)
+    return output
+
+
+def record_stage(processing_task_id, stage, info, result=None):
+    # Pricing and document stages finish concurrently; lock the row so their
+    # read-modify-write of the JSON columns cannot lose each other's update.
+    with transaction.atomic():
+        task = ProcessingTask.objects.select_for_update().get(id=processing_task_id)
+        task.stage_timings = {**task.stage_timings, stage: {**task.stage_timings.get(stage, {}), **info}}
+        update_fields = ['stage_timings', 'updated_at']
+        if result is not None:
+            task.result = {**(task.result or {}), stage: result}
+            update_fields.append('result')
+        task.save(update_fields=update_fields)
+        publish_on_commit(processing_task_id)
+
+
+def update_processing_task(processing_task_id, **fields):
+    """Update the task row and push its new state to status subscribers"""
+    ProcessingTask.objects.filter(id=processing_task_id).update(updated_at=timezone.now(), **fields)
+    publish_on_commit(processing_task_id)
+
+
+def publish_on_commit(processing_task_id):
+    """Publish the task once the write commits, so subscribers never see a rolled-back state.
+
+    The row is re-read at publish time: when concurrent stages commit close
+    together, each message carries everything committed so far.
+    """
+    transaction.on_commit(lambda: publish_task_status(ProcessingTask.objects.get(id=processing_task_id)))
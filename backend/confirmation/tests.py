@@ -1,3 +1,1540 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from redis import RedisError
+
+from . import metrics, task_events
+from .benchmarks import SEEDED_TASKS, compare, isolated_services, route_names, run_suite
+from .analytics import rebuild_summary, summarize
+from .assay import parse_assay, resolve_columns, to_number
+from .lazy import LazyModule
+from .management.commands.import_time_report import parse_importtime, summarize_imports
+from .fast_read import FastJSONRenderer
+from .documents import document_sections, render_document, render_docx, render_pdf, render_txt
+from .bulk import CONFIRMATION_FOREIGN_KEYS, bulk_create_confirmations, validate_confirmation_rows
+from .models import (
+    AssayParseJob, Material, Buyer, BusinessConfirmation, ConfirmationSummary, ProcessingTask, DeliveryTerm, DeliveryPoint, Packaging, TransportMode,
+    PaymentMethod, Currency, TriggeringEvent, Surveyor, PricePoint
+)
+from .storage import assay_storage
+from .serializers import EXPANDABLE_RELATIONS, BusinessConfirmationSerializer, SurveyorSerializer
+from .prices import ingest_prices, price_store
+from .reference_data import REFERENCE_MODELS, reference_serializers
+from .providers import CircuitBreaker, CircuitOpenError, ProviderError, StubProvider, reset_provider, set_provider
+from .suggestion_cache import STAT_NAMES, SuggestionCache, suggestion_cache
+from .suggestions import (
+    SuggestionStreamParser, abuild_ai_suggestions, astream_ai_suggestions, build_batch_ai_suggestions, build_batch_prompt,
+    generate_tc_suggestion, is_cacheable_suggestion, pack_batches, parse_ai_response, parse_batch_response,
+)
+from .task_status import batch_task_statuses
+from .tasks import (
+    compute_pricing_stage, parse_assay_file_task, process_confirmation_task, record_stage,
+    render_confirmation_document_task, update_processing_task,
+)
+from .valuation import open_confirmations, parse_prices, value_book, value_confirmation
+
+ALL_RELATIONS = ','.join(EXPANDABLE_RELATIONS)
+
+
+def create_confirmation(**overrides):
+    fields = {
+        'buyer': Buyer.objects.create(name='Trafigura'),
+        'material': Material.objects.create(name='Lead concentrate'),
+        'delivery_term': DeliveryTerm.objects.create(name='CIF'),
+        'delivery_point': DeliveryPoint.objects.create(name='Antwerp', country='Belgium'),
+        'packaging': Packaging.objects.create(name='Bulk'),
+        'transport_mode': TransportMode.objects.create(name='Vessel'),
+        'payment_method': PaymentMethod.objects.create(name='Letter of credit'),
+        'currency': Currency.objects.get_or_create(code='USD', defaults={'name': 'US Dollar', 'symbol': '$'})[0],
+        'triggering_event': TriggeringEvent.objects.create(name='Bill of lading'),
+        'nominated_surveyor': Surveyor.objects.create(name='Jane Doe', company='SGS'),
+        'quantity': 1000,
+    }
+    fields.update(overrides)
+    return BusinessConfirmation.objects.create(**fields)
+
+
+def docx_text(content):
+    from docx import Document
+
+    document = Document(io.BytesIO(content))
+    cells = [cell.text for table in document.tables for row in table.rows for cell in row.cells]
+    return '\n'.join([paragraph.text for paragraph in document.paragraphs] + cells)
+
+
+def pdf_text(content):
+    """Text shown by a reportlab PDF: its page streams are ASCII85 + Flate encoded"""
+    lines = []
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', content, re.S):
+        operators = zlib.decompress(base64.a85decode(stream.strip(), adobe=True)).decode('latin-1')
+        for line in operators.split('T*'):
+            strings = re.findall(r'\(((?:\\.|[^\\)])*)\) Tj', line)
+            lines.append(''.join(re.sub(r'\\(.)', r'\1', string) for string in strings))
+    return '\n'.join(lines)
+
+
+class ConfirmationExpandTests(TestCase):
+    def test_detail_returns_ids_without_expand(self):
+        confirmation = create_confirmation()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/business-confirmations/{confirmation.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['buyer'], confirmation.buyer_id)
+
+    def test_detail_expands_every_relation_in_one_query(self):
+        confirmation = create_confirmation()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/business-confirmations/{confirmation.id}/?expand={ALL_RELATIONS}')
+        data = response.json()
+        self.assertEqual(data['buyer'], {'id': confirmation.buyer_id, 'name': 'Trafigura'})
+        self.assertEqual(data['currency']['code'], 'USD')
+        self.assertEqual(data['nominated_surveyor']['company'], 'SGS')
+        self.assertEqual(data['transport_mode']['name'], 'Vessel')
+
+    def test_partial_expand_leaves_other_relations_as_ids(self):
+        confirmation = create_confirmation()
+        response = self.client.get(f'/api/business-confirmations/{confirmation.id}/?expand=material')
+        data = response.json()
+        self.assertEqual(data['material']['name'], 'Lead concentrate')
+        self.assertEqual(data['buyer'], confirmation.buyer_id)
+
+    def test_list_query_count_does_not_grow_with_rows_or_relations(self):
+        for _ in range(15):
+            create_confirmation()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/business-confirmations/?page_size=10')
+        self.assertEqual(len(response.json()['results']), 10)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/business-confirmations/?page_size=10&expand={ALL_RELATIONS}')
+        results = response.json()['results']
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(isinstance(row['delivery_point'], dict) for row in results))
+
+    def test_unknown_relation_is_rejected(self):
+        confirmation = create_confirmation()
+        response = self.client.get(f'/api/business-confirmations/{confirmation.id}/?expand=buyer,seller')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+    def test_create_ignores_expand(self):
+        confirmation = create_confirmation()
+        response = self.client.post(
+            f'/api/business-confirmations/?expand={ALL_RELATIONS}',
+            {'buyer': confirmation.buyer_id, 'material': confirmation.material_id, 'quantity': '10.00'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['buyer'], confirmation.buyer_id)
+
+
+class FastListPathTests(TestCase):
+    def test_list_output_matches_serializer(self):
+        create_confirmation(treatment_charge='320.5', shipment_period_from='2025-03-01')
+        create_confirmation(assay_pb='55.2')
+        response = self.client.get('/api/business-confirmations/')
+        expected = BusinessConfirmationSerializer(
+            BusinessConfirmation.objects.order_by('-created_at', '-id'), many=True
+        ).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+    def test_lookup_list_matches_serializer(self):
+        create_confirmation()
+        response = self.client.get('/api/surveyors/')
+        self.assertEqual(response.json(), SurveyorSerializer(Surveyor.objects.all(), many=True).data)
+
+    def test_renderer_handles_what_orjson_refuses(self):
+        renderer = FastJSONRenderer()
+        self.assertEqual(json.loads(renderer.render({1: ['error'], 'day': date(2025, 3, 1)})),
+                         {'1': ['error'], 'day': '2025-03-01'})
+        self.assertEqual(json.loads(renderer.render({'id': 2 ** 70})), {'id': 2 ** 70})
+        self.assertEqual(renderer.render(None), b'')
+
+    def test_create_errors_are_rendered(self):
+        response = self.client.post('/api/business-confirmations/', {'quantity': 'lots'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json())
+
+
+class TriggerProcessingTests(TestCase):
+    def trigger(self, confirmation_id):
+        return self.client.post(
+            '/api/trigger-processing/', {'business_confirmation_id': confirmation_id}, content_type='application/json'
+        )
+
+    @mock.patch('backend.confirmation.views.process_confirmation_task.apply_async')
+    def test_dispatches_once_after_commit_with_pregenerated_id(self, apply_async):
+        confirmation = create_confirmation()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.trigger(confirmation.id)
+            apply_async.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+        task = ProcessingTask.objects.get()
+        self.assertEqual(response.json()['celery_task_id'], task.celery_task_id)
+        apply_async.assert_called_once_with(args=[task.id], task_id=task.celery_task_id)
+
+    @mock.patch('backend.confirmation.views.process_confirmation_task.apply_async')
+    def test_repeated_trigger_returns_active_task(self, apply_async):
+        confirmation = create_confirmation()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.trigger(confirmation.id)
+            second = self.trigger(confirmation.id)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['celery_task_id'], first.json()['celery_task_id'])
+        self.assertEqual(apply_async.call_count, 1)
+
+        ProcessingTask.objects.update(status='failed')
+        with self.captureOnCommitCallbacks(execute=True):
+            third = self.trigger(confirmation.id)
+        self.assertEqual(third.status_code, 201)
+        self.assertEqual(ProcessingTask.objects.count(), 2)
+
+    @mock.patch('backend.confirmation.views.process_confirmation_task.apply_async')
+    def test_stale_active_task_does_not_block_a_new_one(self, apply_async):
+        confirmation = create_confirmation()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.trigger(confirmation.id)
+        ProcessingTask.objects.update(
+            status='processing', updated_at=timezone.now() - timedelta(seconds=settings.PROCESSING_TASK_STALE_AFTER + 1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.trigger(confirmation.id)
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.json()['celery_task_id'], first.json()['celery_task_id'])
+        self.assertEqual(apply_async.call_count, 2)
+        stale = ProcessingTask.objects.get(celery_task_id=first.json()['celery_task_id'])
+        self.assertEqual(stale.status, 'failed')
+        self.assertIn('No progress', stale.error)
+
+    def test_unknown_confirmation(self):
+        self.assertEqual(self.trigger(999).status_code, 404)
+
+
+def create_confirmations_through_api(buyer_id, material_id, count):
+    """Web-process writer: POST confirmations, returning the errors it hit"""
+    client = Client()
+    errors = []
+    for _ in range(count):
+        try:
+            response = client.post(
+                '/api/business-confirmations/',
+                {'buyer': buyer_id, 'material': material_id, 'quantity': '100.00'},
+                content_type='application/json',
+            )
+            if response.status_code != 201:
+                errors.append(response.content.decode())
+        except OperationalError as e:
+            errors.append(str(e))
+    return errors
+
+
+def record_pipeline_stages(processing_task_id, worker, count):
+    """Worker-process writer: the locked read-modify-write the pipeline stages do"""
+    errors = []
+    for number in range(count):
+        try:
+            record_stage(processing_task_id, f'worker{worker}-{number}', {'status': 'completed'})
+        except OperationalError as e:
+            errors.append(str(e))
+    return errors
+
+
+class ConfirmationAnalyticsTests(TestCase):
+    def summary(self):
+        return summarize(['material', 'buyer', 'month'])
+
+    def test_incremental_updates_match_a_rebuild(self):
+        first = create_confirmation(quantity='1000', treatment_charge='300', assay_pb='50', shipment_period_from='2025-01-10')
+        second = create_confirmation(
+            buyer=first.buyer, material=first.material,
+            quantity='500', treatment_charge='320', shipment_period_from='2025-01-20'
+        )
+        moved = create_confirmation(buyer=first.buyer, material=first.material, quantity='200')
+        bulk_create_confirmations([
+            {'buyer_id': first.buyer_id, 'material_id': first.material_id, 'quantity': Decimal('300'),
+             'shipment_period_from': date(2025, 2, 1)},
+        ])
+        moved.shipment_period_from = '2025-02-03'
+        moved.assay_pb = '60'
+        moved.save()
+        second.delete()
+
+        incremental = self.summary()
+        self.assertEqual(ConfirmationSummary.objects.count(), 2)
+        rebuild_summary()
+        self.assertEqual(incremental, self.summary())
+
+        february = [row for row in incremental if row['month'] == '2025-02'][0]
+        self.assertEqual(february['confirmation_count'], 2)
+        self.assertEqual(february['tonnage'], Decimal('500'))
+        self.assertEqual(february['avg_assay_pb'], Decimal('60'))
+
+    def test_endpoint_reads_only_the_summary(self):
+        confirmation = create_confirmation(quantity='1000', treatment_charge='300', shipment_period_from='2025-03-05')
+        create_confirmation(material=confirmation.material, quantity='500', treatment_charge='310')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/confirmations/', {'group_by': 'material'})
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()['results']
+        self.assertEqual(row['material_name'], 'Lead concentrate')
+        self.assertEqual(row['confirmation_count'], 2)
+        self.assertEqual(row['avg_treatment_charge'], 305.0)
+
+        response = self.client.get('/api/analytics/confirmations/', {'group_by': 'seller', 'month_from': '2025-13'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_group_by_returns_one_book_total(self):
+        first = create_confirmation(quantity='1000', treatment_charge='300', shipment_period_from='2025-03-05')
+        create_confirmation(quantity='500', treatment_charge='320', shipment_period_from='2025-04-05')
+        self.assertEqual(ConfirmationSummary.objects.count(), 2)
+
+        response = self.client.get('/api/analytics/confirmations/', {'group_by': ''})
+        self.assertEqual(response.json()['group_by'], [])
+        [total] = response.json()['results']
+        self.assertEqual(total['confirmation_count'], 2)
+        self.assertEqual(Decimal(total['tonnage']), Decimal('1500'))
+        self.assertAlmostEqual(total['avg_treatment_charge'], 310.0)
+
+        [empty] = summarize([], {'material_id': first.material_id + 100})
+        self.assertEqual((empty['confirmation_count'], empty['tonnage']), (0, Decimal(0)))
+
+
+@override_settings(VALUATION_DEFAULT_PRICES={'pb': 2000.0, 'zn': 2700.0, 'cu': 9500.0, 'ag': 30.0})
+class ValuationTests(TestCase):
+    @override_settings(TIME_ZONE='Asia/Tokyo')
+    def test_open_confirmations_use_the_local_day(self):
+        ended = create_confirmation(shipment_period_to='2025-03-31')
+        running = create_confirmation(shipment_period_to='2025-04-01')
+        # 23:30 UTC on 31 March is already 1 April in Tokyo
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 3, 31, 23, 30, tzinfo=dt_timezone.utc)):
+            self.assertEqual(list(open_confirmations().values_list('id', flat=True)), [running.id])
+        self.assertEqual(
+            set(open_confirmations(on=date(2025, 3, 31)).values_list('id', flat=True)), {ended.id, running.id}
+        )
+
+    def test_single_confirmation(self):
+        confirmation = create_confirmation(
+            quantity='1000', assay_pb='55', assay_ag='100', treatment_charge='300', refining_charge='2',
+            prepayment_percentage=10,
+        )
+        valuation = value_confirmation(confirmation, {'pb': 2000.0, 'zn': 2700.0, 'cu': 9500.0, 'ag': 30.0})
+        # Pb pays min(95% x 55, 55 - 3) = 52 units; Ag min(95 g/t, 100 - 50) = 50 g/t
+        self.assertEqual(valuation['pb_payable'], 520.0)
+        self.assertEqual(valuation['pb_value'], 1040000.0)
+        self.assertEqual(valuation['ag_payable'], round(1000 * 50 / 31.1034768, 4))
+        self.assertEqual(valuation['zn_value'], 0.0)
+        self.assertEqual(valuation['treatment_charge_total'], 300000.0)
+        expected = 1040000 + 1000 * 50 / 31.1034768 * (30 - 2) - 300000
+        self.assertEqual(valuation['provisional_value'], round(expected, 2))
+        self.assertEqual(valuation['prepayment_amount'], round(expected / 10, 2))
+
+    def test_book_matches_single_valuations(self):
+        prices = {'pb': 2100.0, 'zn': 2600.0, 'cu': 9000.0, 'ag': 25.0}
+        confirmations = [
+            create_confirmation(quantity='1000', assay_pb='60', assay_zn='8', treatment_charge='250'),
+            create_confirmation(quantity='2500', assay_zn='50', assay_cu='2', assay_ag='300', refining_charge='1.5'),
+            create_confirmation(quantity=None, assay_pb='50'),
+        ]
+        with self.assertNumQueries(1):
+            book = value_book(BusinessConfirmation.objects.all(), prices, include_lots=True)
+        singles = [value_confirmation(confirmation, prices) for confirmation in confirmations]
+        self.assertEqual(book['lots'], singles)
+        self.assertAlmostEqual(
+            book['totals']['provisional_value'], sum(row['provisional_value'] for row in singles), places=2
+        )
+
+    def test_endpoints(self):
+        confirmation = create_confirmation(quantity='1000', assay_pb='55')
+        response = self.client.get(f'/api/business-confirmations/{confirmation.id}/valuation/', {'price_pb': '2500'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pb_value'], 520 * 2500)
+
+        response = self.client.post('/api/valuation/book/', {'price_pb': 2500}, content_type='application/json')
+        self.assertEqual(response.json()['totals']['pb_value'], 520 * 2500)
+        self.assertNotIn('lots', response.json())
+
+        for price in ('cheap', 'inf', '1e400', 'nan'):
+            response = self.client.get('/api/valuation/book/', {'price_ag': price})
+            self.assertEqual(response.status_code, 400, price)
+
+
+class PriceStoreTests(TestCase):
+    WIDE = ['date,PB,ZN,EUR', '2025-03-03,2010.5,2700,1.08', '2025-03-04,2020.5,,1.09', '2025-03-07,2030.5,2710,1.10']
+
+    def setUp(self):
+        price_store.invalidate()
+
+    def ingest(self, lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_prices(lines)
+
+    def test_as_of_and_average(self):
+        self.assertEqual(self.ingest(self.WIDE), {'PB': 3, 'ZN': 2, 'EUR': 3})
+        # Weekend and missing cells fall back to the last earlier price
+        self.assertEqual(price_store.as_of('pb', date(2025, 3, 6)), (date(2025, 3, 4), 2020.5))
+        self.assertEqual(price_store.as_of('ZN', date(2025, 3, 5)), (date(2025, 3, 3), 2700.0))
+        self.assertIsNone(price_store.as_of('PB', date(2025, 3, 2)))
+        self.assertEqual(price_store.average('PB', date(2025, 3, 1), date(2025, 3, 4)), (2015.5, 2))
+        self.assertEqual(price_store.average('PB', date(2025, 3, 5), date(2025, 3, 6)), (None, 0))
+
+    def test_ingest_replaces_prices_and_invalidates_series(self):
+        self.ingest(self.WIDE)
+        self.assertEqual(price_store.as_of('EUR', date(2025, 3, 4))[1], 1.09)
+        self.ingest(['date,symbol,value', '2025-03-04,eur,1.12', '2025-03-05,EUR,1.11'])
+        self.assertEqual(price_store.as_of('EUR', date(2025, 3, 4))[1], 1.12)
+        self.assertEqual(price_store.as_of('EUR', date(2025, 3, 6)), (date(2025, 3, 5), 1.11))
+        with self.assertRaisesMessage(ValueError, 'Line 2'):
+            ingest_prices(['date,PB', '03/05/2025,2000'])
+
+    def test_short_long_format_row_is_rejected(self):
+        upload = SimpleUploadedFile('prices.csv', b'date,symbol,value\n2024-01-02,PB,2000\n2024-01-03,PB\n')
+        response = self.client.post('/api/prices/upload/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Line 3', response.json()['error'])
+        self.assertFalse(PricePoint.objects.exists())
+
+    def test_valuation_uses_stored_prices_and_endpoints(self):
+        self.ingest(self.WIDE)
+        prices = parse_prices({'price_date': '2025-03-05', 'price_zn': '2800'})
+        self.assertEqual(prices['pb'], 2020.5)
+        self.assertEqual(prices['zn'], 2800.0)
+
+        response = self.client.get('/api/prices/PB/', {'date': '2025-03-08'})
+        self.assertEqual(response.json(), {'symbol': 'PB', 'as_of': '2025-03-08', 'date': '2025-03-07', 'value': 2030.5})
+        response = self.client.get('/api/prices/EUR/average/', {'from': '2025-03-01', 'to': '2025-03-31'})
+        self.assertAlmostEqual(response.json()['average'], 1.09)
+        self.assertEqual(self.client.get('/api/prices/CU/').status_code, 404)
+
+
+class MetricsTests(TestCase):
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_request_metrics_and_server_timing(self):
+        create_confirmation()
+        response = self.client.get('/api/business-confirmations/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries", total;dur=[\d.]+$')
+
+        metrics.record_task_duration('backend.confirmation.tasks.process_confirmation_task', 'success', 0.3)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="api/business-confirmations/",status="200"}', body
+        )
+        self.assertIn('db_queries_total{route="api/business-confirmations/"}', body)
+        self.assertIn(
+            'celery_task_duration_seconds_bucket{task="backend.confirmation.tasks.process_confirmation_task",'
+            'outcome="success",le="0.5"} 1', body
+        )
+        self.assertIn('ai_suggestion_cache_hit_ratio', body)
+
+    def test_replaced_task_is_not_counted_as_a_failure(self):
+        cache.clear()
+        task = mock.Mock()
+        task.name = 'backend.confirmation.tasks.process_confirmation_task'
+        for task_id, state in (('replaced', 'IGNORED'), ('failed', 'FAILURE')):
+            metrics.task_started(task_id=task_id)
+            metrics.task_finished(task_id=task_id, task=task, state=state)
+        prefix = f'{metrics.TASK_METRIC_PREFIX}:{task.name}'
+        self.assertEqual(cache.get(f'{prefix}:replaced:bucket:0'), 1)
+        self.assertEqual(cache.get(f'{prefix}:failure:bucket:0'), 1)
+
+    def test_metrics_endpoint_is_local_only(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 403)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_route_is_benchmarked_without_errors(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_suite(
+                confirmations=SEEDED_TASKS + 20, requests=2, task_runs=1, assay_rows=(20,), assay_requests=1,
+            )
+
+        rows = results['results']
+        self.assertEqual({row['route'] for row in rows if row['kind'] == 'http'}, set(route_names()))
+        self.assertEqual(
+            {row['route'] for row in rows if row['kind'] == 'task'},
+            {'process_confirmation_task', 'render_confirmation_document_task', 'parse_assay_file_task'},
+        )
+        self.assertEqual([row['name'] for row in rows if row['errors']], [])
+        self.assertTrue(all(row['p50_ms'] <= row['p99_ms'] for row in rows))
+        self.assertEqual(json.loads(json.dumps(results))['parameters']['assay_rows'], [20])
+
+    def test_compare_reports_regressions_over_the_threshold(self):
+        baseline = {'results': [{'name': 'GET buyer-list', 'p50_ms': 10.0, 'p99_ms': 20.0, 'throughput_per_s': 100.0}]}
+        current = {'results': [{'name': 'GET buyer-list', 'p50_ms': 11.0, 'p99_ms': 30.0, 'throughput_per_s': 70.0}]}
+
+        self.assertEqual(compare(current, baseline, threshold=20), [
+            ('GET buyer-list', 'p99_ms', 20.0, 30.0, 50.0),
+            ('GET buyer-list', 'throughput_per_s', 100.0, 70.0, -30.0),
+        ])
+
+
+class StartupTests(TestCase):
+    IMPORTTIME = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       300 |        300 |     json.decoder',
+        'import time:       200 |        500 |   json',
+        'import time:      1000 |       1000 |     backend.confirmation.lazy',
+        'import time:      4000 |       6000 | backend.confirmation.views',
+    ]
+
+    def test_lazy_module_imports_on_first_attribute(self):
+        with mock.patch('backend.confirmation.lazy.importlib.import_module', wraps=importlib.import_module) as load:
+            lazy = LazyModule('json')
+            self.assertIn('not loaded', repr(lazy))
+            load.assert_not_called()
+            self.assertEqual(lazy.dumps([1]), '[1]')
+            self.assertEqual(lazy.loads('2'), 2)
+        load.assert_called_once_with('json')
+        self.assertIn('(loaded)', repr(lazy))
+
+    def test_lazy_module_reports_a_missing_module_on_use(self):
+        lazy = LazyModule('no_such_module_anywhere')
+        with self.assertRaises(ModuleNotFoundError):
+            lazy.anything
+
+    def test_importtime_summary(self):
+        summary = summarize_imports(parse_importtime(self.IMPORTTIME), top=1)
+        self.assertEqual((summary['modules_imported'], summary['import_seconds']), (4, 0.0055))
+        self.assertEqual(summary['packages'], [{'package': 'backend', 'modules': 2, 'seconds': 0.005}])
+        self.assertEqual(summary['project_modules'], [{'module': 'backend.confirmation.views', 'cumulative_seconds': 0.006}])
+
+    @mock.patch('backend.confirmation.management.commands.import_time_report.run_script')
+    def test_report_command(self, run_script):
+        run_script.side_effect = lambda script, importtime=False: (0.5, self.IMPORTTIME if importtime else [])
+        out = io.StringIO()
+        call_command('import_time_report', '--target', 'wsgi', '--target', 'worker', '--repeat', '3', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {'wsgi', 'worker'})
+        self.assertEqual(report['wsgi']['startup_seconds'], 0.5)
+        self.assertEqual(report['worker']['project_modules'][0]['module'], 'backend.confirmation.views')
+        # Per target: the timed starts plus one run under -X importtime
+        self.assertEqual(run_script.call_count, 8)
+
+        with self.assertRaises(CommandError):
+            call_command('import_time_report', '--repeat', '0')
+
+
+class AssayParserTests(TestCase):
+    def parse_csv(self, text, **kwargs):
+        return parse_assay(io.BytesIO(text.encode()), 'lot.csv', **kwargs)
+
+    def test_xlsx_is_read_like_csv(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in [[None, None], ['Lot', 'Lead', 'Zinc', 'DMT'], [1, 55, 5, 10], [2, '51%', 7, 30]]:
+            sheet.append(row)
+        content = io.BytesIO()
+        workbook.save(content)
+        content.seek(0)
+
+        result = parse_assay(content, 'LOT.XLSX')
+        self.assertEqual((result['assay_pb'], result['assay_zn']), (52.0, 6.5))
+        self.assertEqual((result['row_count'], result['weighted'], result['total_weight']), (2, True, 40.0))
+        self.assertEqual([row['row'] for row in result['rows']], [3, 4])
+
+    def test_preferred_alias_wins_over_column_order(self):
+        header = ['Lead', ' pb ', 'Qty', 'Weight', 'Silver', 'Remarks', None]
+        self.assertEqual(resolve_columns(header), {'assay_pb': 1, 'weight': 3, 'assay_ag': 4})
+
+    def test_blank_and_short_rows(self):
+        result = self.parse_csv('\n\nPb,Zn,Cu\n50,5,1\n,,\n52\n\n54,7,3\n')
+        self.assertEqual(result['row_count'], 3)
+        self.assertFalse(result['weighted'])
+        self.assertEqual([row['row'] for row in result['rows']], [4, 6, 8])
+        # A short row leaves its missing cells out of those averages
+        self.assertEqual(result['rows'][1], {
+            'row': 6, 'assay_pb': 52.0, 'assay_zn': None, 'assay_cu': None, 'assay_ag': None, 'weight': None,
+        })
+        self.assertEqual((result['assay_pb'], result['assay_zn'], result['assay_ag']), (52.0, 6.0, 0))
+
+    def test_numbers_with_percent_signs_and_commas(self):
+        cases = {
+            '52.5%': 52.5, ' 52.5 % ': 52.5, '1,234.5': 1234.5, '12,500': 12500.0, '52,3': 52.3, 7: 7.0,
+            '1,2,3': None, 'n/a': None, '': None, '%': None, 'inf': None, True: None, None: None,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(to_number(value), expected)
+
+    def test_weights_with_commas_are_used(self):
+        result = self.parse_csv('Pb,Weight\n"50,0","1,000"\n60%,"3,000.0"\n')
+        self.assertEqual((result['assay_pb'], result['total_weight']), (57.5, 4000.0))
+
+    def test_rows_are_capped_but_all_are_averaged(self):
+        progress = []
+        result = self.parse_csv('Pb\n' + '\n'.join(['50', '60', '70', '80']), max_rows=2,
+                                progress=progress.append, progress_every=2)
+        self.assertEqual((result['assay_pb'], result['row_count'], len(result['rows'])), (65.0, 4, 2))
+        self.assertTrue(result['rows_truncated'])
+        self.assertEqual(progress, [2, 4])
+
+
+class AssayStorageTests(TestCase):
+    CSV = b'Lot,Weight,Pb,Zn\n1,10,55.0,5.0\n2,30,51.0,7.0\n'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def upload(self, name='certificate.csv'):
+        return self.client.post('/api/parse-assay-file/', {'file': SimpleUploadedFile(name, self.CSV)})
+
+    def test_same_content_is_stored_once(self):
+        first = assay_storage.save('assay_files/a.csv', SimpleUploadedFile('a.csv', self.CSV))
+        second = assay_storage.save('assay_files/b.CSV', SimpleUploadedFile('b.CSV', self.CSV))
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(assay_storage.path('assay_files')), [os.path.basename(first)])
+
+    def test_repeated_upload_returns_cached_parse(self):
+        first = self.upload().json()
+        self.assertFalse(first['cached'])
+        self.assertEqual(first['data']['assay_pb'], 52.0)
+
+        with mock.patch('backend.confirmation.views.parse_assay') as parse_assay:
+            second = self.upload('renamed.csv').json()
+        parse_assay.assert_not_called()
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['data']['file_name'], 'renamed.csv')
+        self.assertEqual(second['data']['content_hash'], first['data']['content_hash'])
+        self.assertEqual(second['data']['rows'], first['data']['rows'])
+
+    @override_settings(ASSAY_ASYNC_THRESHOLD_BYTES=10)
+    @mock.patch('backend.confirmation.views.parse_assay_file_task.apply_async')
+    def test_large_upload_is_parsed_in_a_job(self, apply_async):
+        apply_async.side_effect = lambda args, task_id: parse_assay_file_task.apply(args=args, task_id=task_id)
+        with contextlib.redirect_stdout(io.StringIO()), self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        apply_async.assert_called_once()
+
+        job = self.client.get(f'/api/assay-jobs/{job_id}/').json()
+        self.assertEqual((job['status'], job['rows_processed']), ('completed', 2))
+        self.assertEqual(job['result']['assay_pb'], 52.0)
+        self.assertEqual(job['result']['file_name'], 'certificate.csv')
+        # The result is cached against the content, so the next upload needs no job
+        self.assertTrue(self.upload().json()['cached'])
+
+    @override_settings(ASSAY_ASYNC_THRESHOLD_BYTES=10, ASSAY_JOB_STALE_AFTER=60)
+    @mock.patch('backend.confirmation.views.parse_assay_file_task.apply_async')
+    def test_upload_joins_only_a_live_job(self, apply_async):
+        with contextlib.redirect_stdout(io.StringIO()), self.captureOnCommitCallbacks(execute=True):
+            first = self.upload().json()['job_id']
+            self.assertEqual(self.upload().json()['job_id'], first)
+            # The worker died: no progress for longer than the staleness window
+            AssayParseJob.objects.update(status='processing', updated_at=timezone.now() - timedelta(minutes=5))
+            third = self.upload().json()['job_id']
+        self.assertNotEqual(third, first)
+        self.assertEqual(apply_async.call_count, 2)
+
+    @override_settings(ASSAY_PARSE_MAX_ATTEMPTS=2)
+    def test_redelivered_parse_gives_up_after_max_attempts(self):
+        stored = assay_storage.save('assay_files/a.csv', SimpleUploadedFile('a.csv', self.CSV))
+        job = AssayParseJob.objects.create(
+            celery_task_id='poison', file_name='a.csv', file_path=assay_storage.path(stored), status='processing',
+            attempts=2,
+        )
+        with contextlib.redirect_stdout(io.StringIO()), mock.patch('backend.confirmation.tasks.parse_assay') as parse:
+            self.assertEqual(parse_assay_file_task.apply(args=[job.id]).get(), 'failed')
+        parse.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIn('2 times', job.error)
+
+        # A finished job redelivered after its worker died is left as it is
+        job.attempts = 0
+        job.save()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(parse_assay_file_task.apply(args=[job.id]).get(), 'failed')
+        self.assertEqual(AssayParseJob.objects.get(id=job.id).error, job.error)
+
+
+@override_settings(TASK_EVENTS_REDIS_URL='memory://')
+class DatabaseConcurrencyTests(TransactionTestCase):
+    """Parallel writers in separate processes, as web and Celery workers run.
+
+    Runs against whichever backend DB_ENGINE selects.
+    """
+
+    WRITERS = 4
+    WRITES = 25
+
+    def test_parallel_web_and_worker_writes(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('An in-memory SQLite database cannot be shared between processes')
+        confirmation = create_confirmation()
+        processing_task = ProcessingTask.objects.create(business_confirmation=confirmation, celery_task_id='stress')
+        # Children must open their own connections rather than share the parent's
+        connections.close_all()
+
+        with multiprocessing.get_context('fork').Pool(self.WRITERS * 2) as pool:
+            results = [
+                pool.apply_async(create_confirmations_through_api, (confirmation.buyer_id, confirmation.material_id, self.WRITES))
+                for _ in range(self.WRITERS)
+            ] + [
+                pool.apply_async(record_pipeline_stages, (processing_task.id, worker, self.WRITES))
+                for worker in range(self.WRITERS)
+            ]
+            errors = [error for result in results for error in result.get(timeout=120)]
+
+        self.assertEqual(errors, [])
+        self.assertEqual(BusinessConfirmation.objects.count(), 1 + self.WRITERS * self.WRITES)
+        # No stage update may be lost to a concurrent read-modify-write
+        processing_task.refresh_from_db()
+        self.assertEqual(len(processing_task.stage_timings), self.WRITERS * self.WRITES)
+
+
+class SuggestionCacheTests(TestCase):
+    def setUp(self):
+        self.suggestions = SuggestionCache(poll_interval=0.01)
+        self.suggestions.clear()
+        reset_provider()
+        self.addCleanup(reset_provider)
+
+    def run_concurrently(self, targets):
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def test_concurrent_misses_compute_once(self):
+        computing, release, calls, results = threading.Event(), threading.Event(), [], []
+
+        def compute():
+            calls.append(1)
+            computing.set()
+            release.wait(5)
+            return {'tc_suggestion': 'AI: hold', 'source': 'ai'}
+
+        def request():
+            results.append(self.suggestions.get_or_compute('key', compute))
+
+        leader = self.run_concurrently([request])
+        computing.wait(5)
+        followers = self.run_concurrently([request] * 4)
+        time.sleep(0.1)
+        release.set()
+        for thread in leader + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result['tc_suggestion'] == 'AI: hold' for result in results))
+        stats = self.suggestions.stats()
+        self.assertEqual((stats['misses'], stats['coalesced']), (5, 4))
+        self.assertEqual(self.suggestions.get('key')['source'], 'ai')
+
+    def test_follower_computes_itself_when_the_leader_fails(self):
+        computing, release, results = threading.Event(), threading.Event(), []
+
+        def failing():
+            computing.set()
+            release.wait(5)
+            raise ProviderError('model down')
+
+        def leader():
+            with self.assertRaises(ProviderError):
+                self.suggestions.get_or_compute('key', failing)
+
+        def follower():
+            results.append(self.suggestions.get_or_compute('key', lambda: {'source': 'ai'}))
+
+        threads = self.run_concurrently([leader])
+        computing.wait(5)
+        threads += self.run_concurrently([follower])
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, [{'source': 'ai'}])
+        self.assertEqual(self.suggestions.stats()['coalesced'], 0)
+
+    def test_key_normalization(self):
+        key = SuggestionCache.make_key('Lead concentrate', '312', '4.5', 'Antwerp')
+        self.assertEqual(SuggestionCache.make_key(' lead CONCENTRATE ', '312.0', '4.50', 'antwerp '), key)
+        self.assertEqual(SuggestionCache.make_key('Lead concentrate', '312.04', '4.504', 'Antwerp'), key)
+        self.assertNotEqual(SuggestionCache.make_key('Lead concentrate', '313', '4.5', 'Antwerp'), key)
+        self.assertNotEqual(SuggestionCache.make_key('Lead concentrate', '312', '4.51', 'Antwerp'), key)
+        self.assertEqual(
+            SuggestionCache.make_key('Zinc', 'abc', None, ''), SuggestionCache.make_key('Zinc', '', '', None)
+        )
+
+    def test_counters(self):
+        self.assertIsNone(self.suggestions.get('key'))
+        self.suggestions.get_or_compute('key', lambda: {'source': 'ai'})
+        self.suggestions.get_or_compute('key', lambda: self.fail('cached value recomputed'))
+        self.suggestions.cache.delete('key')
+        self.suggestions.get_or_compute('key', lambda: {'source': 'ai'})
+
+        stats = self.suggestions.stats()
+        self.assertEqual({name: stats[name] for name in STAT_NAMES},
+                         {'hits': 1, 'misses': 3, 'coalesced': 0, 'refills': 1})
+        self.assertEqual(stats['hit_rate'], 0.25)
+        self.suggestions.reset_stats()
+        self.assertEqual(self.suggestions.stats()['misses'], 0)
+
+    def test_filling_the_bounded_cache_keeps_counters_and_markers(self):
+        caches = {
+            **settings.CACHES,
+            settings.AI_SUGGESTIONS_CACHE_ALIAS: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'tiny-suggestions',
+                'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+            },
+        }
+        with override_settings(CACHES=caches):
+            suggestions = SuggestionCache()
+            suggestions.clear()
+            for number in range(20):
+                suggestions.get_or_compute(f'key-{number}', lambda: {'source': 'ai'})
+            self.assertEqual(suggestions.stats()['misses'], 20)
+            # key-0 was pushed out by the later fills; its marker was not
+            suggestions.get_or_compute('key-0', lambda: {'source': 'ai'})
+            self.assertEqual(suggestions.stats()['refills'], 1)
+
+    def test_fallback_is_not_cached(self):
+        def post(treatment_charge):
+            return self.client.post('/api/ai-suggestions/', {
+                'material': 'Lead', 'treatment_charge': treatment_charge, 'refining_charge': '', 'delivery_point': 'Antwerp',
+            }, content_type='application/json').json()
+
+        with override_settings(AI_SUGGESTIONS_PROVIDER='gemini'), mock.patch.dict(os.environ, {'GEMINI_API_KEY': ''}):
+            self.assertIn('competitive', post('349.6')['tc_suggestion'])
+            self.assertIn('above market average', post('350.4')['tc_suggestion'])
+        self.assertFalse(is_cacheable_suggestion({'source': 'fallback'}))
+
+
+class SuggestionStreamTests(TestCase):
+    def setUp(self):
+        self.addCleanup(reset_provider)
+
+    def stream_events(self):
+        async def collect():
+            return [event async for event in astream_ai_suggestions('Lead', '320', '4.5', 'Antwerp')]
+        with contextlib.redirect_stdout(io.StringIO()):
+            return async_to_sync(collect)()
+
+    def test_abandoned_streams_do_not_open_the_circuit(self):
+        provider = StubProvider(breaker=CircuitBreaker(failure_threshold=2))
+
+        async def read_one_chunk():
+            chunks = provider.astream('prompt')
+            await anext(chunks)
+            await chunks.aclose()
+
+        for _ in range(5):
+            async_to_sync(read_one_chunk)()
+        self.assertEqual((provider.breaker.state, provider.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_missed_deadline_counts_as_a_failure(self):
+        provider = StubProvider(latency=1, breaker=CircuitBreaker(failure_threshold=1))
+        set_provider(provider)
+        with override_settings(AI_SUGGESTIONS_TIMEOUT=0.05):
+            events = self.stream_events()
+        self.assertEqual(events[-1][1]['source'], 'fallback')
+        self.assertEqual(provider.breaker.state, CircuitBreaker.OPEN)
+
+    def test_completed_stream_closes_a_half_open_circuit(self):
+        clock = [0.0]
+        provider = StubProvider(chunk_size=5, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: clock[0]))
+        provider.breaker.record_failure()
+        clock[0] = 10
+        set_provider(provider)
+        events = self.stream_events()
+        self.assertEqual(events[-1][1]['source'], 'ai')
+        self.assertEqual(provider.breaker.state, CircuitBreaker.CLOSED)
+
+    def parse(self, chunks):
+        parser = SuggestionStreamParser()
+        events = [event for chunk in chunks for event in parser.feed(chunk)] + parser.close()
+        sections = {'tc': '', 'rc': ''}
+        for section, text in events:
+            sections[section] += text
+        return parser, sections
+
+    def test_parser_handles_markers_split_across_chunks(self):
+        parser, sections = self.parse(['T', 'C: keep', ' it low\nR', 'C', ': 4.50 is ', 'fine'])
+        self.assertEqual(sections, {'tc': 'keep it low\n', 'rc': '4.50 is fine'})
+        self.assertEqual(parse_ai_response(parser.text, '', 'Lead'), ('AI: keep it low', 'AI: 4.50 is fine'))
+
+    def test_parser_drops_preamble_before_tc(self):
+        parser, sections = self.parse(['Sure! Your TC', ' and RC below.\nT', 'C:', ' $315\nR', 'C: $4.40'])
+        self.assertEqual(sections, {'tc': '$315\n', 'rc': '$4.40'})
+        self.assertEqual(parse_ai_response(parser.text, '', 'Lead'), ('AI: $315', 'AI: $4.40'))
+
+
+class AsyncSuggestionTests(TestCase):
+    def setUp(self):
+        suggestion_cache.clear()
+        self.addCleanup(reset_provider)
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def suggest_concurrently(self, count):
+        async def run():
+            return await asyncio.gather(*[
+                abuild_ai_suggestions('Lead', str(300 + number), '4.5', 'Antwerp') for number in range(count)
+            ])
+        return async_to_sync(run)()
+
+    @override_settings(AI_SUGGESTIONS_TIMEOUT=0.05)
+    def test_missed_deadline_returns_the_fallback(self):
+        provider = StubProvider(latency=1)
+        set_provider(provider)
+        started = time.monotonic()
+        result = async_to_sync(abuild_ai_suggestions)('Lead', '320', '4.5', 'Antwerp')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(result['source'], 'fallback')
+        self.assertEqual(provider.breaker.failures, 1)
+
+    @override_settings(AI_SUGGESTIONS_MAX_CONCURRENCY=2)
+    def test_concurrent_calls_are_limited_per_event_loop(self):
+        provider = StubProvider(latency=0.05)
+        set_provider(provider)
+        in_flight, peak = [0], [0]
+        generate = provider._agenerate
+
+        async def counted(prompt):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            try:
+                return await generate(prompt)
+            finally:
+                in_flight[0] -= 1
+
+        provider._agenerate = counted
+        results = self.suggest_concurrently(6)
+        self.assertEqual([result['source'] for result in results], ['ai'] * 6)
+        self.assertEqual((peak[0], provider.calls), (2, 6))
+
+    @override_settings(AI_SUGGESTIONS_MAX_CONCURRENCY=1, AI_SUGGESTIONS_TIMEOUT=0.3)
+    def test_waiting_for_a_slot_counts_against_the_deadline(self):
+        set_provider(StubProvider(latency=0.2))
+        results = self.suggest_concurrently(2)
+        self.assertEqual([result['source'] for result in results], ['ai', 'fallback'])
+
+    def test_view_answers_and_caches(self):
+        provider = StubProvider()
+        set_provider(provider)
+
+        def post(body):
+            return self.client.post('/api/ai-suggestions/async/', body, content_type='application/json')
+
+        deal = {'material': 'Lead', 'treatment_charge': '320', 'refining_charge': '4.5', 'delivery_point': 'Antwerp'}
+        first, second = post(deal), post(deal)
+        self.assertEqual((first.status_code, first.json()['source']), (200, 'ai'))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(post('not json').status_code, 400)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=lambda: self.now)
+
+    def open_circuit(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_at_the_threshold(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_success()
+        # Only consecutive failures count
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_rejects_while_open(self):
+        self.open_circuit()
+        self.now = 29.9
+        self.assertFalse(self.breaker.allow())
+
+        provider = StubProvider(breaker=self.breaker)
+        with self.assertRaises(CircuitOpenError):
+            provider.complete('prompt')
+        self.assertEqual(provider.calls, 0)
+
+    def test_lets_one_probe_through_when_half_open(self):
+        self.open_circuit()
+        self.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes(self):
+        self.open_circuit()
+        self.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens(self):
+        self.open_circuit()
+        self.now = 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now = 59
+        self.assertFalse(self.breaker.allow())
+        self.now = 60
+        self.assertTrue(self.breaker.allow())
+
+    def test_cancelled_call_frees_the_probe_without_failing(self):
+        self.open_circuit()
+        self.now = 30
+        provider = StubProvider(latency=1, breaker=self.breaker)
+
+        async def cancel_probe():
+            call = asyncio.ensure_future(provider.acomplete('prompt'))
+            await asyncio.sleep(0)
+            call.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await call
+
+        async_to_sync(cancel_probe)()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.failures, 3)
+        self.assertTrue(self.breaker.allow())
+
+    def test_timed_out_call_counts_as_a_failure(self):
+        provider = StubProvider(latency=1, breaker=self.breaker)
+        with self.assertRaises(ProviderError):
+            async_to_sync(provider.acomplete)('prompt', timeout=0.01)
+        self.assertEqual(self.breaker.failures, 1)
+
+
+class BatchSuggestionTests(TestCase):
+    def setUp(self):
+        suggestion_cache.clear()
+        self.provider = StubProvider()
+        set_provider(self.provider)
+        self.addCleanup(reset_provider)
+
+    def deal(self, treatment_charge, material='Lead'):
+        return {'material': material, 'treatment_charge': treatment_charge, 'refining_charge': '4.5', 'delivery_point': 'Antwerp'}
+
+    def test_duplicates_and_cached_deals_skip_the_model(self):
+        results, stats = build_batch_ai_suggestions([self.deal('310'), self.deal('320'), self.deal('310.2')])
+        self.assertEqual(stats, {'requested': 3, 'unique': 2, 'cached': 0, 'model_calls': 1})
+        self.assertEqual(results[0], results[2])
+        self.assertEqual([result['source'] for result in results], ['ai'] * 3)
+
+        results, stats = build_batch_ai_suggestions([self.deal('320'), self.deal('330')])
+        self.assertEqual(stats, {'requested': 2, 'unique': 2, 'cached': 1, 'model_calls': 1})
+        self.assertEqual(self.provider.calls, 2)
+
+    def test_prompts_are_split_by_size_and_item_count(self):
+        deals = [self.deal(str(300 + number)) for number in range(5)]
+        with override_settings(AI_SUGGESTIONS_BATCH_MAX_PER_PROMPT=2):
+            self.assertEqual([len(batch) for batch in pack_batches(deals)], [2, 2, 1])
+
+        overhead = len(build_batch_prompt([]))
+        per_deal = len(build_batch_prompt([deals[0]])) - overhead
+        with override_settings(AI_SUGGESTIONS_BATCH_MAX_PROMPT_CHARS=overhead + per_deal * 3):
+            batches = pack_batches(deals)
+        self.assertEqual([len(batch) for batch in batches], [3, 2])
+        self.assertEqual([deal for batch in batches for deal in batch], deals)
+
+        with override_settings(AI_SUGGESTIONS_BATCH_MAX_PER_PROMPT=2):
+            _, stats = build_batch_ai_suggestions(deals)
+        self.assertEqual(stats['model_calls'], 3)
+
+    def test_skipped_and_malformed_deals_fall_back(self):
+        self.provider.response = 'Here you go: ' + json.dumps([
+            {'deal': 1, 'tc': 'Hold TC', 'rc': 'Hold RC'},
+            {'deal': 2, 'tc': 'No RC given'},
+            {'deal': 9, 'tc': 'Out of range', 'rc': 'Out of range'},
+        ])
+        deals = [self.deal('310'), self.deal('320'), self.deal('360')]
+        results, _ = build_batch_ai_suggestions(deals)
+
+        self.assertEqual(results[0], {'tc_suggestion': 'AI: Hold TC', 'rc_suggestion': 'AI: Hold RC', 'source': 'ai'})
+        self.assertEqual(results[1]['source'], 'fallback')
+        self.assertEqual(results[2]['tc_suggestion'], generate_tc_suggestion('360', 'Lead'))
+        self.assertEqual(parse_batch_response('not json [1, 2', 3), {})
+
+        # Only the model's answer was cached; the fallbacks go back to the model
+        self.provider.response = None
+        results, stats = build_batch_ai_suggestions(deals)
+        self.assertEqual((stats['cached'], stats['model_calls']), (1, 1))
+        self.assertEqual([result['source'] for result in results], ['ai'] * 3)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        first = create_confirmation()
+        self.buyer, other = first.buyer, Buyer.objects.create(name='Glencore')
+        self.confirmations = [first] + [
+            create_confirmation(buyer=self.buyer if number % 2 else other) for number in range(6)
+        ]
+        # Four rows share a timestamp; only the id orders them
+        tied = timezone.now()
+        BusinessConfirmation.objects.filter(id__in=[c.id for c in self.confirmations[1:5]]).update(created_at=tied)
+
+    def expected_ids(self, queryset=None):
+        queryset = queryset if queryset is not None else BusinessConfirmation.objects.all()
+        return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, url):
+        """[page ids] following next links, and the final page's response data"""
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([row['id'] for row in data['results']])
+            last, url = data, data['next']
+        return pages, last
+
+    def test_next_and_previous_links_cover_every_row_once(self):
+        pages, last = self.walk('/api/business-confirmations/?page_size=2')
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([pk for page in pages for pk in page], self.expected_ids())
+
+        backwards, url = [], last['previous']
+        while url:
+            data = self.client.get(url).json()
+            backwards.insert(0, [row['id'] for row in data['results']])
+            url = data['previous']
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_filters_are_kept_across_pages(self):
+        pages, _ = self.walk(f'/api/business-confirmations/?page_size=2&buyer={self.buyer.id}')
+        self.assertEqual(
+            [pk for page in pages for pk in page],
+            self.expected_ids(BusinessConfirmation.objects.filter(buyer=self.buyer)),
+        )
+        self.assertEqual(len(pages), 2)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('garbage', '!!!', base64.urlsafe_b64encode(b'[1, 2]').decode(),
+                       base64.urlsafe_b64encode(b'{"c": "yesterday", "i": 1}').decode()):
+            response = self.client.get('/api/business-confirmations/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+class ReferenceDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_every_reference_table_has_a_serializer(self):
+        serializers = reference_serializers()
+        self.assertEqual(set(serializers), set(REFERENCE_MODELS))
+        for model, serializer in serializers.items():
+            self.assertIs(serializer.Meta.model, model)
+
+    def test_matching_etag_is_answered_without_queries(self):
+        Material.objects.create(name='Lead concentrate')
+        response = self.client.get('/api/reference-data/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['materials'][0]['name'], 'Lead concentrate')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_weak_wildcard_and_listed_validators(self):
+        etag = self.client.get('/api/reference-data/')['ETag']
+        for header in ('*', f'W/{etag}', f'"stale", W/{etag}', f'"stale",{etag}'):
+            with self.subTest(header=header):
+                response = self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual((response['ETag'], response['Cache-Control']), (etag, 'no-cache'))
+        for header in ('"stale"', 'W/"stale"', etag[:-2] + '"'):
+            with self.subTest(header=header):
+                self.assertEqual(self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=header).status_code, 200)
+
+    def test_saving_or_deleting_a_lookup_changes_the_etag_after_commit(self):
+        material = Material.objects.create(name='Lead concentrate')
+        etag = self.client.get('/api/reference-data/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            material.name = 'Zinc concentrate'
+            material.save()
+        # Not invalidated until the transaction commits
+        self.assertEqual(self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['materials'][0]['name'], 'Zinc concentrate')
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            material.delete()
+        response = self.client.get('/api/reference-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['materials'], [])
+
+
+class ConfirmationPipelineTests(TestCase):
+    STAGES = {'validation', 'pricing', 'document', 'notification'}
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        # In-memory Celery results for the chord, locmem mail and no Redis events
+        self.enterContext(isolated_services(media_root, stub_latency=0))
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def run_pipeline(self, **overrides):
+        confirmation = create_confirmation(**overrides)
+        task = ProcessingTask.objects.create(business_confirmation=confirmation, celery_task_id=f'pipeline-{confirmation.id}')
+        process_confirmation_task.apply(args=[task.id], task_id=task.celery_task_id)
+        task.refresh_from_db()
+        return task
+
+    def test_every_stage_is_timed(self):
+        task = self.run_pipeline()
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(set(task.stage_timings), self.STAGES)
+        for stage, timing in task.stage_timings.items():
+            self.assertEqual((timing['status'], timing['attempts']), ('completed', 1), stage)
+            self.assertGreaterEqual(timing['duration_ms'], 0)
+        self.assertEqual(set(task.result), self.STAGES)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_invalid_confirmation_fails_without_retrying(self):
+        task = self.run_pipeline(quantity=0)
+        self.assertEqual(task.status, 'failed')
+        self.assertTrue(task.error.startswith('validation: Quantity must be positive'))
+        self.assertEqual(set(task.stage_timings), {'validation'})
+        self.assertEqual(
+            (task.stage_timings['validation']['status'], task.stage_timings['validation']['attempts']), ('failed', 1)
+        )
+        self.assertEqual(mail.outbox, [])
+
+    def test_retryable_error_is_retried_until_exhausted(self):
+        statuses = []
+
+        def record(processing_task_id, stage, info, result=None):
+            if stage == 'pricing':
+                statuses.append((info['status'], info.get('attempts')))
+            record_stage(processing_task_id, stage, info, result)
+
+        with mock.patch('backend.confirmation.tasks.record_stage', side_effect=record), \
+                mock.patch('backend.confirmation.tasks.compute_pricing', side_effect=OperationalError('database is locked')):
+            task = self.run_pipeline()
+
+        retries = compute_pricing_stage.max_retries
+        self.assertEqual(
+            [status for status, _ in statuses if status != 'running'], ['retrying'] * retries + ['failed']
+        )
+        self.assertEqual(task.stage_timings['pricing']['attempts'], retries + 1)
+        self.assertEqual(task.status, 'failed')
+        self.assertEqual(task.error, 'pricing: database is locked')
+        self.assertNotIn('notification', task.stage_timings)
+
+    def test_notification_is_not_sent_again_on_retry(self):
+        calls = []
+
+        def flaky_update(processing_task_id, **fields):
+            calls.append(fields.get('status'))
+            if fields.get('status') == 'completed' and calls.count('completed') == 1:
+                raise OperationalError('database is locked')
+            update_processing_task(processing_task_id, **fields)
+
+        with mock.patch('backend.confirmation.tasks.update_processing_task', side_effect=flaky_update):
+            task = self.run_pipeline()
+
+        self.assertEqual(calls.count('completed'), 2)
+        self.assertEqual(task.status, 'completed')
+        self.assertEqual(task.stage_timings['notification']['attempts'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class BulkCreateTests(TestCase):
+    def setUp(self):
+        self.template = create_confirmation()
+
+    def item(self, **overrides):
+        item = {field.name: getattr(self.template, field.attname) for field in CONFIRMATION_FOREIGN_KEYS}
+        return {**item, 'quantity': '100.00', **overrides}
+
+    def post(self, items, process=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.client.post(
+                '/api/business-confirmations/bulk/', {'items': items, 'process': process}, content_type='application/json'
+            )
+
+    def test_any_invalid_row_creates_nothing(self):
+        response = self.post([self.item(), self.item(quantity='lots'), self.item(buyer=9999)])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(errors[0], {})
+        self.assertEqual(list(errors[1]), ['quantity'])
+        self.assertEqual(errors[2], {'buyer': ['Invalid pk "9999" - object does not exist.']})
+        self.assertEqual(BusinessConfirmation.objects.count(), 1)
+
+    def test_references_are_checked_with_one_query_per_related_model(self):
+        items = [self.item() for _ in range(300)]
+        with self.assertNumQueries(len(CONFIRMATION_FOREIGN_KEYS)):
+            rows, errors = validate_confirmation_rows(items)
+        self.assertFalse(any(errors))
+
+        response = self.post(items[:5])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 5)
+        self.assertEqual(BusinessConfirmation.objects.count(), 6)
+
+    @mock.patch('backend.confirmation.bulk.group')
+    def test_processing_is_dispatched_as_one_group_after_commit(self, group):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.post([self.item() for _ in range(3)], process=True)
+            group.return_value.apply_async.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+        group.assert_called_once()
+        group.return_value.apply_async.assert_called_once_with()
+
+        signatures = list(group.call_args.args[0])
+        tasks = ProcessingTask.objects.order_by('id')
+        self.assertEqual([signature.args for signature in signatures], [(task.id,) for task in tasks])
+        self.assertEqual([signature.options['task_id'] for signature in signatures], [task.celery_task_id for task in tasks])
+        self.assertEqual(
+            [row['celery_task_id'] for row in response.json()['processing_tasks']], [task.celery_task_id for task in tasks]
+        )
+
+
+class BatchTaskStatusTests(TestCase):
+    def setUp(self):
+        first, second = create_confirmation(), create_confirmation()
+        self.first = first
+        ProcessingTask.objects.create(business_confirmation=first, celery_task_id='done', status='completed')
+        ProcessingTask.objects.create(business_confirmation=first, celery_task_id='lagging', status='processing')
+        ProcessingTask.objects.create(business_confirmation=second, celery_task_id='queued', status='pending')
+
+    @mock.patch('backend.confirmation.task_status.celery_states')
+    def test_rows_are_read_once_and_lagging_ones_taken_from_celery(self, celery_states):
+        celery_states.return_value = {'lagging': 'SUCCESS', 'queued': 'PENDING', 'orphan': 'FAILURE'}
+        with self.assertNumQueries(1):
+            tasks, missing = batch_task_statuses(task_ids=['done', 'lagging', 'queued', 'orphan', 'ghost'])
+
+        # Only rows that may be behind, and ids without a row, are asked about
+        self.assertEqual(sorted(celery_states.call_args.args[0]), ['ghost', 'lagging', 'orphan', 'queued'])
+        statuses = {task['celery_task_id']: (task['status'], task['source']) for task in tasks}
+        self.assertEqual(statuses, {
+            'done': ('completed', 'database'),
+            'lagging': ('completed', 'celery'),
+            'queued': ('pending', 'database'),
+            'orphan': ('failed', 'celery'),
+        })
+        self.assertEqual(missing, ['ghost'])
+
+    @mock.patch('backend.confirmation.task_status.celery_states', return_value={})
+    def test_endpoint_by_confirmation(self, celery_states):
+        response = self.client.get('/api/task-status/batch/', {'business_confirmation': self.first.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({task['celery_task_id'] for task in response.json()['tasks']}, {'done', 'lagging'})
+        self.assertEqual(response.json()['missing'], [])
+
+        response = self.client.post('/api/task-status/batch/', {'task_ids': ['ghost']}, content_type='application/json')
+        self.assertEqual(response.json(), {'tasks': [], 'missing': ['ghost']})
+
+
+class TaskStatusEventsTests(TestCase):
+    """task-events/ server-sent events, with Redis pub/sub replaced by a list of published updates"""
+
+    def setUp(self):
+        self.task = ProcessingTask.objects.create(
+            business_confirmation=create_confirmation(), celery_task_id='streamed', status='processing'
+        )
+
+    def stream(self, updates=(), subscribe_error=None, task_id='streamed'):
+        """The response and the (event, data) pairs it sent"""
+        updates = list(updates)
+
+        @contextlib.asynccontextmanager
+        async def subscribe(celery_task_id):
+            if subscribe_error is not None:
+                raise subscribe_error
+            yield 'pubsub'
+
+        async def next_status(pubsub, timeout):
+            return updates.pop(0) if updates else None
+
+        async def collect():
+            response = await self.async_client.get(f'/api/task-events/{task_id}/')
+            if not response.streaming:
+                return response, ''
+            return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        patches = mock.patch.multiple(task_events, is_enabled=lambda: True, subscribe=subscribe, next_status=next_status)
+        with patches, contextlib.redirect_stdout(io.StringIO()):
+            response, body = async_to_sync(collect)()
+        events = []
+        for block in body.split('\n\n'):
+            if block.startswith('event: '):
+                event, data = block.split('\n')
+                events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return response, body, events
+
+    def test_streams_updates_until_a_terminal_status(self):
+        response, body, events = self.stream([
+            None,
+            {'celery_task_id': 'streamed', 'status': 'completed'},
+            {'celery_task_id': 'streamed', 'status': 'failed'},
+        ])
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([(event, data['status']) for event, data in events], [
+            ('status', 'processing'), ('status', 'completed'),
+        ])
+        self.assertIn(': keep-alive\n\n', body)
+
+    def test_finished_task_sends_only_its_status(self):
+        ProcessingTask.objects.update(status='failed')
+        _, _, events = self.stream([{'celery_task_id': 'streamed', 'status': 'completed'}])
+        self.assertEqual([(event, data['status']) for event, data in events], [('status', 'failed')])
+
+    @override_settings(TASK_EVENTS_STREAM_TIMEOUT=0)
+    def test_times_out_while_the_task_is_running(self):
+        _, _, events = self.stream()
+        self.assertEqual([event for event, _ in events], ['status', 'timeout'])
+
+    @override_settings(TASK_EVENTS_REDIS_URL='memory://')
+    def test_without_redis_sends_the_status_then_unavailable(self):
+        async def collect():
+            response = await self.async_client.get('/api/task-events/streamed/')
+            return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        body = async_to_sync(collect)()
+        self.assertEqual(re.findall(r'event: (\w+)', body), ['status', 'unavailable'])
+
+    def test_unreachable_redis_sends_unavailable(self):
+        _, _, events = self.stream(subscribe_error=RedisError('connection refused'))
+        self.assertEqual(events, [('unavailable', {})])
+
+    def test_unknown_task(self):
+        response, _, _ = self.stream(task_id='ghost')
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch('backend.confirmation.tasks.publish_task_status')
+    def test_stage_updates_are_published_after_commit(self, publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stage(self.task.id, 'validate', {'status': 'completed'})
+            update_processing_task(self.task.id, status='completed')
+            publish.assert_not_called()
+        self.assertEqual(publish.call_count, 2)
+        published = publish.call_args.args[0]
+        self.assertEqual((published.status, published.stage_timings), ('completed', {'validate': {'status': 'completed'}}))
+
+
+class ConfirmationDocumentTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root, CONFIRMATION_DOCUMENT_DIR=os.path.join(media_root, 'confirmations'),
+        ))
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        cache.clear()
+        self.confirmation = create_confirmation()
+        self.url = f'/api/business-confirmations/{self.confirmation.id}/document/txt/'
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        if response.streaming:
+            # The test client closes the response once its content is consumed
+            response.content_bytes = b''.join(response.streaming_content)
+        return response
+
+    @mock.patch('backend.confirmation.views.render_confirmation_document_task.delay')
+    def test_render_is_queued_once_then_served_with_etag(self, delay):
+        for _ in range(3):
+            response = self.download()
+            self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with(self.confirmation.id, 'txt')
+        digest = response.json()['content_hash']
+
+        result = render_confirmation_document_task.apply(args=[self.confirmation.id, 'txt']).get()
+        self.assertEqual((result['content_hash'], result['rendered']), (digest, True))
+
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertIn(f'business-confirmation-{self.confirmation.id}.txt', response['Content-Disposition'])
+        self.assertIn(b'Trafigura', response.content_bytes)
+
+        for header in (f'"{digest}"', f'W/"{digest}"', f'"stale", "{digest}"'):
+            response = self.download(HTTP_IF_NONE_MATCH=header)
+            self.assertEqual((response.status_code, response['ETag']), (304, f'"{digest}"'))
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_every_format_has_the_same_fields_unescaped(self):
+        confirmation = create_confirmation(
+            buyer=Buyer.objects.create(name="O'Brien & Sons <Ltd>"), payment_clause='Pay 90% on B/L & invoice',
+        )
+        texts = {
+            'txt': render_txt(confirmation).decode(),
+            'docx': docx_text(render_docx(confirmation)),
+            'pdf': pdf_text(render_pdf(confirmation)),
+        }
+        for document_format, text in texts.items():
+            self.assertIn("O'Brien & Sons <Ltd>", text, document_format)
+            self.assertIn('Pay 90% on B/L & invoice', text, document_format)
+            for heading, rows, _ in document_sections(confirmation):
+                for label, value in rows:
+                    self.assertIn(label, text, document_format)
+                    self.assertIn(value, text, f'{document_format}: {label}')
+        self.assertIn('Pb: -\n', texts['txt'])
+        self.assertNotIn('&amp;', texts['txt'])
+
+    @mock.patch('backend.confirmation.views.render_confirmation_document_task.delay')
+    def test_only_edited_confirmations_are_rendered_again(self, delay):
+        # Hashed as loaded from the database, as the view and the render task see it
+        self.confirmation.refresh_from_db()
+        first = render_document(self.confirmation, 'txt')
+        self.confirmation.save()
+        again = render_document(BusinessConfirmation.objects.get(id=self.confirmation.id), 'txt')
+        self.assertEqual(again, {**first, 'rendered': False})
+        self.assertEqual(self.download().status_code, 200)
+        delay.assert_not_called()
+
+        self.confirmation.treatment_charge = Decimal('315.00')
+        self.confirmation.save()
+        response = self.download(HTTP_IF_NONE_MATCH=f'"{first["content_hash"]}"')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.json()['content_hash'], first['content_hash'])
+        delay.assert_called_once_with(self.confirmation.id, 'txt')
@@ -4,9 +4,20 @@ from . import views
 urlpatterns = [
     path('materials/', views.MaterialListView.as_view(), name='material-list'),
     path('buyers/', views.BuyerListView.as_view(), name='buyer-list'),
-    path('business-confirmations/', views.BusinessConfirmationCreateView.as_view(), name='business-confirmation-create'),
+    path('business-confirmations/', views.BusinessConfirmationListCreateView.as_view(), name='business-confirmation-list'),
+    path('business-confirmations/<int:pk>/', views.BusinessConfirmationDetailView.as_view(), name='business-confirmation-detail'),
+    path('business-confirmations/<int:pk>/document/<str:document_format>/', views.business_confirmation_document, name='business-confirmation-document'),
+    path('business-confirmations/<int:pk>/valuation/', views.business_confirmation_valuation, name='business-confirmation-valuation'),
+    path('business-confirmations/bulk/', views.bulk_create_business_confirmations, name='business-confirmation-bulk-create'),
+    path('valuation/book/', views.book_valuation, name='book-valuation'),
+    path('prices/upload/', views.upload_prices, name='price-upload'),
+    path('prices/<str:symbol>/', views.price_as_of, name='price-as-of'),
+    path('prices/<str:symbol>/average/', views.price_average, name='price-average'),
+    path('analytics/confirmations/', views.confirmation_analytics, name='confirmation-analytics'),
     path('trigger-processing/', views.TriggerProcessingTaskView.as_view(), name='trigger-processing'),
+    path('task-status/batch/', views.batch_task_status, name='task-status-batch'),
     path('task-status/<str:task_id>/', views.ProcessingTaskStatusView.as_view(), name='task-status'),
+    path('task-events/<str:task_id>/', views.task_status_events, name='task-events'),
     path('delivery-terms/', views.DeliveryTermListView.as_view(), name='delivery-term-list'),
     path('delivery-points/', views.DeliveryPointListView.as_view(), name='delivery-point-list'),
     path('packaging/', views.PackagingListView.as_view(), name='packaging-list'),
@@ -15,6 +26,11 @@ urlpatterns = [
     path('currencies/', views.CurrencyListView.as_view(), name='currency-list'),
     path('triggering-events/', views.TriggeringEventListView.as_view(), name='triggering-event-list'),
     path('surveyors/', views.SurveyorListView.as_view(), name='surveyor-list'),
+    path('reference-data/', views.ReferenceDataView.as_view(), name='reference-data'),
     path('ai-suggestions/', views.ai_suggestions, name='ai-suggestions'),
+    path('ai-suggestions/async/', views.ai_suggestions_async, name='ai-suggestions-async'),
+    path('ai-suggestions/batch/', views.ai_suggestions_batch, name='ai-suggestions-batch'),
+    path('ai-suggestions/stream/', views.ai_suggestions_stream, name='ai-suggestions-stream'),
     path('parse-assay-file/', views.parse_assay_file, name='parse-assay-file'),
+    path('assay-jobs/<str:job_id>/', views.AssayParseJobStatusView.as_view(), name='assay-job-status'),
 ] 
\ No newline at end of file
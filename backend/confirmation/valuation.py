@@ -0,0 +1,160 @@
+import math
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .lazy import LazyModule
+from .models import BusinessConfirmation
+from .prices import price_store
+
+np = LazyModule('numpy')
+
+GRAMS_PER_TROY_OUNCE = 31.1034768
+
+# Payable terms per element: the smaller of `payable` x grade and grade minus
+# `min_deduction` is paid for (percentage points for Pb/Zn/Cu, g/t for Ag)
+PAYABLE_TERMS = {
+    'pb': {'payable': 0.95, 'min_deduction': 3.0},
+    'zn': {'payable': 0.85, 'min_deduction': 8.0},
+    'cu': {'payable': 0.965, 'min_deduction': 1.0},
+    'ag': {'payable': 0.95, 'min_deduction': 50.0},
+}
+BASE_METALS = ('pb', 'zn', 'cu')
+ELEMENTS = (*BASE_METALS, 'ag')
+
+# Columns read per confirmation, in the order of the loaded arrays
+VALUATION_COLUMNS = (
+    'quantity', 'assay_pb', 'assay_zn', 'assay_cu', 'assay_ag',
+    'treatment_charge', 'refining_charge', 'prepayment_percentage',
+)
+# Monetary outputs, summed for the book totals
+VALUE_FIELDS = (
+    *(f'{element}_value' for element in ELEMENTS),
+    'gross_value', 'treatment_charge_total', 'refining_charge_total', 'provisional_value', 'prepayment_amount',
+)
+
+
+def parse_prices(data):
+    """Metal prices from price_pb/price_zn/price_cu (USD/t) and price_ag (USD/toz).
+
+    Elements without one take the stored price as of `price_date` when given
+    and a price exists (see prices.py), else VALUATION_DEFAULT_PRICES.
+    Raises ValueError for a bad value.
+    """
+    prices = dict(settings.VALUATION_DEFAULT_PRICES)
+    price_date = data.get('price_date')
+    if price_date:
+        try:
+            day = parse_date(str(price_date))
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError('price_date must be YYYY-MM-DD')
+        for element in ELEMENTS:
+            stored = price_store.as_of(element.upper(), day)
+            if stored is not None:
+                prices[element] = stored[1]
+    for element in ELEMENTS:
+        value = data.get(f'price_{element}')
+        if value in (None, ''):
+            continue
+        try:
+            price = float(value)
+        except (TypeError, ValueError):
+            price = -1
+        if not (math.isfinite(price) and price >= 0):
+            raise ValueError(f'price_{element} must be a non-negative number')
+        prices[element] = price
+    return prices
+
+
+def open_confirmations(on=None):
+    """Confirmations whose shipment period has not ended on the given day (today)"""
+    on = on or timezone.localdate()
+    return BusinessConfirmation.objects.filter(Q(shipment_period_to__isnull=True) | Q(shipment_period_to__gte=on))
+
+
+def load_book(queryset):
+    """(ids, {column: float64 array}) for the queryset in one query; NULL becomes NaN.
+
+    Columns are cast to float in SQL and the cursor rows go straight into one
+    2-D array, skipping Django's per-row Decimal conversion.
+    """
+    values = queryset.order_by('id').values_list('id', *(Cast(column, FloatField()) for column in VALUATION_COLUMNS))
+    sql, params = values.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        table = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, len(VALUATION_COLUMNS) + 1)
+    return table[:, 0].astype(np.int64), {
+        column: table[:, position] for position, column in enumerate(VALUATION_COLUMNS, start=1)
+    }
+
+
+def value_arrays(arrays, prices):
+    """Valuation of every lot at once; arrays as returned by load_book.
+
+    Missing assays, charges and quantities count as zero. Base-metal payables
+    are in tonnes of metal and silver in troy ounces; TC is per dmt and RC
+    per payable ounce of silver.
+    """
+    quantity = np.nan_to_num(arrays['quantity'])
+    result = {}
+    for element in ELEMENTS:
+        terms = PAYABLE_TERMS[element]
+        grade = np.nan_to_num(arrays[f'assay_{element}'])
+        payable_grade = np.clip(np.minimum(grade * terms['payable'], grade - terms['min_deduction']), 0, None)
+        if element in BASE_METALS:
+            payable = quantity * payable_grade / 100
+        else:
+            payable = quantity * payable_grade / GRAMS_PER_TROY_OUNCE
+        result[f'{element}_payable'] = payable
+        result[f'{element}_value'] = payable * prices[element]
+
+    result['gross_value'] = sum(result[f'{element}_value'] for element in ELEMENTS)
+    result['treatment_charge_total'] = quantity * np.nan_to_num(arrays['treatment_charge'])
+    result['refining_charge_total'] = result['ag_payable'] * np.nan_to_num(arrays['refining_charge'])
+    result['provisional_value'] = (
+        result['gross_value'] - result['treatment_charge_total'] - result['refining_charge_total']
+    )
+    result['prepayment_amount'] = result['provisional_value'] * np.nan_to_num(arrays['prepayment_percentage']) / 100
+    return result
+
+
+def lot_rows(ids, result):
+    """One dict per lot, values rounded to cents (payable metal to 4 places)"""
+    rounded = {
+        name: np.round(values, 4 if name.endswith('_payable') else 2).tolist()
+        for name, values in result.items()
+    }
+    return [
+        {'id': lot_id, **{name: values[index] for name, values in rounded.items()}}
+        for index, lot_id in enumerate(ids.tolist())
+    ]
+
+
+def value_confirmation(confirmation, prices):
+    """Valuation of a single confirmation, same formulas as the book"""
+    arrays = {
+        column: np.array([np.nan if getattr(confirmation, column) is None else float(getattr(confirmation, column))])
+        for column in VALUATION_COLUMNS
+    }
+    [row] = lot_rows(np.array([confirmation.id]), value_arrays(arrays, prices))
+    return row
+
+
+def value_book(queryset, prices, include_lots=False):
+    """Revalue every confirmation in the queryset: totals, and per-lot rows if asked"""
+    ids, arrays = load_book(queryset)
+    result = value_arrays(arrays, prices)
+    valuation = {
+        'prices': prices,
+        'lot_count': len(ids),
+        'totals': {name: round(float(result[name].sum()), 2) for name in VALUE_FIELDS},
+    }
+    if include_lots:
+        valuation['lots'] = lot_rows(ids, result)
+    return valuation
@@ -1,85 +1,365 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
 from rest_framework import generics
-from .models import Material, Buyer, BusinessConfirmation, ProcessingTask, DeliveryTerm, DeliveryPoint, Packaging, TransportMode, PaymentMethod, Currency, TriggeringEvent, Surveyor
+from .models import Material, Buyer, BusinessConfirmation, ProcessingTask, DeliveryTerm, DeliveryPoint, Packaging, TransportMode, PaymentMethod, Currency, TriggeringEvent, Surveyor, AssayParseJob
 from .serializers import (
     MaterialSerializer, BuyerSerializer, BusinessConfirmationSerializer, ProcessingTaskSerializer,
     DeliveryTermSerializer, DeliveryPointSerializer, PackagingSerializer, TransportModeSerializer,
-    PaymentMethodSerializer, CurrencySerializer, TriggeringEventSerializer, SurveyorSerializer
+    PaymentMethodSerializer, CurrencySerializer, TriggeringEventSerializer, SurveyorSerializer,
+    AssayParseJobSerializer, parse_expand
+)
+from .bulk import bulk_create_confirmations, validate_confirmation_rows
+from .fast_read import ValuesListMixin
+from .documents import DOCUMENT_FORMATS, content_hash, document_path, render_lock_key
+from .pagination import KeysetPagination
+from .pipeline import CONFIRMATION_RELATED
+from .prices import ingest_price_file, price_store
+from .task_status import batch_task_statuses
+from .valuation import open_confirmations, parse_prices, value_book, value_confirmation
+from .analytics import GROUPINGS, summarize
+from .assay import ASSAY_EXTENSIONS, parse_assay, parse_cache_key
+from . import metrics, task_events
+from .reference_data import get_reference_data
+from .storage import assay_storage, content_hash as stored_content_hash
+from .tasks import parse_assay_file_task, process_confirmation_task, render_confirmation_document_task
+from .suggestion_cache import suggestion_cache
+from .suggestions import (
+    build_ai_suggestions, abuild_ai_suggestions, astream_ai_suggestions, build_batch_ai_suggestions,
+    is_cacheable_suggestion, BATCH_FIELDS
 )
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from celery import shared_task
-import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 import os
-import requests
-import google.generativeai as genai
-from django.http import JsonResponse
+import time
+import uuid
+from datetime import timedelta
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
-from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view
-from dotenv import load_dotenv
-load_dotenv()
-
-# Cache for AI suggestions to prevent too frequent API calls
-ai_suggestions_cache = {}
-CACHE_DURATION = 30  # seconds (increased since manual requests)
-MIN_REQUEST_INTERVAL = 0  # no rate limiting for manual requests
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+from asgiref.sync import sync_to_async
+import json
+from redis import RedisError
 
 # Create your views here.
 
-class MaterialListView(generics.ListAPIView):
+class MaterialListView(ValuesListMixin, generics.ListAPIView):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
 
-class BuyerListView(generics.ListAPIView):
+class BuyerListView(ValuesListMixin, generics.ListAPIView):
     queryset = Buyer.objects.all()
     serializer_class = BuyerSerializer
 
-class BusinessConfirmationCreateView(generics.CreateAPIView):
-    queryset = BusinessConfirmation.objects.all()
+class BusinessConfirmationListCreateView(ValuesListMixin, generics.ListCreateAPIView):
+    """Create a confirmation, or list them newest first with keyset pagination.
+
+    List filters: buyer, material, delivery_point and currency ids, and
+    shipment_from / shipment_to (YYYY-MM-DD), which keep confirmations whose
+    shipment period overlaps that range. ?expand=buyer,material,... inlines
+    those relations (see BusinessConfirmationSerializer).
+    """
     serializer_class = BusinessConfirmationSerializer
+    pagination_class = KeysetPagination
+    filter_fields = ('buyer', 'material', 'delivery_point', 'currency')
+
+    def get_queryset(self):
+        queryset = BusinessConfirmation.objects.all()
+        if self.request.method != 'GET':
+            return queryset
+
+        params = self.request.query_params
+        errors = {}
+        for field in self.filter_fields:
+            value = params.get(field)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{f'{field}_id': int(value)})
+            except ValueError:
+                errors[field] = ['A valid integer is required.']
+        # Periods overlap when each one starts before the other ends
+        for param, lookup in (('shipment_from', 'shipment_period_to__gte'), ('shipment_to', 'shipment_period_from__lte')):
+            value = params.get(param)
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                errors[param] = ['Date has wrong format. Use YYYY-MM-DD.']
+            else:
+                queryset = queryset.filter(**{lookup: day})
+        if errors:
+            raise ValidationError(errors)
+        return queryset.select_related(*parse_expand(self.request))
+
+class BusinessConfirmationDetailView(generics.RetrieveAPIView):
+    serializer_class = BusinessConfirmationSerializer
+
+    def get_queryset(self):
+        return BusinessConfirmation.objects.select_related(*parse_expand(self.request))
+
+@api_view(['POST'])
+def bulk_create_business_confirmations(request):
+    """Create many business confirmations at once, all or nothing.
+
+    Body: {"items": [<confirmation>, ...], "process": false}. Foreign keys are
+    ids. If any row is invalid nothing is created and `errors` holds one
+    entry per item ({} for valid rows). With "process": true, processing of
+    every created confirmation is queued as one Celery group.
+    """
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.CONFIRMATION_BULK_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.CONFIRMATION_BULK_MAX_ITEMS} items per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    rows, errors = validate_confirmation_rows(items)
+    if any(errors):
+        return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    confirmations, processing_tasks = bulk_create_confirmations(rows, process=bool(request.data.get('process')))
+    print(f"Bulk created {len(confirmations)} business confirmations")
+    return Response({
+        'created': len(confirmations),
+        'ids': [confirmation.id for confirmation in confirmations],
+        'processing_tasks': [
+            {'business_confirmation': task.business_confirmation_id, 'celery_task_id': task.celery_task_id}
+            for task in processing_tasks
+        ],
+    }, status=status.HTTP_201_CREATED)
+
+@require_GET
+def business_confirmation_document(request, pk, document_format):
+    """Download a confirmation as pdf, docx or txt.
+
+    Documents are stored once per content hash of the confirmation, which is
+    also the ETag. If none exists for the current content, rendering is queued
+    in a Celery worker and 202 is returned; retry after Retry-After seconds.
+    """
+    if document_format not in DOCUMENT_FORMATS:
+        return JsonResponse({'error': f"Format must be one of {', '.join(DOCUMENT_FORMATS)}"}, status=404)
+    confirmation = get_object_or_404(BusinessConfirmation.objects.select_related(*CONFIRMATION_RELATED), pk=pk)
+    digest = content_hash(confirmation, document_format)
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+        return response
+
+    path = document_path(digest, document_format)
+    if os.path.exists(path):
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=f'business-confirmation-{pk}.{document_format}',
+            content_type=DOCUMENT_FORMATS[document_format],
+        )
+        response['ETag'] = etag
+        return response
+
+    # One queued render per content hash, however many clients are polling
+    if cache.add(render_lock_key(digest), True, timeout=settings.CONFIRMATION_DOCUMENT_RENDER_TIMEOUT):
+        render_confirmation_document_task.delay(pk, document_format)
+    response = JsonResponse({'status': 'rendering', 'content_hash': digest}, status=status.HTTP_202_ACCEPTED)
+    response['Retry-After'] = '2'
+    return response
+
+@api_view(['GET'])
+def confirmation_analytics(request):
+    """Tonnage, average TC/RC and assays from the pre-aggregated summary table.
+
+    ?group_by=material,buyer,month (any subset, in that order; empty for
+    book totals); filters material and buyer ids, month_from / month_to (YYYY-MM).
+    """
+    params = request.query_params
+    group_by = [name.strip() for name in params.get('group_by', ','.join(GROUPINGS)).split(',') if name.strip()]
+    unknown = [name for name in group_by if name not in GROUPINGS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown group_by {', '.join(unknown)}; choose from {', '.join(GROUPINGS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    filters = {}
+    errors = {}
+    for field in ('material', 'buyer'):
+        value = params.get(field)
+        if not value:
+            continue
+        try:
+            filters[f'{field}_id'] = int(value)
+        except ValueError:
+            errors[field] = ['A valid integer is required.']
+    for param, lookup in (('month_from', 'shipment_month__gte'), ('month_to', 'shipment_month__lte')):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            month = parse_date(f'{value}-01')
+        except ValueError:
+            month = None
+        if month is None:
+            errors[param] = ['Month has wrong format. Use YYYY-MM.']
+        else:
+            filters[lookup] = month
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    group_by = [name for name in GROUPINGS if name in group_by]
+    return Response({'group_by': group_by, 'results': summarize(group_by, filters)})
+
+@api_view(['GET'])
+def business_confirmation_valuation(request, pk):
+    """Payable metal, TC/RC deductions and provisional value of one confirmation.
 
-# Celery task definition
-@shared_task(bind=True)
-def process_confirmation_task(self, processing_task_id):
+    Prices default to VALUATION_DEFAULT_PRICES; override with ?price_pb= etc.
+    or take the stored ones with ?price_date=YYYY-MM-DD.
+    """
+    confirmation = get_object_or_404(BusinessConfirmation, pk=pk)
     try:
-        print(f"Starting processing task for ID: {processing_task_id}")
-        time.sleep(15)  # Simulate processing for 15 seconds
-        from .models import ProcessingTask
-        task = ProcessingTask.objects.get(id=processing_task_id)
-        task.status = 'completed'
-        task.completed_at = timezone.now()
-        task.save()
-        print(f"Task {processing_task_id} completed successfully")
-        return 'completed'
-    except Exception as e:
-        print(f"Task {processing_task_id} failed: {e}")
-        return 'failed'
+        prices = parse_prices(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'prices': prices, **value_confirmation(confirmation, prices)})
+
+@api_view(['GET', 'POST'])
+def book_valuation(request):
+    """Revalue the whole book at the given prices in one vectorized pass.
+
+    Parameters (query or JSON body): price_pb/price_zn/price_cu/price_ag or
+    price_date (stored prices as of that day), open=true to keep confirmations whose shipment period has not ended,
+    lots=true to include every lot alongside the totals.
+    """
+    data = request.data if request.method == 'POST' else request.query_params
+    try:
+        prices = parse_prices(data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def flag(name):
+        return str(data.get(name, '')).lower() in ('1', 'true', 'yes')
+
+    queryset = open_confirmations() if flag('open') else BusinessConfirmation.objects.all()
+    return Response(value_book(queryset, prices, include_lots=flag('lots')))
+
+def parse_day(value, param):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({param: ['Date has wrong format. Use YYYY-MM-DD.']})
+    return day
+
+@api_view(['POST'])
+def upload_prices(request):
+    """Ingest a daily price/FX CSV (long date,symbol,value or wide date,PB,ZN,...)"""
+    if 'file' not in request.FILES:
+        return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        counts = ingest_price_file(request.FILES['file'])
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'error': f'Error reading prices: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'ingested': sum(counts.values()), 'symbols': counts}, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+def price_as_of(request, symbol):
+    """The last price of a symbol on or before ?date= (default today)"""
+    value = request.query_params.get('date')
+    day = parse_day(value, 'date') if value else timezone.localdate()
+    found = price_store.as_of(symbol, day)
+    if found is None:
+        return Response({'error': f'No {symbol.upper()} price on or before {day}'}, status=status.HTTP_404_NOT_FOUND)
+    price_date, price = found
+    return Response({'symbol': symbol.upper(), 'as_of': day, 'date': price_date, 'value': price})
+
+@api_view(['GET'])
+def price_average(request, symbol):
+    """Mean of a symbol's prices dated ?from= to ?to= inclusive (an averaging / quotational period)"""
+    params = request.query_params
+    if not params.get('from') or not params.get('to'):
+        return Response({'error': 'from and to are required'}, status=status.HTTP_400_BAD_REQUEST)
+    start, end = parse_day(params['from'], 'from'), parse_day(params['to'], 'to')
+    if start > end:
+        return Response({'error': 'from must not be after to'}, status=status.HTTP_400_BAD_REQUEST)
+    average, observations = price_store.average(symbol, start, end)
+    return Response({
+        'symbol': symbol.upper(), 'from': start, 'to': end, 'average': average, 'observations': observations,
+    })
 
 class TriggerProcessingTaskView(APIView):
+    """Queue processing for a confirmation, or return the task already running for it.
+
+    The task id is generated up front so the row is written once, and the
+    Celery message is only sent after that row commits. A partial unique
+    constraint allows one pending/processing task per confirmation, so
+    concurrent triggers cannot queue duplicate work. An active task with no
+    progress for PROCESSING_TASK_STALE_AFTER seconds is failed and replaced.
+    """
+
     def post(self, request, *args, **kwargs):
         try:
             confirmation_id = request.data.get('business_confirmation_id')
             if not confirmation_id:
                 return Response({'error': 'business_confirmation_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-            
+            if not BusinessConfirmation.objects.filter(id=confirmation_id).exists():
+                return Response({'error': 'Business confirmation not found'}, status=status.HTTP_404_NOT_FOUND)
+
             print(f"Creating processing task for confirmation ID: {confirmation_id}")
-            
-            processing_task = ProcessingTask.objects.create(
-                business_confirmation_id=confirmation_id,
-                status='pending',
-                celery_task_id='pending',
+
+            active_tasks = ProcessingTask.objects.filter(
+                business_confirmation_id=confirmation_id, status__in=ProcessingTask.ACTIVE_STATUSES
             )
-            
-            # Trigger the Celery task
-            celery_task = process_confirmation_task.apply_async(args=[processing_task.id])
-            processing_task.celery_task_id = celery_task.id
-            processing_task.save()
-            
-            print(f"Task created with ID: {celery_task.id}")
-            
+            existing = active_tasks.first()
+            stale_before = timezone.now() - timedelta(seconds=settings.PROCESSING_TASK_STALE_AFTER)
+            if existing is not None and existing.updated_at < stale_before:
+                # Its worker died or the message was lost; free the slot. The
+                # updated_at filter leaves it alone if it reported progress meanwhile.
+                print(f"Task {existing.celery_task_id} made no progress since {existing.updated_at}; replacing it")
+                now = timezone.now()
+                active_tasks.filter(id=existing.id, updated_at__lt=stale_before).update(
+                    status='failed',
+                    error=f'No progress for {settings.PROCESSING_TASK_STALE_AFTER} seconds; superseded by a new task',
+                    completed_at=now,
+                    updated_at=now,
+                )
+                existing = active_tasks.first()
+            if existing is None:
+                try:
+                    with transaction.atomic():
+                        processing_task = ProcessingTask.objects.create(
+                            business_confirmation_id=confirmation_id,
+                            status='pending',
+                            celery_task_id=str(uuid.uuid4()),
+                        )
+                        transaction.on_commit(lambda: process_confirmation_task.apply_async(
+                            args=[processing_task.id], task_id=processing_task.celery_task_id
+                        ))
+                except IntegrityError:
+                    # A concurrent trigger inserted the active task first
+                    existing = active_tasks.first()
+                    if existing is None:
+                        raise
+
+            if existing is not None:
+                print(f"Confirmation {confirmation_id} already has active task {existing.celery_task_id}")
+                return Response(ProcessingTaskSerializer(existing).data, status=status.HTTP_200_OK)
+
+            print(f"Task created with ID: {processing_task.celery_task_id}")
+
             serializer = ProcessingTaskSerializer(processing_task)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -92,38 +372,135 @@ class ProcessingTaskStatusView(generics.RetrieveAPIView):
     lookup_field = 'celery_task_id'
     lookup_url_kwarg = 'task_id'
 
-class DeliveryTermListView(generics.ListAPIView):
+@api_view(['GET', 'POST'])
+def batch_task_status(request):
+    """Statuses of many processing tasks in one request.
+
+    POST {"task_ids": [...]} or GET ?task_ids=a,b; either may instead (or
+    also) give business_confirmation=<id> for all of that confirmation's tasks.
+    Ids with no row and no result in Celery are listed under `missing`.
+    """
+    data = request.data if request.method == 'POST' else request.query_params
+    task_ids = data.get('task_ids')
+    confirmation_id = data.get('business_confirmation')
+    if isinstance(task_ids, str):
+        task_ids = [task_id.strip() for task_id in task_ids.split(',') if task_id.strip()]
+    if task_ids is None and not confirmation_id:
+        return Response({'error': 'task_ids or business_confirmation is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if task_ids is not None:
+        if not isinstance(task_ids, list) or not all(isinstance(task_id, str) for task_id in task_ids):
+            return Response({'error': 'task_ids must be a list of strings'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(task_ids) > settings.TASK_STATUS_BATCH_MAX_IDS:
+            return Response(
+                {'error': f'At most {settings.TASK_STATUS_BATCH_MAX_IDS} task ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        task_ids = list(dict.fromkeys(task_ids))
+    if confirmation_id:
+        try:
+            confirmation_id = int(confirmation_id)
+        except (TypeError, ValueError):
+            return Response({'error': 'business_confirmation must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    tasks, missing = batch_task_statuses(task_ids=task_ids, confirmation_id=confirmation_id or None)
+    return Response({'tasks': tasks, 'missing': missing})
+
+@require_GET
+async def task_status_events(request, task_id):
+    """Push a processing task's status as server-sent events.
+
+    Sends the current state as a `status` event, then one per transition the
+    worker publishes, and ends after `completed`/`failed` or a `timeout` event
+    after TASK_EVENTS_STREAM_TIMEOUT seconds. Sends `unavailable` when Redis
+    is not configured or reachable so the client can poll task-status/ instead.
+    """
+    if not await ProcessingTask.objects.filter(celery_task_id=task_id).aexists():
+        return JsonResponse({'error': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    async def snapshot():
+        task = await ProcessingTask.objects.aget(celery_task_id=task_id)
+        return ProcessingTaskSerializer(task).data
+
+    async def events():
+        if not task_events.is_enabled():
+            yield format_sse('status', await snapshot())
+            yield format_sse('unavailable', {})
+            return
+        try:
+            async with task_events.subscribe(task_id) as pubsub:
+                # Read the row only once subscribed so no transition falls in between
+                current = await snapshot()
+                yield format_sse('status', current)
+                deadline = time.monotonic() + settings.TASK_EVENTS_STREAM_TIMEOUT
+                while current['status'] not in task_events.TERMINAL_STATUSES:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        yield format_sse('timeout', {})
+                        return
+                    update = await task_events.next_status(pubsub, min(settings.TASK_EVENTS_HEARTBEAT, remaining))
+                    if update is None:
+                        # Comment line; keeps proxies from closing an idle stream
+                        yield ': keep-alive\n\n'
+                        continue
+                    current = update
+                    yield format_sse('status', current)
+        except RedisError as e:
+            print(f"Task events unavailable for {task_id}: {e}")
+            yield format_sse('unavailable', {})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class DeliveryTermListView(ValuesListMixin, generics.ListAPIView):
     queryset = DeliveryTerm.objects.all()
     serializer_class = DeliveryTermSerializer
 
-class DeliveryPointListView(generics.ListAPIView):
+class DeliveryPointListView(ValuesListMixin, generics.ListAPIView):
     queryset = DeliveryPoint.objects.all()
     serializer_class = DeliveryPointSerializer
 
-class PackagingListView(generics.ListAPIView):
+class PackagingListView(ValuesListMixin, generics.ListAPIView):
     queryset = Packaging.objects.all()
     serializer_class = PackagingSerializer
 
-class TransportModeListView(generics.ListAPIView):
+class TransportModeListView(ValuesListMixin, generics.ListAPIView):
     queryset = TransportMode.objects.all()
     serializer_class = TransportModeSerializer
 
-class PaymentMethodListView(generics.ListAPIView):
+class PaymentMethodListView(ValuesListMixin, generics.ListAPIView):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
 
-class CurrencyListView(generics.ListAPIView):
+class CurrencyListView(ValuesListMixin, generics.ListAPIView):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
 
-class TriggeringEventListView(generics.ListAPIView):
+class TriggeringEventListView(ValuesListMixin, generics.ListAPIView):
     queryset = TriggeringEvent.objects.all()
     serializer_class = TriggeringEventSerializer
 
-class SurveyorListView(generics.ListAPIView):
+class SurveyorListView(ValuesListMixin, generics.ListAPIView):
     queryset = Surveyor.objects.all()
     serializer_class = SurveyorSerializer
 
+class ReferenceDataView(APIView):
+    """All lookup tables in one pre-serialized payload, versioned with an ETag"""
+
+    def get(self, request, *args, **kwargs):
+        version, content = get_reference_data()
+        etag = f'"{version}"'
+
+        # If-None-Match handling per RFC 9110: weak comparison, lists and "*"
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        # Let browsers keep the payload but revalidate it on every mount
+        response['Cache-Control'] = 'no-cache'
+        return response
+
 @api_view(['POST'])
 def ai_suggestions(request):
     """Generate AI suggestions for pricing based on form data"""
@@ -134,89 +511,12 @@ def ai_suggestions(request):
         refining_charge = data.get('refining_charge', '')
         delivery_point = data.get('delivery_point', '')
         
-        # Create cache key based on input data
-        cache_key = f"{material}_{treatment_charge}_{refining_charge}_{delivery_point}"
-        current_time = time.time()
-        
-        # Clear cache if values are changing (to avoid partial value issues)
-        if treatment_charge or refining_charge:
-            # Clear old cache entries that might interfere
-            keys_to_remove = [k for k in ai_suggestions_cache.keys() if k != cache_key]
-            for key in keys_to_remove:
-                del ai_suggestions_cache[key]
-        
-        # Check if we have cached result and it's recent enough
-        if cache_key in ai_suggestions_cache:
-            cached_data, cached_time = ai_suggestions_cache[cache_key]
-            if current_time - cached_time < CACHE_DURATION:
-                print(f"Returning cached AI suggestion for key: {cache_key}")
-                return Response(cached_data)
-        
-        # Get Gemini API key from environment
-        gemini_api_key = os.getenv('GEMINI_API_KEY')
-        
-        # Smart analysis without AI (fallback)
-        tc_suggestion = generate_tc_suggestion(treatment_charge, material)
-        rc_suggestion = generate_rc_suggestion(refining_charge, material)
-        
-        if gemini_api_key:
-            try:
-                # Configure Gemini API
-                genai.configure(api_key=gemini_api_key)
-                
-                # Create model
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                
-                # Prepare prompt
-                prompt = f"""Analyze this business confirmation data and provide specific pricing suggestions:
-                - Material: {material}
-                - Treatment Charge: {treatment_charge or 'Not set'}
-                - Refining Charge: {refining_charge or 'Not set'}
-                - Delivery Point: {delivery_point}
-                
-                Provide specific market insights and pricing recommendations. 
-                Format your response exactly as:
-                TC: [specific suggestion with reasoning]
-                RC: [specific suggestion with reasoning]
-                
-                Keep each suggestion under 50 words."""
-                
-                print(f"Sending prompt to Gemini: {prompt}")  # Debug log
-                
-                # Generate content using Gemini
-                response = model.generate_content(prompt)
-                
-                print(f"Gemini API response: {response.text}")  # Debug log
-                
-                if response.text:
-                    ai_response = response.text.strip()
-                    # Parse AI response for TC and RC suggestions
-                    if 'TC:' in ai_response and 'RC:' in ai_response:
-                        tc_part = ai_response.split('TC:')[1].split('RC:')[0].strip()
-                        rc_part = ai_response.split('RC:')[1].strip()
-                        tc_suggestion = f"AI: {tc_part}"
-                        rc_suggestion = f"AI: {rc_part}"
-                    else:
-                        # If AI response doesn't have proper format, use AI response for TC and fallback for RC
-                        tc_suggestion = f"AI: {ai_response}"
-                        rc_suggestion = generate_rc_suggestion(refining_charge, material)
-                else:
-                    print("Gemini API returned empty response")  # Debug log
-                    
-            except Exception as e:
-                print(f"AI API call failed: {e}")
-                # Use fallback suggestions (already set above)
-        else:
-            print("No Gemini API key found, using fallback")  # Debug log
-        
-        # Cache the result
-        result = {
-            'tc_suggestion': tc_suggestion,
-            'rc_suggestion': rc_suggestion,
-            'source': 'ai' if gemini_api_key else 'fallback'
-        }
-        ai_suggestions_cache[cache_key] = (result, current_time)
-        
+        cache_key = suggestion_cache.make_key(material, treatment_charge, refining_charge, delivery_point)
+        result = suggestion_cache.get_or_compute(
+            cache_key,
+            lambda: build_ai_suggestions(material, treatment_charge, refining_charge, delivery_point),
+            cacheable=is_cacheable_suggestion,
+        )
         return Response(result)
         
     except Exception as e:
@@ -227,114 +527,190 @@ def ai_suggestions(request):
             'source': 'fallback'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def generate_tc_suggestion(tc_value, material):
-    """Generate smart TC suggestions based on input value"""
-    try:
-        tc = float(tc_value) if tc_value else 0
-    except:
-        tc = 0
-    
-    if tc == 0:
-        return "Industry average TC for Lead: $310-$325/dmt"
-    elif tc > 350:
-        return f"⚠️ Your TC (${tc}) is above market average. Consider $320-$330 for better competitiveness."
-    elif tc < 280:
-        return f"💡 Your TC (${tc}) is below market. Consider $310-$320 for fair pricing."
-    elif 300 <= tc <= 330:
-        return f"✅ Your TC (${tc}) is within market range. Good pricing!"
-    else:
-        return f"📊 Your TC (${tc}) is competitive. Market range: $310-$325/dmt"
+@csrf_exempt
+@require_POST
+async def ai_suggestions_async(request):
+    """Non-blocking variant of ai_suggestions for ASGI workers.
 
-def generate_rc_suggestion(rc_value, material):
-    """Generate smart RC suggestions based on input value"""
+    AI_SUGGESTIONS_MAX_CONCURRENCY only caps concurrent model calls when
+    served by ASGI; under WSGI each request runs on its own event loop.
+    """
     try:
-        rc = float(rc_value) if rc_value else 0
-    except:
-        rc = 0
-    
-    if rc == 0:
-        return "Market average RC for Ag: $4.20-$4.50/toz"
-    elif rc > 5.00:
-        return f"⚠️ Your RC (${rc}) is high. Suggest $4.50 for market competitiveness."
-    elif rc < 3.50:
-        return f"💡 Your RC (${rc}) is low. Consider $4.20 for fair pricing."
-    elif 4.00 <= rc <= 4.60:
-        return f"✅ Your RC (${rc}) is within market range. Good pricing!"
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be JSON'}, status=status.HTTP_400_BAD_REQUEST)
+
+    material = data.get('material', '')
+    treatment_charge = data.get('treatment_charge', '')
+    refining_charge = data.get('refining_charge', '')
+    delivery_point = data.get('delivery_point', '')
+
+    cache_key = suggestion_cache.make_key(material, treatment_charge, refining_charge, delivery_point)
+    cached = await sync_to_async(suggestion_cache.get)(cache_key)
+    if cached is not None:
+        return JsonResponse(cached)
+
+    result = await abuild_ai_suggestions(material, treatment_charge, refining_charge, delivery_point)
+    if is_cacheable_suggestion(result):
+        await sync_to_async(suggestion_cache.set)(cache_key, result)
+    return JsonResponse(result)
+
+@api_view(['POST'])
+def ai_suggestions_batch(request):
+    """AI suggestions for a list of deals in as few model calls as possible"""
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.AI_SUGGESTIONS_BATCH_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.AI_SUGGESTIONS_BATCH_MAX_ITEMS} items per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(item, dict) for item in items):
+        return Response({'error': 'Each item must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+
+    deals = [{field: item.get(field) or '' for field in BATCH_FIELDS} for item in items]
+    results, stats = build_batch_ai_suggestions(deals)
+    return Response({'results': results, 'stats': stats})
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def ai_suggestions_stream(request):
+    """Stream AI suggestions as server-sent events.
+
+    Emits `tc` and `rc` events with {"delta": ...} text as the model produces
+    it and a final `done` event with the complete ai_suggestions payload.
+    Accepts a JSON body (POST, for fetch) or query parameters (GET, for EventSource).
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON'}, status=status.HTTP_400_BAD_REQUEST)
     else:
-        return f"📊 Your RC (${rc}) is competitive. Market range: $4.20-$4.50/toz"
+        data = request.GET
+
+    material = data.get('material', '')
+    treatment_charge = data.get('treatment_charge', '')
+    refining_charge = data.get('refining_charge', '')
+    delivery_point = data.get('delivery_point', '')
+    cache_key = suggestion_cache.make_key(material, treatment_charge, refining_charge, delivery_point)
+
+    async def events():
+        cached = await sync_to_async(suggestion_cache.get)(cache_key)
+        if cached is not None:
+            yield format_sse('done', cached)
+            return
+        async for event, payload in astream_ai_suggestions(material, treatment_charge, refining_charge, delivery_point):
+            if event == 'done':
+                if is_cacheable_suggestion(payload):
+                    await sync_to_async(suggestion_cache.set)(cache_key, payload)
+                yield format_sse('done', payload)
+            else:
+                yield format_sse(event, {'delta': payload})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @api_view(['POST'])
 def parse_assay_file(request):
-    """Parse Excel file and extract assay data"""
+    """Parse an assay file and return per-row and lot-averaged assay data"""
     if 'file' not in request.FILES:
         return Response({'error': 'No file uploaded'}, status=400)
     
     file = request.FILES['file']
     
     # Check file extension
-    if not file.name.lower().endswith(('.xlsx', '.xls', '.csv')):
+    if not file.name.lower().endswith(ASSAY_EXTENSIONS):
         return Response({'error': 'Unsupported file format. Please upload .xlsx, .xls, or .csv file'}, status=400)
     
+    # Stored once per content hash; a file parsed before is answered from the cache
+    stored_name = assay_storage.save(f'{settings.ASSAY_UPLOAD_DIR}/{file.name}', file)
+    cache_key = parse_cache_key(stored_name, settings.ASSAY_MAX_RETURNED_ROWS)
+    assay_data = cache.get(cache_key)
+    if assay_data is not None:
+        print(f"Assay parse cache hit for {file.name} ({stored_name})")
+        return assay_parse_response(file, stored_name, assay_data, cached=True)
+    
+    if file.size > settings.ASSAY_ASYNC_THRESHOLD_BYTES:
+        return queue_assay_parse_job(file, stored_name)
+    
+    started = time.perf_counter()
     try:
-        import pandas as pd
-        
-        # Read the file based on extension
-        if file.name.lower().endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-        
-        # Try to find assay columns with different possible names
-        assay_data = {}
-        
-        # Lead (Pb) - try different column names
-        pb_columns = ['Pb', 'Lead', 'PB', 'pb', 'lead']
-        for col in pb_columns:
-            if col in df.columns:
-                assay_data['assay_pb'] = float(df[col].iloc[0]) if len(df) > 0 else 0
-                break
-        else:
-            assay_data['assay_pb'] = 0
-        
-        # Zinc (Zn) - try different column names
-        zn_columns = ['Zn', 'Zinc', 'ZN', 'zn', 'zinc']
-        for col in zn_columns:
-            if col in df.columns:
-                assay_data['assay_zn'] = float(df[col].iloc[0]) if len(df) > 0 else 0
-                break
-        else:
-            assay_data['assay_zn'] = 0
-        
-        # Copper (Cu) - try different column names
-        cu_columns = ['Cu', 'Copper', 'CU', 'cu', 'copper']
-        for col in cu_columns:
-            if col in df.columns:
-                assay_data['assay_cu'] = float(df[col].iloc[0]) if len(df) > 0 else 0
-                break
-        else:
-            assay_data['assay_cu'] = 0
-        
-        # Silver (Ag) - try different column names
-        ag_columns = ['Ag', 'Silver', 'AG', 'ag', 'silver']
-        for col in ag_columns:
-            if col in df.columns:
-                assay_data['assay_ag'] = float(df[col].iloc[0]) if len(df) > 0 else 0
-                break
-        else:
-            assay_data['assay_ag'] = 0
-        
-        # Add file info
-        assay_data['file_name'] = file.name
-        assay_data['file_size'] = file.size
-        
-        return Response({
-            'success': True,
-            'data': assay_data,
-            'message': f'Successfully parsed {file.name}'
-        })
-        
+        file.seek(0)
+        assay_data = parse_assay(file, file.name, max_rows=settings.ASSAY_MAX_RETURNED_ROWS)
     except Exception as e:
         return Response({
             'error': f'Error parsing file: {str(e)}',
             'message': 'Please ensure your file contains columns with element names (Pb, Zn, Cu, Ag)'
         }, status=400)
+    
+    elapsed = time.perf_counter() - started
+    metrics.assay_parse_duration.observe(elapsed, format=os.path.splitext(file.name)[1].lower())
+    metrics.record_timing('parse', elapsed)
+    
+    cache.set(cache_key, assay_data, timeout=settings.ASSAY_PARSE_CACHE_TIMEOUT)
+    return assay_parse_response(file, stored_name, assay_data, cached=False)
+
+def assay_parse_response(file, stored_name, assay_data, cached):
+    # Add file info
+    assay_data = {
+        **assay_data,
+        'file_name': file.name,
+        'file_size': file.size,
+        'content_hash': stored_content_hash(stored_name),
+    }
+    
+    return Response({
+        'success': True,
+        'data': assay_data,
+        'cached': cached,
+        'message': f'Successfully parsed {file.name}'
+    })
+
+def queue_assay_parse_job(file, stored_name):
+    """Parse a large stored upload in a Celery worker, joining a live job already parsing the same content"""
+    file_path = assay_storage.path(stored_name)
+    # A job whose worker died stops reporting progress; don't attach new uploads to it
+    live_since = timezone.now() - timedelta(seconds=settings.ASSAY_JOB_STALE_AFTER)
+    job = AssayParseJob.objects.filter(
+        file_path=file_path, status__in=('pending', 'processing'), updated_at__gte=live_since
+    ).order_by('-id').first()
+    if job is None:
+        job = AssayParseJob.objects.create(
+            celery_task_id=str(uuid.uuid4()),
+            file_name=file.name,
+            file_size=file.size,
+            file_path=file_path,
+        )
+        transaction.on_commit(
+            lambda: parse_assay_file_task.apply_async(args=[job.id], task_id=job.celery_task_id)
+        )
+        print(f"Queued assay parse job {job.celery_task_id} for {file.name}")
+    
+    return Response({
+        'success': True,
+        'job_id': job.celery_task_id,
+        'status': job.status,
+        'message': f'{file.name} is being parsed in the background'
+    }, status=status.HTTP_202_ACCEPTED)
+
+class AssayParseJobStatusView(generics.RetrieveAPIView):
+    queryset = AssayParseJob.objects.all()
+    serializer_class = AssayParseJobSerializer
+    lookup_field = 'celery_task_id'
+    lookup_url_kwarg = 'job_id'
+
+@require_GET
+def prometheus_metrics(request):
+    """Prometheus text format: this process's request/DB/model-call metrics plus
+    the Celery task and suggestion cache counters shared by every process"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
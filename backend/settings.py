@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 import os
 load_dotenv()
 
@@ -34,7 +35,13 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# Daphne only replaces runserver with its ASGI server; loading the app installs
+# the Twisted reactor, so it is only added where ASGI_RUNSERVER=true (the
+# development web server). WSGI and Celery workers leave it out and start faster.
+ASGI_RUNSERVER = os.getenv('ASGI_RUNSERVER', 'false').lower() in ('1', 'true', 'yes')
+
 INSTALLED_APPS = [
+    *(['daphne'] if ASGI_RUNSERVER else []),
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -47,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.confirmation.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -75,17 +83,158 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default) or postgres. Web and Celery processes write
+# concurrently: SQLite runs in WAL mode so readers never block the writer, and
+# opens transactions with BEGIN IMMEDIATE so competing writers queue for up to
+# SQLITE_BUSY_TIMEOUT seconds instead of failing with "database is locked".
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    # DB_POOL=true uses psycopg's connection pool; otherwise connections are
+    # kept open for DB_CONN_MAX_AGE seconds. Django allows only one of the two.
+    DB_POOL = os.getenv('DB_POOL', 'false').lower() in ('1', 'true', 'yes')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'open_mineral'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 20))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'timeout': SQLITE_BUSY_TIMEOUT,
+                'transaction_mode': 'IMMEDIATE',
+                # Applied to every new connection
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+            # A file rather than in-memory database, so tests run with WAL too
+            # and can be shared by several processes.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_ENGINE: {DB_ENGINE}")
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Redis is shared by every web and Celery process; without REDIS_CACHE_URL
+# (tests, local runs) each process falls back to its own bounded locmem cache.
+
+AI_SUGGESTIONS_CACHE_ALIAS = 'suggestions'
+# Single-flight locks, "was cached before" markers and hit/miss counters live
+# apart from the bounded entries so filling the cache never evicts them
+AI_SUGGESTIONS_META_CACHE_ALIAS = 'suggestions-meta'
+AI_SUGGESTIONS_CACHE_TIMEOUT = int(os.getenv('AI_SUGGESTIONS_CACHE_TIMEOUT', 300))
+AI_SUGGESTIONS_CACHE_MAX_ENTRIES = int(os.getenv('AI_SUGGESTIONS_CACHE_MAX_ENTRIES', 1000))
+AI_SUGGESTIONS_LOCK_TIMEOUT = 30
+# Hard deadline (seconds) and in-flight limit for async model calls. The limit
+# is per event loop, so it caps each ASGI worker process; under WSGI every
+# request runs on its own loop and only the worker/thread count bounds calls.
+AI_SUGGESTIONS_TIMEOUT = float(os.getenv('AI_SUGGESTIONS_TIMEOUT', 8))
+AI_SUGGESTIONS_MAX_CONCURRENCY = int(os.getenv('AI_SUGGESTIONS_MAX_CONCURRENCY', 8))
+# Batch suggestions: request size limit and how many deals are packed per prompt
+AI_SUGGESTIONS_BATCH_MAX_ITEMS = 500
+AI_SUGGESTIONS_BATCH_MAX_PER_PROMPT = int(os.getenv('AI_SUGGESTIONS_BATCH_MAX_PER_PROMPT', 50))
+AI_SUGGESTIONS_BATCH_MAX_PROMPT_CHARS = int(os.getenv('AI_SUGGESTIONS_BATCH_MAX_PROMPT_CHARS', 30000))
+
+# Suggestion provider: 'gemini' (needs GEMINI_API_KEY) or 'stub' for tests/benchmarks
+AI_SUGGESTIONS_PROVIDER = os.getenv('AI_SUGGESTIONS_PROVIDER', 'gemini')
+AI_STUB_LATENCY = float(os.getenv('AI_STUB_LATENCY', 0))
+AI_STUB_FAILURE_RATE = float(os.getenv('AI_STUB_FAILURE_RATE', 0))
+# Circuit breaker: open after N consecutive failures, probe again after M seconds
+AI_PROVIDER_FAILURE_THRESHOLD = int(os.getenv('AI_PROVIDER_FAILURE_THRESHOLD', 5))
+AI_PROVIDER_RESET_TIMEOUT = float(os.getenv('AI_PROVIDER_RESET_TIMEOUT', 30))
+# Decimal places TC/RC are rounded to when building suggestion cache keys
+AI_SUGGESTIONS_TC_PLACES = 0
+AI_SUGGESTIONS_RC_PLACES = 2
+
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        },
+        # Size is bounded by Redis itself (maxmemory + volatile-lru)
+        AI_SUGGESTIONS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'suggestions',
+            'TIMEOUT': AI_SUGGESTIONS_CACHE_TIMEOUT,
+        },
+        # Counters have no TTL, so volatile-lru never evicts them
+        AI_SUGGESTIONS_META_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'suggestions-meta',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        AI_SUGGESTIONS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'suggestions',
+            'TIMEOUT': AI_SUGGESTIONS_CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': AI_SUGGESTIONS_CACHE_MAX_ENTRIES},
+        },
+        # Seen markers outlive entries tenfold, so there can be ten times as many
+        AI_SUGGESTIONS_META_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'suggestions-meta',
+            'OPTIONS': {'MAX_ENTRIES': AI_SUGGESTIONS_CACHE_MAX_ENTRIES * 10 + 100},
+        },
     }
-}
+
+
+# Assay uploads: per-row assays returned alongside the lot averages
+ASSAY_MAX_RETURNED_ROWS = int(os.getenv('ASSAY_MAX_RETURNED_ROWS', 1000))
+# Larger uploads are parsed by a Celery worker
+ASSAY_ASYNC_THRESHOLD_BYTES = int(os.getenv('ASSAY_ASYNC_THRESHOLD_BYTES', 2 * 1024 * 1024))
+ASSAY_PROGRESS_EVERY = 1000
+# A background parse is failed after this many seconds, and a job with no
+# progress for ASSAY_JOB_STALE_AFTER seconds is not joined by new uploads
+ASSAY_PARSE_TIME_LIMIT = int(os.getenv('ASSAY_PARSE_TIME_LIMIT', 600))
+ASSAY_JOB_STALE_AFTER = int(os.getenv('ASSAY_JOB_STALE_AFTER', 120))
+# A parse redelivered this many times (its worker keeps dying, e.g. OOM) is failed
+ASSAY_PARSE_MAX_ATTEMPTS = int(os.getenv('ASSAY_PARSE_MAX_ATTEMPTS', 3))
+# Uploads are stored once per SHA-256 under MEDIA_ROOT/ASSAY_UPLOAD_DIR and their
+# parse result is cached against the hash, so re-uploads skip parsing
+ASSAY_UPLOAD_DIR = 'assay_files'
+ASSAY_PARSE_CACHE_TIMEOUT = int(os.getenv('ASSAY_PARSE_CACHE_TIMEOUT', 30 * 24 * 3600))
 
 
 # Password validation
@@ -124,15 +273,64 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (assay certificates); shared with the Celery worker via the /app volume
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+# Rendered confirmation documents, stored once per content hash
+CONFIRMATION_DOCUMENT_DIR = MEDIA_ROOT / 'confirmations'
+CONFIRMATION_DOCUMENT_RENDER_TIMEOUT = 120
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://redis:6379/0'
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Pipeline stages are acknowledged after they finish (acks_late); hand each
+# prefork child one task at a time so a slow stage does not hold others back.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# A pending/processing task with no progress for this many seconds is treated
+# as lost (dead worker, dropped message) and no longer blocks a new trigger
+PROCESSING_TASK_STALE_AFTER = int(os.getenv('PROCESSING_TASK_STALE_AFTER', 600))
+
+# Bulk confirmation create: rows accepted per request
+CONFIRMATION_BULK_MAX_ITEMS = int(os.getenv('CONFIRMATION_BULK_MAX_ITEMS', 5000))
+
+# Valuation (valuation.py): metal prices used unless a request gives price_<element>;
+# Pb/Zn/Cu in USD per tonne of payable metal, Ag in USD per troy ounce
+VALUATION_DEFAULT_PRICES = {
+    'pb': float(os.getenv('VALUATION_PRICE_PB', 2000)),
+    'zn': float(os.getenv('VALUATION_PRICE_ZN', 2700)),
+    'cu': float(os.getenv('VALUATION_PRICE_CU', 9500)),
+    'ag': float(os.getenv('VALUATION_PRICE_AG', 30)),
+}
+
+# Metrics (/metrics, Prometheus text format). Only these client addresses may
+# scrape it; METRICS_SERVER_TIMING adds a Server-Timing header to every response.
+METRICS_ALLOWED_IPS = [
+    address.strip() for address in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if address.strip()
+]
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+# Price/FX series (prices.py) are cached per process; seconds between checks for a newer ingest
+PRICE_SERIES_REFRESH_INTERVAL = int(os.getenv('PRICE_SERIES_REFRESH_INTERVAL', 5))
+
+# Batch task status lookups: ids accepted per request
+TASK_STATUS_BATCH_MAX_IDS = 1000
+
+# Task status push (task-events/): workers publish status changes on Redis pub/sub
+TASK_EVENTS_REDIS_URL = os.getenv('TASK_EVENTS_REDIS_URL', CELERY_BROKER_URL)
+TASK_EVENTS_STREAM_TIMEOUT = int(os.getenv('TASK_EVENTS_STREAM_TIMEOUT', 120))
+TASK_EVENTS_HEARTBEAT = 15
+
+# Confirmation processing notifications
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+CONFIRMATION_NOTIFICATION_RECIPIENTS = [
+    address.strip() for address in os.getenv('CONFIRMATION_NOTIFICATION_RECIPIENTS', '').split(',') if address.strip()
+]
 CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
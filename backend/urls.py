@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from backend.confirmation.views import prometheus_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('backend.confirmation.urls')),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
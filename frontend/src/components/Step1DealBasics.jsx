@@ -9,12 +9,12 @@ export default function Step1DealBasics({ onProceed, formData, setFormData }) {
   const [errors, setErrors] = useState({});
 
   useEffect(() => {
-    fetch(`${API_BASE}/buyers/`)
+    fetch(`${API_BASE}/reference-data/`)
       .then(res => res.json())
-      .then(data => setBuyers(data));
-    fetch(`${API_BASE}/materials/`)
-      .then(res => res.json())
-      .then(data => setMaterials(data));
+      .then(data => {
+        setBuyers(data.buyers);
+        setMaterials(data.materials);
+      });
   }, []);
 
   const handleChange = e => {
@@ -2,6 +2,8 @@ import React, { useEffect, useState } from 'react';
 import './Step2CommercialTerms.css';
 
 const API_BASE = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
+// Stop polling a background assay parse after this long (the server gives up after 10 minutes)
+const ASSAY_JOB_MAX_WAIT_MS = 11 * 60 * 1000;
 
 export default function Step2CommercialTerms({ onProceed, onBack, formData, setFormData }) {
   const [deliveryTerms, setDeliveryTerms] = useState([]);
@@ -18,10 +20,12 @@ export default function Step2CommercialTerms({ onProceed, onBack, formData, setF
 
   useEffect(() => {
     // Load dropdown data
-    fetch(`${API_BASE}/delivery-terms/`).then(res => res.json()).then(setDeliveryTerms);
-    fetch(`${API_BASE}/delivery-points/`).then(res => res.json()).then(setDeliveryPoints);
-    fetch(`${API_BASE}/packaging/`).then(res => res.json()).then(setPackaging);
-    fetch(`${API_BASE}/transport-modes/`).then(res => res.json()).then(setTransportModes);
+    fetch(`${API_BASE}/reference-data/`).then(res => res.json()).then(data => {
+      setDeliveryTerms(data.delivery_terms);
+      setDeliveryPoints(data.delivery_points);
+      setPackaging(data.packaging);
+      setTransportModes(data.transport_modes);
+    });
   }, []);
 
   // Generate AI suggestions using backend API
@@ -32,7 +36,7 @@ export default function Step2CommercialTerms({ onProceed, onBack, formData, setF
     }
 
     try {
-      const response = await fetch(`${API_BASE}/ai-suggestions/`, {
+      const response = await fetch(`${API_BASE}/ai-suggestions/stream/`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -45,12 +49,36 @@ export default function Step2CommercialTerms({ onProceed, onBack, formData, setF
         })
       });
 
-      const data = await response.json();
-      if (data.tc_suggestion || data.rc_suggestion) {
-        setAiSuggestions({
-          tc: data.tc_suggestion,
-          rc: data.rc_suggestion
-        });
+      // Server-sent events: show TC/RC text as it streams in, then the final answer
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const partial = { tc: '', rc: '' };
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        for (const message of messages) {
+          const event = message.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || '{}');
+
+          if (event === 'tc' || event === 'rc') {
+            partial[event] += data.delta;
+            setAiSuggestions({
+              tc: partial.tc ? `AI: ${partial.tc}` : null,
+              rc: partial.rc ? `AI: ${partial.rc}` : null
+            });
+          } else if (event === 'done' && (data.tc_suggestion || data.rc_suggestion)) {
+            setAiSuggestions({
+              tc: data.tc_suggestion,
+              rc: data.rc_suggestion
+            });
+          }
+        }
       }
     } catch (error) {
       console.log('AI suggestion generation failed:', error);
@@ -92,6 +120,18 @@ export default function Step2CommercialTerms({ onProceed, onBack, formData, setF
     generateAISuggestions();
   };
 
+  const waitForAssayJob = async (jobId) => {
+    const deadline = Date.now() + ASSAY_JOB_MAX_WAIT_MS;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const response = await fetch(`${API_BASE}/assay-jobs/${jobId}/`);
+      const job = await response.json();
+      if (job.status === 'completed') return job.result;
+      if (job.status === 'failed') throw new Error(job.error);
+    }
+    throw new Error(`Assay job ${jobId} did not finish in time`);
+  };
+
   const handleFileUpload = async (e) => {
     const file = e.target.files[0];
     if (file) {
@@ -110,18 +150,20 @@ export default function Step2CommercialTerms({ onProceed, onBack, formData, setF
         
         if (response.ok) {
           const result = await response.json();
-          if (result.success && result.data) {
+          // Large files are parsed in the background; wait for the job to finish
+          const data = result.job_id ? await waitForAssayJob(result.job_id) : result.data;
+          if (result.success && data) {
             // Update form data with parsed assay values
             setFormData(prev => ({
               ...prev,
-              assay_pb: result.data.assay_pb || 0,
-              assay_zn: result.data.assay_zn || 0,
-              assay_cu: result.data.assay_cu || 0,
-              assay_ag: result.data.assay_ag || 0,
+              assay_pb: data.assay_pb || 0,
+              assay_zn: data.assay_zn || 0,
+              assay_cu: data.assay_cu || 0,
+              assay_ag: data.assay_ag || 0,
             }));
             
             // Show success message
-            alert(`✅ Successfully parsed ${file.name}\n\nExtracted values:\nPb: ${result.data.assay_pb}%\nZn: ${result.data.assay_zn}%\nCu: ${result.data.assay_cu}%\nAg: ${result.data.assay_ag} g/t`);
+            alert(`✅ Successfully parsed ${file.name}\n\nExtracted values:\nPb: ${data.assay_pb}%\nZn: ${data.assay_zn}%\nCu: ${data.assay_cu}%\nAg: ${data.assay_ag} g/t`);
           }
         } else {
           const errorData = await response.json();
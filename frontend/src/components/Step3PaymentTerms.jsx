@@ -12,10 +12,12 @@ export default function Step3PaymentTerms({ onProceed, onBack, formData, setForm
 
   useEffect(() => {
     // Load dropdown data
-    fetch(`${API_BASE}/payment-methods/`).then(res => res.json()).then(setPaymentMethods);
-    fetch(`${API_BASE}/currencies/`).then(res => res.json()).then(setCurrencies);
-    fetch(`${API_BASE}/triggering-events/`).then(res => res.json()).then(setTriggeringEvents);
-    fetch(`${API_BASE}/surveyors/`).then(res => res.json()).then(setSurveyors);
+    fetch(`${API_BASE}/reference-data/`).then(res => res.json()).then(data => {
+      setPaymentMethods(data.payment_methods);
+      setCurrencies(data.currencies);
+      setTriggeringEvents(data.triggering_events);
+      setSurveyors(data.surveyors);
+    });
   }, []);
 
   const handleChange = (e) => {
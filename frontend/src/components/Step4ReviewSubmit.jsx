@@ -113,8 +113,8 @@ export default function Step4ReviewSubmit({ onProceed, onBack, formData, setForm
           console.log('Task created:', task); // Debug log
           setTaskStatus(task);
           
-          // Poll for task completion
-          pollTaskStatus(task.celery_task_id);
+          // Follow task progress as it is pushed by the server
+          watchTaskStatus(task.celery_task_id);
         } else {
           console.error('Task creation failed:', await taskResponse.text());
           setIsSubmitting(false);
@@ -129,6 +129,38 @@ export default function Step4ReviewSubmit({ onProceed, onBack, formData, setForm
     }
   };
 
+  const watchTaskStatus = (taskId) => {
+    const source = new EventSource(`${API_BASE}/task-events/${taskId}/`);
+    let finished = false;
+
+    source.addEventListener('status', (event) => {
+      const task = JSON.parse(event.data);
+      setTaskStatus(task);
+
+      if (task.status === 'completed') {
+        finished = true;
+        source.close();
+        onProceed(); // Go to Step 5
+      } else if (task.status === 'failed') {
+        console.error('Task failed:', task.error);
+        finished = true;
+        source.close();
+        setIsSubmitting(false);
+      }
+    });
+
+    // Server has no push channel, or the stream gave up: poll instead
+    const fallBackToPolling = () => {
+      if (finished) return;
+      finished = true;
+      source.close();
+      pollTaskStatus(taskId);
+    };
+    source.addEventListener('unavailable', fallBackToPolling);
+    source.addEventListener('timeout', fallBackToPolling);
+    source.onerror = fallBackToPolling;
+  };
+
   const pollTaskStatus = async (taskId) => {
     console.log('Starting to poll task:', taskId); // Debug log
     
@@ -146,6 +178,10 @@ export default function Step4ReviewSubmit({ onProceed, onBack, formData, setForm
             console.log('Task completed, proceeding to Step 5'); // Debug log
             clearInterval(pollInterval);
             onProceed(); // Go to Step 5
+          } else if (task.status === 'failed') {
+            console.error('Task failed:', task.error);
+            clearInterval(pollInterval);
+            setIsSubmitting(false);
           }
         } else {
           console.error('Poll failed:', await response.text());